@@ -0,0 +1,318 @@
+import logging
+import mmap
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+module_logger = logging.getLogger(__name__)
+
+# Linux packet socket constants (linux/if_packet.h)
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+ETH_P_ALL = 0x0003
+
+# Ring geometry: blocks are handed to user space when full, or after the retire timeout
+RING_BLOCK_SIZE = 1 << 20
+RING_BLOCK_COUNT = 16
+RING_FRAME_SIZE = 1 << 11
+RING_RETIRE_TIMEOUT = 100  # ms
+
+# ARPHRD (/sys/class/net/<iface>/type) to pcap link-layer type
+_link_types = {1: 1,        # Ethernet
+               801: 105,    # 802.11
+               802: 119,    # Prism
+               803: 127}    # Radiotap
+
+# tpacket_block_desc with tpacket_hdr_v1: version, offset_to_priv, block_status, num_pkts, offset_to_first_pkt
+_block_header = struct.Struct('=IIIII')
+# tpacket3_hdr: tp_next_offset, tp_sec, tp_nsec, tp_snaplen, tp_len, tp_status, tp_mac
+_packet_header = struct.Struct('=IIIIIIH')
+_block_status_offset = 8
+
+# Radiotap fields preceding dBm antenna signal (bit 5): (alignment, size)
+_radiotap_fields = [(8, 8), (1, 1), (1, 1), (2, 4), (2, 2)]
+_RADIOTAP_ANTENNA_SIGNAL = 5
+# Radiotap flags (bit 1) marking a frame that ends with its FCS
+_RADIOTAP_FLAGS = 1
+_RADIOTAP_FLAG_FCS = 0x10
+
+# Beacon body: fixed parameters (timestamp, interval, capabilities) before the tagged information elements
+_BEACON_HEADER = 24
+_BEACON_FIXED = 12
+# Information elements that determine the ssid, channel and security of a beacon: SSID, DS parameter set, RSN
+_signature_elements = {0, 3, 48}
+# Vendor specific element (221) carrying Microsoft WPA: OUI 00:50:f2, type 1
+_VENDOR_ELEMENT = 221
+_MS_WPA = b'\x00\x50\xf2\x01'
+
+
+def link_type(iface):
+    """
+    pcap link-layer type of an interface
+
+    :param iface: Interface name
+    :type iface: str
+    :return: Link-layer type (eg 127 for radiotap)
+    :rtype: int
+    """
+
+    with open(os.path.join('/sys/class/net', iface, 'type')) as f:
+        return _link_types.get(int(f.read().strip()), 1)
+
+
+def parse_beacon(frame):
+    """
+    Decode the BSSID and signal strength of a radiotap 802.11 beacon frame
+
+    :param frame: Raw frame, starting with its radiotap header
+    :type frame: bytes
+    :return: (bssid, ssi) or None if the frame is not a beacon
+    :rtype: (str, int)
+    """
+
+    if len(frame) < 8:
+        return None
+
+    _rt_len = struct.unpack_from('<H', frame, 2)[0]
+    if len(frame) < _rt_len + 22 or frame[_rt_len] != 0x80:
+        return None
+
+    # Walk the present bitmaps, then the fields, to find the antenna signal
+    _present = struct.unpack_from('<I', frame, 4)[0]
+    _offset = 8
+    _word = _present
+    while _word & (1 << 31) and _offset + 4 <= _rt_len:
+        _word = struct.unpack_from('<I', frame, _offset)[0]
+        _offset += 4
+
+    _ssi = None
+    if _present & (1 << _RADIOTAP_ANTENNA_SIGNAL):
+        for bit, (align, size) in enumerate(_radiotap_fields):
+            if _present & (1 << bit):
+                _offset = (_offset + align - 1) & ~(align - 1)
+                _offset += size
+        if _offset < _rt_len:
+            _ssi = struct.unpack_from('b', frame, _offset)[0]
+
+    _bssid = ':'.join('{:02x}'.format(b) for b in frame[_rt_len + 16:_rt_len + 22])
+    return _bssid, _ssi
+
+
+def beacon_signature(frame):
+    """
+    Bytes of a radiotap 802.11 beacon frame that determine its ssid, channel and security: the capabilities and the
+    SSID, DS parameter set, RSN and WPA elements. Elements that change from beacon to beacon, like the TIM, are left
+    out so that every beacon an AP sends with the same configuration has the same signature.
+
+    :param frame: Raw frame, starting with its radiotap header
+    :type frame: bytes
+    :return: Signature, or None if the frame is not a beacon
+    :rtype: bytes
+    """
+
+    if len(frame) < 8:
+        return None
+
+    _rt_len = struct.unpack_from('<H', frame, 2)[0]
+    _body = _rt_len + _BEACON_HEADER
+    if len(frame) < _body + _BEACON_FIXED or frame[_rt_len] != 0x80:
+        return None
+
+    # Leave off the FCS, if the frame has one
+    _end = len(frame)
+    _present = struct.unpack_from('<I', frame, 4)[0]
+    if _present & (1 << _RADIOTAP_FLAGS):
+        _offset = 8
+        _word = _present
+        while _word & (1 << 31) and _offset + 4 <= _rt_len:
+            _word = struct.unpack_from('<I', frame, _offset)[0]
+            _offset += 4
+        for bit, (align, size) in enumerate(_radiotap_fields[:_RADIOTAP_FLAGS]):
+            if _present & (1 << bit):
+                _offset = (_offset + align - 1) & ~(align - 1)
+                _offset += size
+        if _offset < _rt_len and frame[_offset] & _RADIOTAP_FLAG_FCS:
+            _end -= 4
+
+    _parts = [frame[_body + 10:_body + _BEACON_FIXED]]
+    _offset = _body + _BEACON_FIXED
+    while _offset + 2 <= _end:
+        _id, _length = frame[_offset], frame[_offset + 1]
+        _element = frame[_offset:_offset + 2 + _length]
+        if _id in _signature_elements or (_id == _VENDOR_ELEMENT and _element[2:6] == _MS_WPA):
+            _parts.append(_element)
+        _offset += 2 + _length
+
+    return b''.join(_parts)
+
+
+class PcapngWriter:
+
+    def __init__(self, path, link, snaplen=0xffff):
+        """
+        Minimal pcapng writer: a section header, one interface and enhanced packet blocks with microsecond timestamps
+        """
+
+        self._file = open(path, 'wb', buffering=1 << 16)
+        self._file.write(struct.pack('=IIIHHqI', 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28))
+        self._file.write(struct.pack('=IIHHII', 1, 20, link, 0, snaplen, 20))
+
+    def write(self, timestamp_us, frame, length=None):
+        _padded = (len(frame) + 3) & ~3
+        _block_len = 32 + _padded
+        self._file.write(struct.pack('=IIIIIII', 6, _block_len, 0, timestamp_us >> 32, timestamp_us & 0xffffffff,
+                                     len(frame), length if length is not None else len(frame)))
+        self._file.write(frame)
+        self._file.write(b'\0' * (_padded - len(frame)))
+        self._file.write(struct.pack('=I', _block_len))
+
+    def close(self):
+        self._file.close()
+
+
+class RingCapture:
+
+    def __init__(self, iface, output=None, callback=None, block_size=RING_BLOCK_SIZE, block_count=RING_BLOCK_COUNT):
+        """
+        Capture packets in process from a memory-mapped TPACKET_V3 ring. Frames are written to pcapng and/or handed to a
+        callback as they arrive, and the kernel's drop counters are collected like dumpcap's statistics.
+
+        :param iface: Interface to capture on (needs CAP_NET_RAW)
+        :type iface: str
+        :param output: (Optional) Path of the pcapng to write
+        :type output: str
+        :param callback: (Optional) Function called with (timestamp, frame) for every frame
+        :type callback: function
+        :param block_size: Size of each ring block (bytes, a multiple of the page size)
+        :type block_size: int
+        :param block_count: Number of ring blocks
+        :type block_count: int
+        """
+
+        self._iface = iface
+        self._output = output
+        self._callback = callback
+        self._block_size = block_size
+        self._block_count = block_count
+        self._socket = None
+        self._ring = None
+        self.packets = 0
+        self.drops = 0
+
+    def open(self):
+        self._socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self._socket.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        # tpacket_req3: block size, block count, frame size, frame count, retire timeout, private size, features
+        self._socket.setsockopt(SOL_PACKET, PACKET_RX_RING, struct.pack(
+            '=IIIIIII', self._block_size, self._block_count, RING_FRAME_SIZE,
+            self._block_size * self._block_count // RING_FRAME_SIZE, RING_RETIRE_TIMEOUT, 0, 0))
+        self._ring = mmap.mmap(self._socket.fileno(), self._block_size * self._block_count,
+                               mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self._socket.bind((self._iface, ETH_P_ALL))
+
+        # Discard counts from before the socket was bound
+        self.statistics()
+        self.packets = 0
+        self.drops = 0
+
+    def statistics(self):
+        """
+        Read the kernel's counters (which reset on every read) into the running totals
+
+        :return: (packets, drops) since the last read
+        :rtype: (int, int)
+        """
+
+        if self._socket is None:
+            return 0, 0
+
+        _packets, _drops, _ = struct.unpack('=III', self._socket.getsockopt(SOL_PACKET, PACKET_STATISTICS, 12))
+        self.packets += _packets
+        self.drops += _drops
+        return _packets, _drops
+
+    def _read_block(self, index, writer):
+        _start = index * self._block_size
+        _, _, _status, _num_pkts, _offset = _block_header.unpack_from(self._ring, _start)
+        if not _status & TP_STATUS_USER:
+            return False
+
+        _offset += _start
+        for _ in range(_num_pkts):
+            _next, _sec, _nsec, _snaplen, _len, _, _mac = _packet_header.unpack_from(self._ring, _offset)
+            _frame = self._ring[_offset + _mac:_offset + _mac + _snaplen]
+            if writer is not None:
+                writer.write(_sec * 1000000 + _nsec // 1000, _frame, _len)
+            if self._callback is not None:
+                self._callback(_sec + _nsec / 1e9, _frame)
+            _offset += _next
+
+        # Hand the block back to the kernel
+        struct.pack_into('=I', self._ring, _start + _block_status_offset, TP_STATUS_KERNEL)
+        return True
+
+    def run(self, duration, stop_flag=None, started=None):
+        """
+        Capture for a duration
+
+        :param duration: Seconds to capture for
+        :type duration: float
+        :param stop_flag: (Optional) Event that ends the capture early when set
+        :type stop_flag: threading.Event
+        :param started: (Optional) Event set once the ring is capturing
+        :type started: threading.Event
+        :return: (packets captured, packets dropped)
+        :rtype: (int, int)
+        """
+
+        if stop_flag is None:
+            stop_flag = threading.Event()
+
+        if self._socket is None:
+            self.open()
+
+        _writer = PcapngWriter(self._output, link_type(self._iface)) if self._output else None
+        _poll = select.poll()
+        _poll.register(self._socket.fileno(), select.POLLIN | select.POLLERR)
+
+        if started is not None:
+            started.set()
+
+        _block = 0
+        _end = time.time() + duration
+        try:
+            while not stop_flag.is_set():
+                _remaining = _end - time.time()
+                if _remaining <= 0:
+                    break
+                if not self._read_block(_block, _writer):
+                    _poll.poll(min(_remaining, .1) * 1000)
+                    continue
+                _block = (_block + 1) % self._block_count
+
+            # Let the kernel retire the block being filled, then drain the ring
+            time.sleep(RING_RETIRE_TIMEOUT / 1000)
+            while self._read_block(_block, _writer):
+                _block = (_block + 1) % self._block_count
+        finally:
+            if _writer is not None:
+                _writer.close()
+            self.statistics()
+
+        return self.packets - self.drops, self.drops
+
+    def close(self):
+        if self._ring is not None:
+            self._ring.close()
+        if self._socket is not None:
+            self._socket.close()
+        self._ring = None
+        self._socket = None
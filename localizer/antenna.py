@@ -1,36 +1,19 @@
 import atexit
 import logging
 import math
-import threading
 import time
 from subprocess import run
 
 import pigpio
 
+from localizer.motion import build_ramp, ramp_duration, timeline, truncate, progress, best_path, RESET_RATE
+
 module_logger = logging.getLogger(__name__)
 
 # Always start due north (magnetic) or change this variable
 bearing_default = 0
 bearing_current = bearing_default
-bearing_max = 720
-bearing_min = -360
-
-# Constants
-# Reset Rate Curve
-# From utils/model.py
-#   x = [0,90,180,360]
-#   y = [20,10,8,6]
-get_reset_rate = lambda x: 3.235294 + (20 - 3.235294) / (1 + (x / 34.68111) ** 1.29956)
-RESET_RATE = [get_reset_rate(x) for x in range(1080)]
-get_focused_rate = lambda x: -4 + (20 + 4) / (1 + (x / 180) ** 0.48542683)
-FOCUSED_RATE = [get_focused_rate(x) for x in range(360)]
-
-# Default number of steps per radian
-steps_per_revolution = 200
-degrees_per_step = 360 / steps_per_revolution
-microsteps_per_step = 32
-microsteps_per_revolution = steps_per_revolution*microsteps_per_step*2
-degrees_per_microstep = degrees_per_step / microsteps_per_step
+
 # Set up GPIO
 PUL_min = 18
 DIR_min = 23
@@ -56,66 +39,78 @@ pi.set_mode(ENA_min, pigpio.OUTPUT)
 pi.write(ENA_min, pigpio.HIGH)
 
 
-class AntennaThread(threading.Thread):
-
-    def __init__(self, response_queue, event_flag, duration, degrees, bearing, reset=None):
-
-        # Set up thread
-        super().__init__()
+class Antenna:
+    """
+    Moves of the stepper driving the antenna. Moves block until they are complete, so callers that need to do
+    something else meanwhile (eg CaptureOrchestrator) run them on a worker thread.
+    """
 
-        module_logger.info("Starting Stepper Thread")
+    @staticmethod
+    def sweep(degrees, duration, stop_flag=None):
+        """
+        Rotate the antenna through a capture, keeping track of the current bearing
 
-        self.daemon = True
-        self._response_queue = response_queue
-        self._event_flag = event_flag
-        self._duration = duration
-        self._degrees = degrees
-        self._bearing = bearing
-        self._reset = reset
+        :param degrees: Degrees to rotate (negative for counter-clockwise)
+        :type degrees: float
+        :param duration: Duration of the rotation
+        :type duration: float
+        :param stop_flag: (Optional) Event that stops the rotation early when set
+        :type stop_flag: threading.Event
+        :return: (start time, stop time, motion timeline)
+        :rtype: (float, float, list)
+        """
 
-    def run(self):
         global bearing_current
 
-        module_logger.info("Executing Stepper Thread")
-
-        # Point the antenna in the right direction
-        AntennaThread.reset_antenna(self._bearing, self._degrees)
-
-        # Indicate readiness
-        self._response_queue.put('r')
+        _start_time, _stop_time = Antenna.rotate(degrees, duration, stop_flag)
+        _timeline = timeline(degrees, duration)
+        _degrees = degrees
 
-        # Wait for the synchronization flag
-        module_logger.info("Waiting for synchronization flag")
-        self._event_flag.wait()
+        # Truncate the timeline if the rotation was stopped early
+        if _stop_time - _start_time < _timeline[-1][0]:
+            _timeline = truncate(_timeline, _stop_time - _start_time)
+            _degrees = _timeline[-1][1] if degrees >= 0 else -_timeline[-1][1]
 
-        _start_time, _stop_time = self.rotate(self._degrees, self._duration)
-        bearing_current += self._degrees
+        bearing_current += _degrees
 
-        module_logger.info("Rotated antenna {} degrees for {:.2f}s"
-                           .format(self._degrees, _stop_time - _start_time))
+        module_logger.info("Rotated antenna {:.1f} degrees for {:.2f}s"
+                           .format(_degrees, _stop_time - _start_time))
 
-        # Put results on queue
-        self._response_queue.put((_start_time, _stop_time))
-
-        # Pause for a moment to reduce drift
-        time.sleep(.5)
-
-        if self._reset is not None:
-            # Reset antenna for next test, assuming next test has same width as current
-            AntennaThread.reset_antenna(self._reset, self._degrees)
+        return _start_time, _stop_time, _timeline
 
     @staticmethod
-    def reset_antenna(bearing=bearing_default, degrees=0):
+    def reset_antenna(bearing=bearing_default, degrees=0, stop_flag=None):
+        """
+        Move the antenna to a bearing, by the best path for the move that follows
+
+        :param bearing: Bearing to move to
+        :type bearing: float
+        :param degrees: Width (signed) of the move that follows
+        :type degrees: float
+        :param stop_flag: (Optional) Event that stops the move early when set
+        :type stop_flag: threading.Event
+        :return: True if the antenna moved
+        :rtype: bool
+        """
+
         global bearing_current
 
-        _travel = AntennaThread.determine_best_path(bearing, degrees)
+        _travel = Antenna.determine_best_path(bearing, degrees)
 
-        # Check to see if new bearing is within 0.1
-        if not math.isclose(bearing_current, bearing, abs_tol=0.1) and _travel != 0:
-            _travel_duration = RESET_RATE[abs(_travel)]
+        # Check to see if new bearing is within 0.1 (the best path may still move to an equivalent bearing, to keep the
+        # next move inside the cable wrap limits)
+        if not math.isclose(_travel, 0, abs_tol=0.1):
+            _travel_duration = RESET_RATE[int(round(abs(_travel)))]
             module_logger.info(
                 "Resetting antenna {} degrees (from {} to {})".format(_travel, bearing_current, bearing_current + _travel))
-            AntennaThread.rotate(_travel, _travel_duration)
+            _start_time, _stop_time = Antenna.rotate(_travel, _travel_duration, stop_flag)
+
+            # Only count the part of the move that was made if it was stopped early
+            _timeline = timeline(_travel, _travel_duration)
+            if _stop_time - _start_time < _timeline[-1][0]:
+                _travel = math.copysign(progress(_timeline, _stop_time - _start_time), _travel)
+                module_logger.warning("Antenna reset stopped at {}".format(bearing_current + _travel))
+
             bearing_current += _travel
             return True
 
@@ -132,25 +127,10 @@ class AntennaThread(threading.Thread):
         :return: An optimized (equivalent) bearing to set the antenna
         """
 
-        global bearing_current
-
-
-        _edge_case = bool(new_bearing == bearing_current % 360)
-        if _edge_case and (bearing_current >= bearing_max or bearing_current <= bearing_min):
-            _travel = new_bearing - bearing_current
-        else:
-            # Use algorithm tested and optimized in tests/antenna_motion.py
-            _travel = 180 - (540 + (bearing_current - new_bearing)) % 360
-            _proposed_new_bearing = bearing_current + _travel
-            if _proposed_new_bearing + degrees >= bearing_max:
-                _travel = _travel - 360
-            elif _proposed_new_bearing <= bearing_min:
-                _travel = 360 - _travel
-
-        return _travel
+        return best_path(bearing_current, new_bearing, degrees)
 
     @staticmethod
-    def rotate(degrees, duration):
+    def rotate(degrees, duration, stop_flag=None):
         """
         Rotate by degrees and duration
 
@@ -158,6 +138,8 @@ class AntennaThread(threading.Thread):
         :type degrees: int
         :param duration: Time to take for rotation for 360 degrees
         :type duration: float
+        :param stop_flag: (Optional) Event that stops the rotation early when set
+        :type stop_flag: threading.Event
         :return: start, end
         :rtype: tuple
         """
@@ -170,51 +152,26 @@ class AntennaThread(threading.Thread):
         else:
             pi.write(DIR_min, 0)
 
-        _frequency = microsteps_per_revolution/duration
-
-        if degrees > 6:
-            _ramp1 = 1  # degrees
-            _ramp1_frequency = _frequency / 4
-            _ramp1_pulses = round(_ramp1 / degrees_per_microstep)
-
-            _ramp2 = 1  # degrees
-            _ramp2_frequency = _frequency / 2
-            _ramp2_pulses = round(_ramp2 / degrees_per_microstep)
-
-            _ramp3 = 1  # degrees
-            _ramp3_frequency = 3 * _frequency / 4
-            _ramp3_pulses = round(_ramp3 / degrees_per_microstep)
-
-            _pulses = round((degrees - 2*(_ramp1 + _ramp2 + _ramp3)) / degrees_per_microstep)
-
-            _ramp = [[_ramp1_frequency, _ramp1_pulses],
-                     [_ramp2_frequency, _ramp2_pulses],
-                     [_ramp3_frequency, _ramp3_pulses],
-                     [_frequency, _pulses],
-                     [_ramp3_frequency, _ramp3_pulses],
-                     [_ramp2_frequency, _ramp2_pulses],
-                     [_ramp1_frequency, _ramp1_pulses]]
-
-        else:
-            _pulses = round(degrees/degrees)
-            _ramp = [[_frequency/3, _pulses]]
+        _ramp = build_ramp(degrees, duration)
 
-        _duration = 0
         for r in _ramp:
             assert r[0] > 0, "degrees: {}, duration: {}, ramp freq: {}".format(degrees, duration, r[0])
             assert r[1] > 0, "degrees: {}, duration: {}, ramp pulses: {}".format(degrees, duration, r[0])
-            _duration += int(1000000 / r[0]) * r[1]
 
-        _duration *= 2
-        _duration /= 1000000
+        _duration = ramp_duration(_ramp)
 
-        _chain, _wid = AntennaThread.generate_ramp(_ramp)
+        _chain, _wid = Antenna.generate_ramp(_ramp)
 
         _time_start = time.time()
         pi.wave_chain(_chain)
         _time_end = _time_start + _duration
 
         while time.time() < _time_end:
+            if stop_flag is not None and stop_flag.is_set():
+                pi.wave_tx_stop()
+                _time_end = time.time()
+                module_logger.info("Rotation stopped early")
+                break
             time.sleep(.1)
 
         try:
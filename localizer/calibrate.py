@@ -0,0 +1,170 @@
+import logging
+
+from scipy.optimize import curve_fit
+
+from localizer import motion
+
+module_logger = logging.getLogger(__name__)
+
+# Distances (degrees) to test
+CALIBRATION_DISTANCES = [10, 45, 90, 180, 360, 720]
+# Range of rates (seconds per 360 degrees) to search
+CALIBRATION_FASTEST = 2
+CALIBRATION_SLOWEST = 20
+# Search resolution (seconds per 360 degrees)
+CALIBRATION_RESOLUTION = .25
+# Margin applied to the fastest rate that passed
+CALIBRATION_SAFETY = 1.2
+
+
+class SimulatedBackend:
+    """
+    Simulated antenna for testing calibration: moves fail when the full speed stage is faster than the stepper can
+    reach over the distance available, or when the first ramp stage exceeds the pull-in rate
+    """
+
+    def __init__(self, max_frequency=5000, pull_in_frequency=1500, knee=60):
+        self._max_frequency = max_frequency
+        self._pull_in_frequency = pull_in_frequency
+        self._knee = knee
+
+    def max_frequency(self, degrees):
+        return self._max_frequency * degrees / (degrees + self._knee)
+
+    def move(self, degrees, duration):
+        """
+        Simulate a move out and back
+
+        :param degrees: Distance to move
+        :type degrees: float
+        :param duration: Rate (seconds per 360 degrees)
+        :type duration: float
+        :return: True if the antenna returned to its starting position without missing steps
+        :rtype: bool
+        """
+
+        _ramp = motion.build_ramp(degrees, duration)
+        return _ramp[0][0] <= self._pull_in_frequency and \
+            max(frequency for frequency, _ in _ramp) <= self.max_frequency(abs(degrees))
+
+
+class RigBackend:
+    """
+    Calibrate against the real antenna: each test moves out and back several times, then asks the operator whether the
+    antenna is still lined up with its reference mark
+    """
+
+    def __init__(self, repeats=3):
+        self._repeats = repeats
+
+    def move(self, degrees, duration):
+        """
+        Move out and back on the rig, starting from the default bearing
+
+        :param degrees: Distance to move
+        :type degrees: float
+        :param duration: Rate (seconds per 360 degrees)
+        :type duration: float
+        :return: True if the operator confirms the antenna returned to its reference mark
+        :rtype: bool
+        """
+
+        from localizer import antenna
+
+        # Start every test from (an equivalent of) the default bearing with room for the whole move
+        antenna.Antenna.reset_antenna(antenna.bearing_default, degrees)
+        if not motion.bearing_min <= antenna.bearing_current <= motion.bearing_max - degrees:
+            raise ValueError("Moving {} degrees from {} would pass the cable wrap limits"
+                             .format(degrees, antenna.bearing_current))
+
+        for _ in range(self._repeats):
+            antenna.Antenna.rotate(degrees, duration)
+            antenna.Antenna.rotate(-degrees, duration)
+
+        _response = input("Moved {} degrees at {:.2f}s/360 x{}. Is the antenna on its reference mark? (yes/no): "
+                          .format(degrees, duration, self._repeats))
+
+        if _response.strip().lower() not in ['y', 'yes']:
+            input("Line the antenna up with its reference mark and press enter to continue")
+            return False
+
+        return True
+
+
+def fastest_rate(backend, degrees, fastest=CALIBRATION_FASTEST, slowest=CALIBRATION_SLOWEST,
+                 resolution=CALIBRATION_RESOLUTION):
+    """
+    Binary search for the fastest rate the backend can move the given distance without missing steps
+
+    :param backend: Backend to test moves against
+    :param degrees: Distance to move
+    :type degrees: float
+    :return: Fastest passing rate (seconds per 360 degrees), or None if even the slowest rate fails
+    :rtype: float
+    """
+
+    if not backend.move(degrees, slowest):
+        return None
+
+    _fail, _pass = fastest, slowest
+    if backend.move(degrees, fastest):
+        return fastest
+
+    while _pass - _fail > resolution:
+        _rate = (_pass + _fail) / 2
+        if backend.move(degrees, _rate):
+            _pass = _rate
+        else:
+            _fail = _rate
+
+    return _pass
+
+
+def fit(distances, rates):
+    """
+    Fit the reset rate curve to measured rates
+
+    :param distances: Distances tested
+    :type distances: list
+    :param rates: Safe rates (seconds per 360 degrees) for each distance
+    :type rates: list
+    :return: Symmetric sigmoid parameters (a, b, c, d)
+    :rtype: tuple
+    """
+
+    try:
+        _profile, _ = curve_fit(motion.symmetric_sigmoid, distances, rates, p0=motion.DEFAULT_RESET_PROFILE,
+                                bounds=([0, 0, 1e-3, 1e-3], [max(rates) * 2, max(rates) * 2, 1080, 10]))
+        return tuple(float(value) for value in _profile)
+    except (RuntimeError, ValueError) as e:
+        module_logger.warning("Could not fit reset rate curve ({}), using slowest measured rate".format(e))
+        return max(rates), max(rates), 1, 1
+
+
+def calibrate(backend, distances=CALIBRATION_DISTANCES, safety=CALIBRATION_SAFETY):
+    """
+    Measure the fastest safe rate for a series of distances and fit a reset rate curve to them
+
+    :param backend: Backend to test moves against (RigBackend or SimulatedBackend)
+    :param distances: Distances to test
+    :type distances: list
+    :param safety: Margin applied to the fastest passing rate
+    :type safety: float
+    :return: (profile, measurements) where measurements is a list of (distance, safe rate)
+    :rtype: (tuple, list)
+    """
+
+    _measurements = []
+    for degrees in distances:
+        _rate = fastest_rate(backend, degrees)
+        if _rate is None:
+            module_logger.warning("Antenna could not move {} degrees at the slowest rate".format(degrees))
+            continue
+        _measurements.append((degrees, min(_rate * safety, CALIBRATION_SLOWEST)))
+        module_logger.info("Calibrated {} degrees: {:.2f}s/360".format(degrees, _measurements[-1][1]))
+
+    if len(_measurements) < 4:
+        raise ValueError("Calibration needs at least 4 successful distances, got {}".format(len(_measurements)))
+
+    _distances, _rates = zip(*_measurements)
+    return fit(_distances, _rates), _measurements
@@ -1,30 +1,46 @@
 import csv
+import datetime
 import logging
 import os
 import queue
-import shutil
 import threading
 import time
-from subprocess import PIPE, Popen
 
-import gpsd
+import pandas as pd
 from tabulate import tabulate
-from tqdm import tqdm, trange
 
-import localizer
-from localizer import antenna, gps, process, interface
-from localizer.meta import meta_csv_fieldnames, capture_suffixes
+from localizer import antenna, converge, index, orchestrate, process, planner
+from localizer.meta import CaptureMeta, capture_suffixes, timeline_csv_fieldnames, phases_csv_fieldnames, \
+    drops_csv_fieldnames
 
 OPTIMAL_CAPTURE_DURATION = 20
 OPTIMAL_CAPTURE_DURATION_FOCUSED = 6
 OPTIMAL_CAPTURE_DEGREES_FOCUSED = 84
 
+# Kernel capture buffer (MiB), raised for subsequent captures whenever a capture drops too many packets
+DEFAULT_BUFFER_SIZE = 12
+MAX_BUFFER_SIZE = 256
+DROP_THRESHOLD = .001
+
+buffer_size = DEFAULT_BUFFER_SIZE
+
 module_logger = logging.getLogger(__name__)
 
 
-def capture(params, pass_num=None, reset=None, focused=None):
+def capture(params, pass_num=None, reset=None, focused=None, clockwise=True, reset_clockwise=None, session=None,
+            backend=orchestrate.BACKEND_DUMPCAP, gps_service=None):
     _start_time = time.time()
 
+    # Counter-clockwise sweeps cover the same window, starting from the other end
+    _sweep_bearing = params.bearing_magnetic if clockwise else (params.bearing_magnetic + params.degrees) % 360
+    _sweep_degrees = params.degrees if clockwise else -params.degrees
+    if reset_clockwise is None:
+        reset_clockwise = clockwise
+
+    # Only extract from the capture session if it is listening on this capture's interface
+    if session is not None and (not session.running or session.iface != params.iface):
+        session = None
+
     # Create capture file names
     _capture_prefix = time.strftime('%Y%m%d-%H-%M-%S')
     _capture_file_pcap = _capture_prefix + capture_suffixes["pcap"]
@@ -32,6 +48,10 @@ def capture(params, pass_num=None, reset=None, focused=None):
     _output_csv_gps = _capture_prefix + capture_suffixes["coords"]
     _output_csv_capture = _capture_prefix + capture_suffixes["meta"]
     _output_csv_guess = _capture_prefix + capture_suffixes["guess"] if params.focused else None
+    _output_csv_timeline = _capture_prefix + capture_suffixes["timeline"]
+    _output_csv_phases = _capture_prefix + capture_suffixes["phases"]
+    _output_csv_drops = _capture_prefix + capture_suffixes["drops"]
+    _buffer_size = buffer_size
 
     # Build capture path and validate directory
     # Set up working folder
@@ -42,7 +62,7 @@ def capture(params, pass_num=None, reset=None, focused=None):
         _capture_path = os.path.join(_capture_path, pass_num)
 
     if focused is not None:
-        _capture_path = os.path.join(_capture_path, focused.replace(':', '').replace('-', ''))
+        _capture_path = os.path.join(_capture_path, focused.replace(':', '').replace('-', '').replace(',', '_'))
 
     try:
         os.makedirs(_capture_path, exist_ok=True)
@@ -57,182 +77,145 @@ def capture(params, pass_num=None, reset=None, focused=None):
         raise OSError()
 
     # Threading sync flag
-    _initialize_flag = threading.Event()
     _capture_ready = threading.Event()
-
-    module_logger.info("Setting up capture threads")
-
-    # Show progress bar of creating threads
-    with tqdm(total=4, desc="{:<35}".format("Setting up threads")) as pbar:
-
-        # Set up antenna control thread
-        _antenna_response_queue = queue.Queue()
-        _antenna_thread = antenna.AntennaThread(_antenna_response_queue,
-                                                _capture_ready,
-                                                params.duration,
-                                                params.degrees,
-                                                params.bearing_magnetic,
-                                                reset)
-        _antenna_thread.start()
-        # Wait for antenna to be ready
-        _antenna_response_queue.get()
-        pbar.update()
-        pbar.refresh()
-
-        # Set up gps thread
-        _gps_response_queue = queue.Queue()
-        _gps_thread = gps.GPSThread(_gps_response_queue,
-                                    _capture_ready,
-                                    params.duration,
-                                    os.path.join(_capture_path, _capture_file_gps),
-                                    os.path.join(_capture_path, _output_csv_gps))
-        _gps_thread.start()
-        pbar.update()
-        pbar.refresh()
-
-        # Set up pcap thread
-        _capture_response_queue = queue.Queue()
-        _capture_thread = CaptureThread(_capture_response_queue,
-                                        _initialize_flag,
-                                        _capture_ready,
-                                        params.iface,
-                                        params.duration,
-                                        os.path.join(_capture_path, _capture_file_pcap))
-        _capture_thread.start()
-        pbar.update()
-        pbar.refresh()
-
-        # Set up WiFi channel scanner thread
-        _channel_hopper_thread = interface.ChannelThread(_capture_ready,
-                                                         params.iface,
-                                                         params.duration,
-                                                         params.hop_int,
-                                                         distance=params.hop_dist,
-                                                         init_chan=params.channel)
-        _channel_hopper_thread.start()
-        pbar.update()
-        pbar.refresh()
-
-    # Ensure that gps has a 3D fix
-    if not localizer.debug:
-        module_logger.info("Waiting for GPS 3D fix")
-        gps_current_mode = gpsd.get_current().mode
-        time.sleep(.1)
-        try:
-            _time_waited = 0
-            while gps_current_mode != 3:
-                print("Waiting for {}s for 3D gps fix (current mode = '{}' - press 'CTRL-c to cancel)"
-                      .format(_time_waited, gpsd.get_current().mode))
-                time.sleep(1)
-                _time_waited += 1
-                gps_current_mode = gpsd.get_current().mode
-        except KeyboardInterrupt:
-            print('Capture canceled.')
-            return False
-
-    module_logger.info("Triggering synchronized threads")
-    # Start threads
-    _initialize_flag.set()
-
-    if not _capture_ready.is_set():
-        module_logger.info("Waiting for threads to start...")
-        try:
-            _delay_notified = False
-            _timeout_start = time.time()
-            while not _capture_ready.is_set():
-                if time.time() > _timeout_start + 5 and not _delay_notified:
-                    module_logger.error(
-                        "Waiting over 5s for capture to start... Press Ctrl-C to cancel")
-                    _delay_notified = True
-                time.sleep(.1)
-        except KeyboardInterrupt:
-            print('\nCapture canceled.')
-            return False
-
-    # Print out timer to console
-    for _ in trange(int(params.duration), desc="{:<35}"
-                    .format("Capturing packets for {}s".format((str(params.duration))))):
-        time.sleep(1)
-
-    # Show progress bar of getting thread results
-    with tqdm(total=3, desc="{:<35}".format("Waiting for results")) as pbar:
-
-        pbar.update()
-        pbar.refresh()
-        loop_start_time, loop_stop_time = _antenna_response_queue.get()
-
-        pbar.update()
-        pbar.refresh()
-        _avg_lat, _avg_lon, _avg_alt, _avg_lat_err, _avg_lon_err, _avg_alt_err = _gps_response_queue.get()
-
-        pbar.update()
-        pbar.refresh()
-        _capture_result_cap, _capture_result_drop = _capture_response_queue.get()
+    _stop_flag = threading.Event()
+
+    # Set up convergence thread to stop the capture early, if requested
+    if params.converge:
+        _converge_response_queue = queue.Queue()
+        _converge_thread = converge.ConvergenceThread(_converge_response_queue,
+                                                      _capture_ready,
+                                                      _stop_flag,
+                                                      os.path.join(_capture_path, _capture_file_pcap),
+                                                      params.duration,
+                                                      params.degrees,
+                                                      _sweep_bearing,
+                                                      params.converge,
+                                                      focused.split(',') if focused else params.macs,
+                                                      clockwise,
+                                                      session)
+        _converge_thread.start()
+
+    module_logger.info("Starting capture")
+    _orchestrator = orchestrate.CaptureOrchestrator(params,
+                                                    os.path.join(_capture_path, _capture_file_pcap),
+                                                    os.path.join(_capture_path, _capture_file_gps),
+                                                    os.path.join(_capture_path, _output_csv_gps),
+                                                    _sweep_degrees,
+                                                    _sweep_bearing,
+                                                    reset,
+                                                    params.degrees if reset_clockwise else -params.degrees,
+                                                    _capture_ready,
+                                                    _stop_flag,
+                                                    session,
+                                                    backend,
+                                                    _buffer_size,
+                                                    gps_service)
+    _results = _orchestrator.run()
+    if _results is None:
+        print('\nCapture canceled.')
+        return False
+
+    loop_start_time, loop_stop_time, _timeline = _results['sweep']
+    _avg_lat, _avg_lon, _avg_alt, _avg_lat_err, _avg_lon_err, _avg_alt_err = _results['gps']
+    _capture_result_cap, _capture_result_drop = _results['packets']
+    if _capture_result_cap is not None:
         module_logger.info("Captured {} packets ({} dropped)".format(_capture_result_cap, _capture_result_drop))
 
-    # Create Meta Dict
-    _capture_csv_data = {
-        meta_csv_fieldnames[0]: params.capture,
-        meta_csv_fieldnames[1]: pass_num,
-        meta_csv_fieldnames[2]: _capture_path,
-        meta_csv_fieldnames[3]: params.iface,
-        meta_csv_fieldnames[4]: params.duration,
-        meta_csv_fieldnames[5]: params.hop_int,
-        meta_csv_fieldnames[6]: _avg_lat,
-        meta_csv_fieldnames[7]: _avg_lon,
-        meta_csv_fieldnames[8]: _avg_alt,
-        meta_csv_fieldnames[9]: _avg_lat_err,
-        meta_csv_fieldnames[10]: _avg_lon_err,
-        meta_csv_fieldnames[11]: _avg_alt_err,
-        meta_csv_fieldnames[12]: loop_start_time,
-        meta_csv_fieldnames[13]: loop_stop_time,
-        meta_csv_fieldnames[14]: params.degrees,
-        meta_csv_fieldnames[15]: params.bearing_magnetic,
-        meta_csv_fieldnames[16]: _capture_file_pcap,
-        meta_csv_fieldnames[17]: _capture_file_gps,
-        meta_csv_fieldnames[18]: _output_csv_gps,
-        meta_csv_fieldnames[19]: focused,
-        meta_csv_fieldnames[20]: _output_csv_guess,
-    }
+    # Give subsequent captures a larger buffer if this one dropped packets. Captures extracted from a session have no
+    # drop counts of their own (and the session's buffer is fixed when it starts)
+    _drops = _results['drops']
+    if _capture_result_cap is not None:
+        _adjust_buffer_size(_buffer_size, _capture_result_cap, _capture_result_drop)
+
+    _phases = _results['phases']
+    module_logger.info("Capture phases: {}".format(', '.join(
+        "{} +{:.2f}s".format(name, timestamp - _phases[0][1]) for name, timestamp in _phases)))
+
+    # Record the truncated duration and sweep if the capture converged early
+    _duration = params.duration
+    _degrees = params.degrees
+    _converged = None
+    if params.converge:
+        _converged = _converge_response_queue.get()
+        _converge_thread.join()
+        if _converged:
+            _duration = round(loop_stop_time - loop_start_time, 3)
+            _degrees = int(round(_timeline[-1][1]))
+            print("Bearings converged, capture stopped after {}s ({} degrees)".format(_duration, _degrees))
+
+    # Create Meta
+    _capture_meta = CaptureMeta(name=params.capture,
+                                pass_num=pass_num,
+                                path=_capture_path,
+                                iface=params.iface,
+                                duration=_duration,
+                                hop_int=params.hop_int,
+                                pos_lat=_avg_lat,
+                                pos_lon=_avg_lon,
+                                pos_alt=_avg_alt,
+                                pos_lat_err=_avg_lat_err,
+                                pos_lon_err=_avg_lon_err,
+                                pos_alt_err=_avg_alt_err,
+                                start=loop_start_time,
+                                end=loop_stop_time,
+                                degrees=_degrees,
+                                bearing=_sweep_bearing,
+                                pcap=_capture_file_pcap,
+                                nmea=_capture_file_gps,
+                                coords=_output_csv_gps,
+                                focused=focused,
+                                guess=_output_csv_guess,
+                                timeline=_output_csv_timeline,
+                                converged=_converged,
+                                clockwise=clockwise,
+                                phases=_output_csv_phases,
+                                buffer_size=_buffer_size,
+                                drops=_output_csv_drops)
+
+    # Write antenna motion timeline to disk so that processing can assign exact bearings
+    with open(os.path.join(_capture_path, _output_csv_timeline), 'w', newline='') as timeline_csv:
+        _timeline_csv_writer = csv.writer(timeline_csv, dialect="unix")
+        _timeline_csv_writer.writerow(timeline_csv_fieldnames)
+        _timeline_csv_writer.writerows(_timeline)
+
+    # Write the time of each phase of the capture to disk
+    with open(os.path.join(_capture_path, _output_csv_phases), 'w', newline='') as phases_csv:
+        _phases_csv_writer = csv.writer(phases_csv, dialect="unix")
+        _phases_csv_writer.writerow(phases_csv_fieldnames)
+        _phases_csv_writer.writerows(_phases)
+
+    # Write the drop counters sampled during the capture to disk
+    with open(os.path.join(_capture_path, _output_csv_drops), 'w', newline='') as drops_csv:
+        _drops_csv_writer = csv.writer(drops_csv, dialect="unix")
+        _drops_csv_writer.writerow(drops_csv_fieldnames)
+        _drops_csv_writer.writerows(_drops)
 
     # Perform processing while we wait for threads to finish:
     _guesses = None
+    _results_df = None
     _guess_time_start = time.time()
     if params.focused:
         module_logger.info("Processing capture")
-        _, _, _, _guesses = process.process_capture(_capture_csv_data, _capture_path, write_to_disk=True, guess=True, clockwise=True, macs=params.macs)
+        _, _results_df, _, _guesses = process.process_capture(_capture_meta, _capture_path, write_to_disk=True, guess=True, clockwise=clockwise, macs=params.macs)
         _guesses.to_csv(os.path.join(_capture_path, _output_csv_guess), sep=',')
     _guess_time_end = time.time()
 
-    # Show progress bar of joining threads
-    with tqdm(total=4, desc="{:<35}".format("Waiting for threads")) as pbar:
-
-        # Channel Hopper Thread
-        pbar.update()
-        pbar.refresh()
-        _channel_hopper_thread.join()
-
-        pbar.update()
-        pbar.refresh()
-        _antenna_thread.join()
-
-        pbar.update()
-        pbar.refresh()
-        _gps_thread.join()
-
-        pbar.update()
-        pbar.refresh()
-        _capture_thread.join()
+    # Wait for the antenna to finish moving to the next capture
+    if _results['reset'] is not None:
+        _results['reset'].result()
 
     # Write capture metadata to disk
     module_logger.info("Writing capture metadata to csv")
-    with open(os.path.join(_capture_path, _output_csv_capture), 'w', newline='') as capture_csv:
-        _capture_csv_writer = csv.DictWriter(capture_csv, dialect="unix", fieldnames=meta_csv_fieldnames)
-        _capture_csv_writer.writeheader()
-        _capture_csv_data[meta_csv_fieldnames[21]] = time.time() - _start_time
-        _capture_csv_data[meta_csv_fieldnames[22]] = len(_guesses) if _guesses is not None else None
-        _capture_csv_data[meta_csv_fieldnames[23]] = _guess_time_end - _guess_time_start if _guesses is not None else None
-        _capture_csv_writer.writerow(_capture_csv_data)
+    _capture_meta.elapsed = time.time() - _start_time
+    _capture_meta.num_guesses = len(_guesses) if _guesses is not None else None
+    _capture_meta.guess_time = _guess_time_end - _guess_time_start if _guesses is not None else None
+    _capture_meta.write(os.path.join(_capture_path, _output_csv_capture))
+
+    # The capture now counts as processed, so add it (and its guesses) to the dataset and index before its focused
+    # captures are planned from the index
+    if _results_df is not None:
+        process.record_capture(_capture_meta, _capture_path, _results_df, index.BssidIndex.load())
 
     # Perform focused-level captures
     if params.focused and _guesses is not None and len(_guesses):
@@ -240,23 +223,15 @@ def capture(params, pass_num=None, reset=None, focused=None):
         _width = params.focused[0]
         _duration = params.focused[1]
 
-        _params = []
-
-        for i, row in _guesses.iterrows():
-            _bearing_guess = row.bearing
-            _focused = row.bssid
-
-            _new_bearing = _bearing_guess - _width/2
-            _new_degrees = _width
+        _params = planner.focused_captures(params, list(_guesses.itertuples()), _width, _duration,
+                                           index=index.BssidIndex.load())
 
-            _param = params.copy()
-            _param.bearing_magnetic = _new_bearing
-            _param.degrees = _new_degrees
-            _param.duration = _duration
-            _param.channel = row.channel
-            _param.hop_int = 0
-            _param.focused = None
-            _params.append((_param, _focused))
+        # Order the captures to minimize antenna travel
+        _home = reset if reset is not None else params.bearing_magnetic
+        _order, _estimated, _naive = planner.plan([_p for _p, _ in _params], antenna.bearing_current, _home)
+        _params = [_params[i] for i in _order]
+        print("Planned {} focused captures: estimated {} (strength order: {})"
+              .format(len(_params), datetime.timedelta(seconds=round(_estimated)), datetime.timedelta(seconds=round(_naive))))
 
         # Try to set the next bearing to speed up capture
         for i, val in enumerate(_params):
@@ -265,116 +240,138 @@ def capture(params, pass_num=None, reset=None, focused=None):
             try:
                 _reset = _params[i + 1][0].bearing_magnetic
             except IndexError:
-                _reset = params.bearing_magnetic
+                _reset = _home
 
             # Recursively run capture
             module_logger.debug("Focused Capture:\n\tCurrent bearing: {}\n\tCapture Bearing: {}\n\tReset Bearing: {}".format(antenna.bearing_current, _p.bearing_magnetic, _reset))
-            capture(_p, pass_num, _reset, _f)
+            capture(_p, pass_num, _reset, _f, session=session, backend=backend, gps_service=gps_service)
 
     return _capture_path, _output_csv_capture
 
 
-class CaptureThread(threading.Thread):
-
-    def __init__(self, response_queue, initialize_flag, start_flag, iface, duration, output):
-
-        super().__init__()
+def _adjust_buffer_size(size, packets, drops):
+    """
+    Double the capture buffer for subsequent captures when a capture dropped more than DROP_THRESHOLD of its packets
 
-        module_logger.info("Starting Packet Capture Thread")
+    :param size: Buffer size the capture used (MiB)
+    :type size: int
+    :param packets: Packets captured
+    :type packets: int
+    :param drops: Packets dropped
+    :type drops: int
+    :return: True if the buffer size was raised
+    :rtype: bool
+    """
 
-        self.daemon = True
-        self._response_queue = response_queue
-        self._initialize_flag = initialize_flag
-        self._start_flag = start_flag
-        self._iface = iface
-        self._duration = duration
-        self._output = output
+    global buffer_size
 
-        # Check for required system packages
-        self._pcap_util = "dumpcap"
-        self._pcap_params = ['-i', self._iface, '-B', '12', '-q']
+    if not drops or drops <= DROP_THRESHOLD * (packets + drops):
+        return False
 
-        if shutil.which(self._pcap_util) is None:
-            module_logger.error("Required packet capture system tool '{}' is not installed"
-                                .format(self._pcap_util))
-            exit(1)
+    if size >= MAX_BUFFER_SIZE:
+        module_logger.warning("Dropped {} of {} packets with the largest capture buffer ({} MiB)"
+                              .format(drops, packets + drops, size))
+        return False
 
-        # Ensure we are in monitor mode
-        while interface.get_interface_mode(self._iface) != "monitor":
-            interface.set_interface_mode(self._iface, "monitor")
+    buffer_size = max(buffer_size, min(size * 2, MAX_BUFFER_SIZE))
+    module_logger.warning("Dropped {} of {} packets, raising capture buffer from {} to {} MiB"
+                          .format(drops, packets + drops, size, buffer_size))
+    return True
 
-    def run(self):
-        module_logger.info("Executing capture thread")
 
-        _dur = int(self._duration + 1)
-        command = [self._pcap_util] + self._pcap_params + ["-a", "duration:{}".format(_dur), "-w", self._output]
+class AccessPoint:
 
-        # Wait for synchronization signal
-        self._initialize_flag.wait()
+    __slots__ = ['bssid', 'ssid', 'channel', 'security', 'strength', 'method', 'bearing', 'confidence', 'sharpness',
+                 'density', 'last_seen', 'captures']
 
-        _start_time = time.time()
-        proc = Popen(command, stdout=PIPE, stderr=PIPE)
+    def __init__(self, bssid):
+        """
+        An access point detected by a capture, with its latest guess
 
-        # Wait for process to output "File: ..." to stderr and then set flag for other threads
-        curr_line = ""
-        while not curr_line.startswith("File:"):
-            curr_line = proc.stderr.readline().decode()
-            time.sleep(.1)
+        :param bssid: BSSID
+        :type bssid: str
+        """
 
-        # Tell other threads to start
-        self._start_flag.set()
+        self.bssid = bssid
+        self.ssid = self.channel = self.security = self.strength = self.method = self.bearing = None
+        self.confidence = self.sharpness = self.density = self.last_seen = None
+        self.captures = []
 
-        # Wait for the dumpcap process to finish
-        proc.wait()
-        _end_time = time.time()
+    def update(self, guess, capture=None):
+        """
+        Update the access point from a guess
 
-        module_logger.info("Captured packets for {:.2f}s (expected {}s)".format(_end_time-_start_time, self._duration))
+        :param guess: Row of a guess table (ssid, bssid, channel, security, strength, method, bearing, confidence,
+                      sharpness, density)
+        :param capture: (Optional) Path of the capture the guess came from
+        :type capture: str
+        """
 
-        import re
-        matches = re.search("(?<=dropped on interface\s')(?:\S+':\s)(\d+)/(\d+)", proc.stderr.read().decode())
-        if matches is not None and len(matches.groups()) == 2:
-            num_cap = int(matches.groups()[0])
-            num_drop = int(matches.groups()[1])
-        else:
-            raise ValueError("Capture failed")
-
-        # Respond with actual
-        self._response_queue.put((num_cap, num_drop))
-        self._response_queue.put((_start_time, _end_time))
+        for field in AccessPoint.__slots__[1:10]:
+            setattr(self, field, getattr(guess, field, None))
+        self.last_seen = time.time()
+        if capture is not None and capture not in self.captures:
+            self.captures.append(capture)
 
 
 class APs:
 
     def __init__(self):
-        self._aps = None
+        """
+        Registry of detected access points keyed by BSSID. Access points keep the index they were first listed at, so
+        that they can be selected by number across captures.
+        """
+
+        self._aps = {}
+        self._order = []
 
     @property
     def aps(self):
-        return self._aps
+        return self.table()
 
     @aps.setter
     def aps(self, val):
-        self._aps = val.reset_index(drop=True)
+        self._aps = {}
+        self._order = []
+        self.update(val)
+
+    def update(self, val, capture=None):
+        """
+        Add or update access points from a guess table
+
+        :param val: Guesses, as returned by process_capture
+        :type val: pd.DataFrame
+        :param capture: (Optional) Path of the capture the guesses came from
+        :type capture: str
+        """
+
+        for row in val.itertuples(index=False):
+            _ap = self._aps.get(row.bssid)
+            if _ap is None:
+                _ap = self._aps[row.bssid] = AccessPoint(row.bssid)
+                self._order.append(row.bssid)
+            _ap.update(row, capture)
+
+    def table(self):
+        """
+        :return: Access points in listed order, one row each
+        :rtype: pd.DataFrame
+        """
+
+        _columns = ['ssid', 'bssid'] + AccessPoint.__slots__[2:11]
+        return pd.DataFrame([[getattr(ap, field) for field in _columns] for ap in self], columns=_columns)
 
-    def update(self, val):
-        for i, row in val.iterrows():
-            # If the new row exists in the dataframe, update the existing value
-            if row.bssid in self._aps.bssid.unique():
-                self._aps.iloc[self._aps.index[self._aps.bssid == row.bssid][0]] = row
-            # If it's not in the current list, add it
-            else:
-                self._aps = self._aps.append(row)
+    def __getitem__(self, arg):
+        return self._aps[self._order[arg]]
 
-        self._aps.reset_index(inplace=True, drop=True)
+    def __iter__(self):
+        return (self._aps[bssid] for bssid in self._order)
 
-    def __getitem__(self, arg):
-        return self._aps.iloc[arg]
+    def __contains__(self, bssid):
+        return bssid in self._aps
 
     def __len__(self):
-        if self._aps is None:
-            return 0
-        else:
-            return len(self._aps)
+        return len(self._order)
 
     def __str__(self):
-        return tabulate(self._aps, headers='keys', tablefmt='psql')
+        return tabulate(self.table(), headers='keys', tablefmt='psql')
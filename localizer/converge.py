@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from localizer import locate, motion, process
+
+module_logger = logging.getLogger(__name__)
+
+# Seconds between convergence checks
+CHECK_INTERVAL = 2
+# Minimum number of beacons from a BSSID before its bearing is estimated
+MIN_SAMPLES = 5
+# Degrees the antenna must have moved past an estimated peak before the estimate is trusted
+PEAK_MARGIN = 30
+
+
+class ConvergenceThread(threading.Thread):
+
+    def __init__(self, response_queue, start_flag, stop_flag, pcap, duration, degrees, bearing, tolerance, macs=None,
+                 clockwise=True, session=None):
+        """
+        Convergence Thread that, once the capture has started, periodically decodes the capture in progress and
+        estimates the bearing of each BSSID. When every estimate is stable to within the tolerance, and the antenna
+        has moved past each estimated peak, the stop flag is raised to end the capture early. When the capture is
+        taken from a capture session, only the session files written since the capture started are decoded.
+        """
+
+        super().__init__()
+
+        module_logger.info("Starting Convergence Thread")
+
+        self.daemon = True
+        self._response_queue = response_queue
+        self._start_flag = start_flag
+        self._stop_flag = stop_flag
+        self._pcap = pcap
+        self._session = session
+        self._degrees = degrees
+        self._bearing = bearing
+        self._tolerance = tolerance
+        self._macs = macs
+        self._cw = 1 if clockwise else -1
+        self._timeline = motion.timeline(degrees, duration)
+        self._offsets, self._progress = (np.array(values) for values in zip(*self._timeline))
+
+    def run(self):
+        module_logger.info("Executing convergence thread")
+
+        # Wait for synchronization signal
+        self._start_flag.wait()
+
+        _start_time = time.time()
+        _estimates = {}
+        _converged = False
+
+        while not self._stop_flag.wait(CHECK_INTERVAL):
+            _elapsed = time.time() - _start_time
+            if _elapsed >= self._timeline[-1][0]:
+                break
+
+            _previous, _estimates = _estimates, self._estimate(_start_time)
+            if self._check(_previous, _estimates, motion.progress(self._timeline, _elapsed)):
+                module_logger.info("Bearing estimates for {} BSSIDs converged after {:.2f}s"
+                                   .format(len(_estimates), _elapsed))
+                _converged = True
+                self._stop_flag.set()
+                break
+
+        self._response_queue.put(_converged)
+
+    def _estimate(self, start_time):
+        """
+        Estimate the bearing of each BSSID heard so far
+
+        :param start_time: Time the rotation started
+        :type start_time: float
+        :return: Dictionary of bssid: bearing
+        :rtype: dict
+        """
+
+        _pcaps = self._session.segments(start_time) if self._session is not None else [self._pcap]
+        if not _pcaps:
+            return {}
+
+        _signal_df = pd.concat([process.read_signal(pcap, self._macs) for pcap in _pcaps], ignore_index=True)
+        # Session files are shared with earlier captures
+        _signal_df = _signal_df[_signal_df['timestamp'] >= start_time] if not _signal_df.empty else _signal_df
+        if _signal_df.empty:
+            return {}
+
+        _pdiff = (_signal_df['timestamp'].values - start_time).clip(min=0)
+        _signal_df['bearing_magnetic'] = (self._cw * np.interp(_pdiff, self._offsets, self._progress) + self._bearing) % 360
+
+        _estimates = {}
+        for bssid, group in _signal_df.groupby('bssid'):
+            if len(group) >= MIN_SAMPLES:
+                _estimates[bssid], _ = locate.interpolate(group, self._degrees)
+
+        return _estimates
+
+    def _check(self, previous, estimates, progress):
+        """
+        Check whether the estimates have converged
+
+        :param previous: Estimates from the previous check
+        :type previous: dict
+        :param estimates: Current estimates
+        :type estimates: dict
+        :param progress: Degrees the antenna has rotated so far
+        :type progress: float
+        :return: True if every estimate is stable and behind the antenna
+        :rtype: bool
+        """
+
+        if not estimates:
+            return False
+
+        for bssid, bearing in estimates.items():
+            if bssid not in previous:
+                return False
+            if abs((bearing - previous[bssid] + 180) % 360 - 180) > self._tolerance:
+                return False
+            if progress - (self._cw * (bearing - self._bearing)) % 360 < PEAK_MARGIN:
+                return False
+
+        return True
@@ -0,0 +1,152 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from localizer import locate
+
+module_logger = logging.getLogger(__name__)
+
+# Number of bearing bins in a cube (1 degree each by default)
+CUBE_BINS = 360
+
+
+class Cube:
+
+    def __init__(self, bssids, max_mw, sum_mw, count, degrees, bins=CUBE_BINS):
+        """
+        Per-capture aggregate of signal strength by bearing: for every BSSID, the max and mean power and the number of
+        beacons heard in each bearing bin. Guesses can be re-estimated, and captures fused, from cubes alone.
+
+        :param bssids: BSSID of each row
+        :type bssids: np.ndarray
+        :param max_mw: Max power (mW) in each bin, by BSSID
+        :type max_mw: np.ndarray
+        :param sum_mw: Total power (mW) in each bin, by BSSID
+        :type sum_mw: np.ndarray
+        :param count: Beacons in each bin, by BSSID
+        :type count: np.ndarray
+        :param degrees: Degrees covered by the capture(s)
+        :type degrees: int
+        :param bins: Number of bearing bins
+        :type bins: int
+        """
+
+        self.bssids = np.asarray(bssids, dtype=str)
+        self.max_mw = max_mw
+        self.sum_mw = sum_mw
+        self.count = count
+        self.degrees = degrees
+        self.bins = bins
+        self._rows = {bssid: i for i, bssid in enumerate(self.bssids)}
+
+    @classmethod
+    def build(cls, results, degrees, bins=CUBE_BINS, x='bearing_magnetic', y='mw'):
+        """
+        Aggregate the results of a capture
+
+        :param results: Results of process_capture
+        :type results: pd.DataFrame
+        :param degrees: Degrees covered by the capture
+        :type degrees: int
+        :param bins: Number of bearing bins
+        :type bins: int
+        :rtype: Cube
+        """
+
+        _codes, _bssids = pd.factorize(results['bssid'])
+        _bins = np.round(results[x].values.astype(float) * bins / 360).astype(int) % bins
+        _mw = results[y].values.astype(float)
+
+        _max_mw = np.zeros((len(_bssids), bins))
+        _sum_mw = np.zeros((len(_bssids), bins))
+        _count = np.zeros((len(_bssids), bins), dtype=np.uint32)
+        np.maximum.at(_max_mw, (_codes, _bins), _mw)
+        np.add.at(_sum_mw, (_codes, _bins), _mw)
+        np.add.at(_count, (_codes, _bins), 1)
+
+        return cls(np.asarray(_bssids), _max_mw, _sum_mw, _count, degrees, bins)
+
+    @property
+    def mean_mw(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sum_mw / self.count, np.nan)
+
+    def save(self, path):
+        np.savez_compressed(path, bssids=self.bssids, max_mw=self.max_mw, sum_mw=self.sum_mw, count=self.count,
+                            degrees=self.degrees, bins=self.bins)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['bssids'], data['max_mw'], data['sum_mw'], data['count'], int(data['degrees']),
+                       int(data['bins']))
+
+    def frame(self, bssid, power='max'):
+        """
+        Samples of a BSSID, one per occupied bin, in the form process_capture results take
+
+        :param bssid: BSSID
+        :type bssid: str
+        :param power: Power of each bin: 'max' or 'mean'
+        :type power: str
+        :return: DataFrame with bearing_magnetic, mw and ssi columns
+        :rtype: pd.DataFrame
+        """
+
+        _row = self._rows[bssid]
+        _occupied = self.count[_row] > 0
+        _mw = (self.max_mw[_row] if power == 'max' else self.mean_mw[_row])[_occupied]
+
+        return pd.DataFrame({'bearing_magnetic': np.flatnonzero(_occupied) * 360 / self.bins,
+                             'mw': _mw,
+                             'ssi': 10 * np.log10(_mw)})
+
+    def estimate(self, estimator=locate.estimate, power='max'):
+        """
+        Guess the bearing of every BSSID
+
+        :param estimator: Function of (samples, degrees) returning (guess, method, confidence, sharpness, density)
+        :type estimator: function
+        :param power: Power of each bin: 'max' or 'mean'
+        :type power: str
+        :return: DataFrame of bssid, beacons, bearing, method, confidence, sharpness and density
+        :rtype: pd.DataFrame
+        """
+
+        _rows = []
+        for bssid in self.bssids:
+            _guess, _method, _confidence, _sharpness, _density = estimator(self.frame(bssid, power), self.degrees)
+            _rows.append([bssid, int(self.count[self._rows[bssid]].sum()), _guess, _method, _confidence, _sharpness,
+                          _density])
+
+        return pd.DataFrame(_rows, columns=['bssid', 'beacons', 'bearing', 'method', 'confidence', 'sharpness',
+                                            'density'])
+
+
+def fuse(cubes):
+    """
+    Combine the cubes of several captures of the same site into one
+
+    :param cubes: Cubes with the same number of bins
+    :type cubes: list[Cube]
+    :rtype: Cube
+    """
+
+    if len(set(cube.bins for cube in cubes)) != 1:
+        raise ValueError("Cubes must have the same number of bins to be fused")
+
+    _bins = cubes[0].bins
+    _bssids = sorted(set().union(*(cube.bssids for cube in cubes)))
+    _rows = {bssid: i for i, bssid in enumerate(_bssids)}
+
+    _max_mw = np.zeros((len(_bssids), _bins))
+    _sum_mw = np.zeros((len(_bssids), _bins))
+    _count = np.zeros((len(_bssids), _bins), dtype=np.uint32)
+    for cube in cubes:
+        _index = np.array([_rows[bssid] for bssid in cube.bssids], dtype=int)
+        _max_mw[_index] = np.maximum(_max_mw[_index], cube.max_mw)
+        _sum_mw[_index] += cube.sum_mw
+        _count[_index] += cube.count
+
+    return Cube(np.array(_bssids), _max_mw, _sum_mw, _count, max(cube.degrees for cube in cubes), _bins)
@@ -0,0 +1,204 @@
+import datetime
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+module_logger = logging.getLogger(__name__)
+
+# Directory, under the working directory, holding the consolidated dataset
+DATASET_PATH = "dataset"
+# Decimal places of the capture position that identify a site (0.01 degrees is ~1km)
+SITE_PLACES = 2
+# Longest time a capture's rows may extend past the day it started, in seconds
+CAPTURE_SPAN = 86400
+
+OBSERVATIONS = "observations"
+GUESSES = "guesses"
+
+# Strings repeated for every row are dictionary encoded
+_dictionary = pa.dictionary(pa.int32(), pa.string())
+
+# Columns of the results of process_capture, with the compact types of process.results_dtypes
+_observations_schema = pa.schema([('capture', _dictionary),
+                                  ('pass', _dictionary),
+                                  ('duration', pa.float32()),
+                                  ('hop-rate', pa.float32()),
+                                  ('timestamp', pa.float64()),
+                                  ('bssid', _dictionary),
+                                  ('ssid', _dictionary),
+                                  ('encryption', _dictionary),
+                                  ('cipher', _dictionary),
+                                  ('auth', _dictionary),
+                                  ('ssi', pa.int8()),
+                                  ('channel', pa.uint16()),
+                                  ('bearing_magnetic', pa.float32()),
+                                  ('bearing_true', pa.float32()),
+                                  ('lat', pa.float64()),
+                                  ('lon', pa.float64()),
+                                  ('alt', pa.float32()),
+                                  ('lat_err', pa.float32()),
+                                  ('lon_error', pa.float32()),
+                                  ('alt_error', pa.float32()),
+                                  ('mw', pa.float32()),
+                                  ])
+
+# Columns of a -guess.csv, with the capture they came from
+_guesses_schema = pa.schema([('capture', pa.string()),
+                             ('pass', pa.string()),
+                             ('start', pa.float64()),
+                             ('ssid', pa.string()),
+                             ('bssid', pa.string()),
+                             ('channel', pa.int64()),
+                             ('security', pa.string()),
+                             ('strength', pa.float64()),
+                             ('method', pa.string()),
+                             ('bearing', pa.float64()),
+                             ('confidence', pa.float64()),
+                             ('sharpness', pa.float64()),
+                             ('density', pa.float64()),
+                             ])
+
+_schemas = {OBSERVATIONS: _observations_schema, GUESSES: _guesses_schema}
+# Column holding the time of each row, used to prune partitions by date
+_time_columns = {OBSERVATIONS: 'timestamp', GUESSES: 'start'}
+
+_partitioning = ds.partitioning(pa.schema([('date', pa.string()), ('site', pa.string())]), flavor='hive')
+
+
+def capture_site(meta):
+    """
+    Site of a capture: its position, rounded
+
+    :param meta: Capture meta
+    :type meta: CaptureMeta
+    :rtype: str
+    """
+
+    if meta.pos_lat is None or meta.pos_lon is None:
+        return "unknown"
+
+    return "{:.{places}f}_{:.{places}f}".format(meta.pos_lat, meta.pos_lon, places=SITE_PLACES)
+
+
+def _date(timestamp):
+    return datetime.date.fromtimestamp(timestamp).isoformat()
+
+
+def _partition(meta, table, root):
+    """
+    Path of a capture's file in the dataset: <root>/<table>/date=<date>/site=<site>/<capture>.parquet
+    """
+
+    _name = "{}-{}-{}.parquet".format(meta.name, meta.pass_num if meta.pass_num is not None else 0, int(meta.start))
+    return os.path.join(root, table, "date=" + _date(meta.start), "site=" + capture_site(meta), _name)
+
+
+def _to_table(df, schema):
+    """
+    Coerce a DataFrame to a fixed schema, so that every file in the dataset can be read as one
+    """
+
+    df = df.reindex(columns=schema.names)
+    for field in schema:
+        if pa.types.is_string(field.type) or pa.types.is_dictionary(field.type):
+            _column = df[field.name].astype(object)
+            df[field.name] = _column.where(_column.isna(), _column.astype(str))
+
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def contains(meta, root=DATASET_PATH):
+    """
+    :return: True if the capture has been added to the dataset
+    :rtype: bool
+    """
+
+    return os.path.isfile(_partition(meta, OBSERVATIONS, root))
+
+
+def append(meta, path, results, root=DATASET_PATH):
+    """
+    Add a processed capture, and its guesses if it has any, to the dataset. Adding a capture again replaces it.
+
+    :param meta: Capture meta
+    :type meta: CaptureMeta
+    :param path: Path of the capture
+    :type path: str
+    :param results: Results of process_capture
+    :type results: pd.DataFrame
+    :param root: Path of the dataset
+    :type root: str
+    """
+
+    _tables = {OBSERVATIONS: results}
+
+    if meta.guess and os.path.isfile(os.path.join(path, meta.guess)):
+        _guesses = pd.read_csv(os.path.join(path, meta.guess), index_col=0)
+        _guesses['capture'] = meta.name
+        _guesses['pass'] = meta.pass_num
+        _guesses['start'] = meta.start
+        _tables[GUESSES] = _guesses
+
+    for table, df in _tables.items():
+        _path = _partition(meta, table, root)
+        os.makedirs(os.path.dirname(_path), exist_ok=True)
+        pq.write_table(_to_table(df, _schemas[table]), _path)
+
+    module_logger.debug("Added {} to the dataset".format(meta.name))
+
+
+def query(bssid=None, since=None, until=None, site=None, table=OBSERVATIONS, root=DATASET_PATH):
+    """
+    Read rows from the dataset. Partitions outside of the time range or site are not read at all.
+
+    :param bssid: (Optional) BSSID, or list of BSSIDs, to return rows for
+    :type bssid: str
+    :param since: (Optional) Earliest time to return rows for (timestamp or datetime)
+    :type since: float
+    :param until: (Optional) Latest time to return rows for (timestamp or datetime)
+    :type until: float
+    :param site: (Optional) Site to return rows for
+    :type site: str
+    :param table: Table to read: observations (every beacon) or guesses (bearing estimates)
+    :type table: str
+    :param root: Path of the dataset
+    :type root: str
+    :return: DataFrame of matching rows, with date and site columns
+    :rtype: pd.DataFrame
+    """
+
+    _schema = _schemas[table]
+    _path = os.path.join(root, table)
+    if not os.path.isdir(_path):
+        return _schema.empty_table().to_pandas()
+
+    _dataset = ds.dataset(_path, schema=_schema.append(pa.field('date', pa.string())).append(pa.field('site', pa.string())),
+                          format='parquet', partitioning=_partitioning)
+
+    _filters = []
+    if bssid is not None:
+        _filters.append(ds.field('bssid').isin([bssid] if isinstance(bssid, str) else list(bssid)))
+    if site is not None:
+        _filters.append(ds.field('site') == site)
+    if isinstance(since, datetime.datetime):
+        since = since.timestamp()
+    if isinstance(until, datetime.datetime):
+        until = until.timestamp()
+    # Partitions are dated by the start of their capture, so a capture that started the day before may still hold
+    # rows after since; the row times make the exact cut
+    if since is not None:
+        _filters.append(ds.field('date') >= _date(since - CAPTURE_SPAN))
+        _filters.append(ds.field(_time_columns[table]) >= float(since))
+    if until is not None:
+        _filters.append(ds.field('date') <= _date(until))
+        _filters.append(ds.field(_time_columns[table]) <= float(until))
+
+    _filter = None
+    for f in _filters:
+        _filter = f if _filter is None else _filter & f
+
+    return _dataset.to_table(filter=_filter).to_pandas()
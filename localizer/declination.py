@@ -0,0 +1,92 @@
+import datetime
+import logging
+import threading
+from functools import lru_cache
+
+from geomag import WorldMagneticModel
+
+module_logger = logging.getLogger(__name__)
+
+# Decimal places positions are rounded to before lookup (0.01 degrees is ~1km, well below any change in declination)
+POSITION_PLACES = 2
+# Altitudes are rounded to a multiple of this (ft)
+ALTITUDE_STEP = 1000
+# Number of (position, date) lookups to keep
+CACHE_SIZE = 4096
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def _get_model():
+    """
+    Process-wide magnetic model, which loads its coefficient file once on first use
+
+    :rtype: WorldMagneticModel
+    """
+
+    global _model
+    with _model_lock:
+        if _model is None:
+            module_logger.debug("Loading world magnetic model")
+            _model = WorldMagneticModel()
+        return _model
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _lookup(lat, lon, alt, ordinal):
+    return _get_model().calc_mag_field(lat, lon, alt, date=datetime.date.fromordinal(ordinal)).declination
+
+
+def _key(lat, lon, alt=0, date=None):
+    """
+    Rounded cache key for a lookup
+    """
+
+    if date is None:
+        date = datetime.date.today()
+    elif isinstance(date, (int, float)):
+        date = datetime.date.fromtimestamp(date)
+
+    return (round(float(lat), POSITION_PLACES), round(float(lon), POSITION_PLACES),
+            round(float(alt or 0) / ALTITUDE_STEP) * ALTITUDE_STEP, date.toordinal())
+
+
+def declination(lat, lon, alt=0, date=None):
+    """
+    Magnetic declination at a position
+
+    :param lat: Latitude
+    :type lat: float
+    :param lon: Longitude
+    :type lon: float
+    :param alt: Altitude (ft)
+    :type alt: float
+    :param date: Date, or timestamp, of the observation; today by default
+    :type date: datetime.date
+    :return: Declination (degrees east of true north)
+    :rtype: float
+    """
+
+    return _lookup(*_key(lat, lon, alt, date))
+
+
+def declinations(positions):
+    """
+    Resolve the declination of many positions at once, looking up each distinct (rounded) position and date only once
+
+    :param positions: Iterable of (lat, lon, alt, date)
+    :type positions: iterable
+    :return: List of declinations, in the order of positions
+    :rtype: list[float]
+    """
+
+    _keys = [_key(*position) for position in positions]
+    _resolved = {key: _lookup(*key) for key in set(_keys)}
+    module_logger.debug("Resolved declination of {} positions with {} lookups".format(len(_keys), len(_resolved)))
+
+    return [_resolved[key] for key in _keys]
+
+
+def cache_info():
+    return _lookup.cache_info()
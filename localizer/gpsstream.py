@@ -0,0 +1,513 @@
+import calendar
+import csv
+import json
+import logging
+import math
+import socket
+import threading
+import time
+
+module_logger = logging.getLogger(__name__)
+
+GPSD_HOST = '127.0.0.1'
+GPSD_PORT = 2947
+# Seconds to wait for a report before checking whether to stop
+READ_TIMEOUT = 1
+# Write buffer for the nmea log (bytes)
+NMEA_BUFFER_SIZE = 1 << 16
+# Fixes within this distance (m) of the rolling position estimate count as not moving
+STATIONARY_RADIUS = 5
+# Seconds without moving before the platform is considered stationary
+STATIONARY_TIME = 10
+# Approximate length of a degree of latitude (m)
+_METERS_PER_DEGREE = 111320
+
+# Columns of the -gps.csv. timestamp is the time of the fix by the gps clock, and received is when it arrived by the
+# host clock, which is the clock beacons are timestamped with
+coordinates_csv_fieldnames = ['timestamp', 'lat', 'lon', 'alt', 'lat_err', 'lon_error', 'alt_error', 'received']
+position_fieldnames = coordinates_csv_fieldnames[1:7]
+
+
+class RunningStats:
+
+    def __init__(self):
+        """
+        Running mean and variance (Welford's algorithm)
+        """
+
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+
+    def update(self, value):
+        if value is None:
+            return
+        self.count += 1
+        _delta = value - self.mean
+        self.mean += _delta / self.count
+        self._m2 += _delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+def report_time(report):
+    """
+    Time of a gpsd report, falling back to the time it was received
+
+    :param report: gpsd JSON report
+    :type report: dict
+    :return: Unix timestamp
+    :rtype: float
+    """
+
+    _time = report.get('time')
+    if isinstance(_time, (int, float)):
+        return float(_time)
+
+    if isinstance(_time, str):
+        _stamp, _, _fraction = _time.rstrip('Z').partition('.')
+        try:
+            return calendar.timegm(time.strptime(_stamp, '%Y-%m-%dT%H:%M:%S')) + float('0.' + (_fraction or '0'))
+        except ValueError:
+            pass
+
+    return time.time()
+
+
+class GpsdClient:
+
+    def __init__(self, host=GPSD_HOST, port=GPSD_PORT, nmea=False):
+        """
+        Streaming gpsd client: watches gpsd over its JSON socket protocol and yields every report as it arrives
+
+        :param host: gpsd host
+        :type host: str
+        :param port: gpsd port
+        :type port: int
+        :param nmea: Also watch the raw NMEA sentences
+        :type nmea: bool
+        """
+
+        self._host = host
+        self._port = port
+        self._nmea = nmea
+        self._socket = None
+        self._buffer = b''
+
+    def connect(self):
+        self._socket = socket.create_connection((self._host, self._port), timeout=READ_TIMEOUT)
+        _watch = {"enable": True, "json": True}
+        if self._nmea:
+            _watch["nmea"] = True
+        self._socket.sendall('?WATCH={};\n'.format(json.dumps(_watch)).encode())
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def lines(self, stop_flag=None, until=None):
+        """
+        Yield each line sent by gpsd until the stop flag is set, the time runs out or gpsd closes the connection
+
+        :param stop_flag: (Optional) Event that stops reading when set
+        :type stop_flag: threading.Event
+        :param until: (Optional) Time to stop reading at
+        :type until: float
+        :return: Generator of (time received, line)
+        """
+
+        if stop_flag is None:
+            stop_flag = threading.Event()
+
+        if self._socket is None:
+            self.connect()
+
+        while not stop_flag.is_set() and (until is None or time.time() < until):
+            while b'\n' in self._buffer:
+                _line, self._buffer = self._buffer.split(b'\n', 1)
+                yield time.time(), _line.rstrip(b'\r')
+                if stop_flag.is_set():
+                    return
+
+            try:
+                _data = self._socket.recv(4096)
+            except socket.timeout:
+                continue
+            if not _data:
+                return
+            self._buffer += _data
+
+    def reports(self, stop_flag=None, until=None):
+        """
+        Yield each JSON report sent by gpsd
+
+        :return: Generator of (time received, report)
+        """
+
+        for received, line in self.lines(stop_flag, until):
+            _report = decode(line)
+            if _report is not None:
+                yield received, _report
+
+
+def fix_row(report):
+    """
+    Row of the -gps.csv for a gpsd report
+
+    :param report: gpsd JSON report
+    :type report: dict
+    :return: [timestamp, lat, lon, alt, lat error, lon error, alt error], or None if the report is not a 2D/3D fix
+    :rtype: list
+    """
+
+    if report.get('class') != 'TPV' or report.get('mode', 0) < 2 or 'lat' not in report or 'lon' not in report:
+        return None
+
+    return [report_time(report), report['lat'], report['lon'], report.get('alt'),
+            report.get('epy'), report.get('epx'), report.get('epv')]
+
+
+def decode(line):
+    """
+    Decode a line from gpsd
+
+    :param line: Line received from gpsd
+    :type line: bytes
+    :return: JSON report, or None if the line is not a JSON report
+    :rtype: dict
+    """
+
+    if not line.startswith(b'{'):
+        return None
+
+    try:
+        return json.loads(line.decode())
+    except ValueError:
+        module_logger.debug("Could not decode gpsd report {}".format(line))
+        return None
+
+
+def _position_stats():
+    return {name: RunningStats() for name in position_fieldnames}
+
+
+def _summary(stats):
+    return tuple(stats[name].mean for name in position_fieldnames)
+
+
+class TrackRecorder:
+
+    def __init__(self, csv_output):
+        """
+        Record TPV reports to the -gps.csv as they arrive, keeping running statistics of position and error
+
+        :param csv_output: Path of the csv to write
+        :type csv_output: str
+        """
+
+        self._csv = open(csv_output, 'w', newline='')
+        self._writer = csv.writer(self._csv, dialect="unix")
+        self._writer.writerow(coordinates_csv_fieldnames)
+        self.stats = _position_stats()
+        self.sky = None
+
+    def add(self, report, received=None):
+        """
+        Add a gpsd report
+
+        :param report: gpsd JSON report
+        :type report: dict
+        :param received: (Optional) Time the report was received; now by default
+        :type received: float
+        :return: True if the report was a fix that was recorded
+        :rtype: bool
+        """
+
+        if report.get('class') == 'SKY':
+            self.sky = report
+            return False
+
+        _row = fix_row(report)
+        if _row is None:
+            return False
+
+        self._writer.writerow(_row + [received if received is not None else time.time()])
+        for name, value in zip(position_fieldnames, _row[1:]):
+            self.stats[name].update(value)
+
+        return True
+
+    @property
+    def count(self):
+        return self.stats['lat'].count
+
+    def summary(self):
+        """
+        :return: (lat, lon, alt, lat error, lon error, alt error) averages
+        :rtype: tuple
+        """
+
+        return _summary(self.stats)
+
+    def close(self):
+        self._csv.close()
+
+
+class Recording:
+
+    def __init__(self, csv_output, nmea_output=None):
+        """
+        The gps record of a single capture: fixes to the -gps.csv, and raw sentences to the nmea log
+
+        :param csv_output: Path of the csv to write
+        :type csv_output: str
+        :param nmea_output: (Optional) Path of the nmea log to write
+        :type nmea_output: str
+        """
+
+        self.track = TrackRecorder(csv_output)
+        self._nmea = open(nmea_output, 'wb', buffering=NMEA_BUFFER_SIZE) if nmea_output is not None else None
+
+    def add(self, line, report=None, received=None):
+        """
+        Add a line received from gpsd
+
+        :param line: Line received from gpsd
+        :type line: bytes
+        :param report: (Optional) The line, already decoded
+        :type report: dict
+        :param received: (Optional) Time the line was received; now by default
+        :type received: float
+        """
+
+        if report is None:
+            report = decode(line)
+
+        if report is not None:
+            self.track.add(report, received)
+        elif self._nmea is not None and line[:1] in (b'$', b'!'):
+            self._nmea.write(line + b'\r\n')
+
+    def close(self):
+        self.track.close()
+        if self._nmea is not None:
+            self._nmea.close()
+
+
+def record(csv_output, duration, stop_flag=None, client=None, nmea_output=None):
+    """
+    Record every fix gpsd reports for a duration. When an nmea output is given, the raw sentences gpsd relays on the
+    same connection are logged to it, so the nmea log and the csv come from the same stream.
+
+    :param csv_output: Path of the csv to write
+    :type csv_output: str
+    :param duration: Seconds to record for
+    :type duration: float
+    :param stop_flag: (Optional) Event that ends recording early when set
+    :type stop_flag: threading.Event
+    :param client: (Optional) Client to read from; it must watch nmea to log sentences
+    :type client: GpsdClient
+    :param nmea_output: (Optional) Path of the nmea log to write
+    :type nmea_output: str
+    :return: (lat, lon, alt, lat error, lon error, alt error) averages
+    :rtype: tuple
+    """
+
+    if stop_flag is None:
+        stop_flag = threading.Event()
+
+    _client = client if client is not None else GpsdClient(nmea=nmea_output is not None)
+    _recording = Recording(csv_output, nmea_output)
+    _end = time.time() + duration
+
+    try:
+        for received, line in _client.lines(stop_flag, _end):
+            _recording.add(line, received=received)
+    except OSError as e:
+        module_logger.error("Could not read from gpsd ({})".format(e))
+    finally:
+        _recording.close()
+        if client is None:
+            _client.close()
+
+    module_logger.info("Recorded {} gps fixes".format(_recording.track.count))
+    return _recording.track.summary()
+
+
+def distance(lat1, lon1, lat2, lon2):
+    """
+    Approximate distance between two nearby positions
+
+    :return: Distance in meters
+    :rtype: float
+    """
+
+    _dlat = (lat2 - lat1) * _METERS_PER_DEGREE
+    _dlon = (lon2 - lon1) * _METERS_PER_DEGREE * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(_dlat, _dlon)
+
+
+class GpsService(threading.Thread):
+
+    def __init__(self, client=None, stationary_radius=STATIONARY_RADIUS, stationary_time=STATIONARY_TIME):
+        """
+        Background gps service shared across captures. It keeps a single gpsd connection warm, tracks the latest fix
+        and keeps a rolling estimate of the position for as long as the platform stays put, so that captures can start
+        without waiting for a fix and reuse the position accumulated across captures.
+
+        :param client: (Optional) Client to read from; it must watch nmea for captures to log sentences
+        :type client: GpsdClient
+        :param stationary_radius: Fixes within this many meters (or the fix error, if larger) count as not moving
+        :type stationary_radius: float
+        :param stationary_time: Seconds without moving before the platform is considered stationary
+        :type stationary_time: float
+        """
+
+        super().__init__()
+
+        self.daemon = True
+        self._client = client if client is not None else GpsdClient(nmea=True)
+        self._stationary_radius = stationary_radius
+        self._stationary_time = stationary_time
+        self._lock = threading.Lock()
+        self._stop_flag = threading.Event()
+        self._recordings = []
+        self._estimate = _position_stats()
+        self._still_since = None
+        self.latest = None
+        self.fix = threading.Event()
+
+    def run(self):
+        module_logger.info("Starting gps service")
+
+        while not self._stop_flag.is_set():
+            try:
+                for received, line in self._client.lines(self._stop_flag):
+                    _report = decode(line)
+                    with self._lock:
+                        for recording in self._recordings:
+                            recording.add(line, _report, received)
+                        if _report is not None and _report.get('class') == 'TPV':
+                            self._update(_report)
+            except OSError as e:
+                module_logger.error("Could not read from gpsd ({}), reconnecting".format(e))
+
+            # gpsd closed the connection
+            self.fix.clear()
+            self._client.close()
+            self._stop_flag.wait(READ_TIMEOUT)
+
+        self._client.close()
+
+    def _update(self, report):
+        """
+        Track the latest fix and the rolling position estimate
+        """
+
+        self.latest = report
+        if report.get('mode', 0) == 3:
+            self.fix.set()
+        else:
+            self.fix.clear()
+
+        _row = fix_row(report)
+        if _row is None:
+            return
+
+        # Start a new estimate whenever the platform moves away from the current one
+        if self._estimate['lat'].count:
+            _error = max(report.get('epx', 0) or 0, report.get('epy', 0) or 0)
+            if distance(self._estimate['lat'].mean, self._estimate['lon'].mean, _row[1], _row[2]) > \
+                    max(self._stationary_radius, 2 * _error):
+                module_logger.info("Platform moved, restarting position estimate")
+                self._estimate = _position_stats()
+                self._still_since = None
+
+        if self._still_since is None:
+            self._still_since = _row[0]
+
+        for name, value in zip(position_fieldnames, _row[1:]):
+            self._estimate[name].update(value)
+
+    @property
+    def stationary(self):
+        with self._lock:
+            return self._still_since is not None and \
+                (fix_row(self.latest) or [0])[0] - self._still_since >= self._stationary_time
+
+    def position(self):
+        """
+        :return: (lat, lon, alt, lat error, lon error, alt error) rolling averages, and the number of fixes in them
+        :rtype: (tuple, int)
+        """
+
+        with self._lock:
+            return _summary(self._estimate), self._estimate['lat'].count
+
+    def wait_for_fix(self, cancel_flag=None):
+        """
+        Block until there is a 3D fix, which returns immediately while the service is warm
+
+        :param cancel_flag: (Optional) Event that stops waiting when set
+        :type cancel_flag: threading.Event
+        :return: True once there is a 3D fix, False if waiting was canceled
+        :rtype: bool
+        """
+
+        if cancel_flag is None:
+            cancel_flag = threading.Event()
+
+        _time_waited = 0
+        while not self.fix.wait(1):
+            print("Waiting for {}s for 3D gps fix (current mode = '{}' - press 'CTRL-c to cancel)"
+                  .format(_time_waited, (self.latest or {}).get('mode')))
+            if cancel_flag.is_set():
+                return False
+            _time_waited += 1
+
+        return True
+
+    def start_recording(self, csv_output, nmea_output=None):
+        """
+        Start recording a capture
+
+        :return: Recording to pass to stop_recording
+        :rtype: Recording
+        """
+
+        _recording = Recording(csv_output, nmea_output)
+        with self._lock:
+            self._recordings.append(_recording)
+        return _recording
+
+    def stop_recording(self, recording):
+        """
+        Stop recording a capture. While the platform is stationary the rolling position estimate, which extends across
+        captures, is used in place of the capture's own average.
+
+        :param recording: Recording returned by start_recording
+        :type recording: Recording
+        :return: (lat, lon, alt, lat error, lon error, alt error) averages
+        :rtype: tuple
+        """
+
+        with self._lock:
+            self._recordings.remove(recording)
+        recording.close()
+
+        _estimate, _count = self.position()
+        if self.stationary and _count > recording.track.count:
+            module_logger.info("Platform is stationary, using position averaged over {} fixes".format(_count))
+            return _estimate
+
+        return recording.track.summary()
+
+    def stop(self):
+        self._stop_flag.set()
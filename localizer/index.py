@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+
+import pandas as pd
+
+module_logger = logging.getLogger(__name__)
+
+# File, under the working directory, holding the index
+INDEX_PATH = "bssid-index.json"
+
+
+class BssidIndex:
+
+    def __init__(self, path=INDEX_PATH):
+        """
+        Inverted index of the captures each BSSID was heard in, kept up to date as captures are processed so that an
+        access point's history can be looked up without reading any results
+
+        :param path: Path of the index file
+        :type path: str
+        """
+
+        self._path = path
+        # bssid: {capture: {start, ssid, beacons, max_ssi, bearing, confidence}}
+        self._bssids = {}
+        # ssid: set of bssids
+        self._ssids = {}
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        """
+        Load the index, or start a new one if there isn't one yet
+
+        :param path: Path of the index file
+        :type path: str
+        :rtype: BssidIndex
+        """
+
+        _index = cls(path)
+        if os.path.isfile(path):
+            with open(path, 'rt') as index_file:
+                _index._bssids = json.load(index_file)
+            for bssid, captures in _index._bssids.items():
+                for entry in captures.values():
+                    _index._ssids.setdefault(entry['ssid'], set()).add(bssid)
+
+        return _index
+
+    def save(self):
+        # Write to a temporary file first so that an interrupted save doesn't lose the index
+        _tmp = self._path + ".tmp"
+        with open(_tmp, 'w') as index_file:
+            json.dump(self._bssids, index_file)
+        os.replace(_tmp, self._path)
+
+    def add(self, capture, start, results, guesses=None):
+        """
+        Add (or replace) a processed capture
+
+        :param capture: Capture id (its path, relative to the working directory)
+        :type capture: str
+        :param start: Start time of the capture
+        :type start: float
+        :param results: Results of process_capture
+        :type results: pd.DataFrame
+        :param guesses: (Optional) Guessed bearings of the capture, as in a -guess.csv
+        :type guesses: pd.DataFrame
+        """
+
+        _guesses = {}
+        if guesses is not None:
+            _guesses = {row.bssid: row for row in guesses.itertuples()}
+
+        self.remove(capture)
+
+        if results.empty:
+            return
+
+        _summary = results.groupby('bssid', observed=True).agg(ssid=('ssid', 'first'), beacons=('ssi', 'size'), max_ssi=('ssi', 'max'))
+        for bssid, row in _summary.iterrows():
+            _guess = _guesses.get(bssid)
+            _ssid = row['ssid'] if isinstance(row['ssid'], str) else None
+            self._bssids.setdefault(bssid, {})[capture] = {
+                'start': start,
+                'ssid': _ssid,
+                'beacons': int(row['beacons']),
+                'max_ssi': int(row['max_ssi']),
+                'bearing': float(_guess.bearing) if _guess is not None else None,
+                'confidence': float(_guess.confidence) if getattr(_guess, 'confidence', None) is not None else None,
+            }
+            self._ssids.setdefault(_ssid, set()).add(bssid)
+
+    def remove(self, capture):
+        """
+        Remove a capture, and any BSSIDs and SSIDs only it had heard
+
+        :param capture: Capture id (its path, relative to the working directory)
+        :type capture: str
+        """
+
+        for bssid in [b for b, captures in self._bssids.items() if capture in captures]:
+            _captures = self._bssids[bssid]
+            _ssid = _captures.pop(capture)['ssid']
+            if not _captures:
+                del self._bssids[bssid]
+            # Keep the SSID's reference if another capture heard the BSSID advertising it
+            if not any(entry['ssid'] == _ssid for entry in _captures.values()) and _ssid in self._ssids:
+                self._ssids[_ssid].discard(bssid)
+                if not self._ssids[_ssid]:
+                    del self._ssids[_ssid]
+
+    def add_capture(self, meta, path, results):
+        """
+        Add a processed capture, along with its guesses if it has any
+
+        :param meta: Capture meta
+        :type meta: CaptureMeta
+        :param path: Path of the capture
+        :type path: str
+        :param results: Results of process_capture
+        :type results: pd.DataFrame
+        """
+
+        _guesses = None
+        if meta.guess and os.path.isfile(os.path.join(path, meta.guess)):
+            _guesses = pd.read_csv(os.path.join(path, meta.guess), index_col=0)
+
+        self.add(os.path.relpath(path), meta.start, results, _guesses)
+
+    def history(self, bssid):
+        """
+        Every capture a BSSID was heard in
+
+        :param bssid: BSSID
+        :type bssid: str
+        :return: List of (capture, entry) ordered by capture start, where entry is a dict of start, ssid, beacons,
+                 max_ssi, bearing and confidence
+        :rtype: list
+        """
+
+        return sorted(self._bssids.get(bssid.lower(), {}).items(), key=lambda item: item[1]['start'])
+
+    def bssids(self, ssid):
+        """
+        :return: BSSIDs advertising an SSID
+        :rtype: set
+        """
+
+        return self._ssids.get(ssid, set())
+
+    def coverage(self, bssid):
+        """
+        :return: Number of captures that have a guessed bearing for a BSSID
+        :rtype: int
+        """
+
+        return sum(1 for entry in self._bssids.get(bssid.lower(), {}).values() if entry['bearing'] is not None)
+
+    def __len__(self):
+        return len(self._bssids)
+
+    def __contains__(self, bssid):
+        return bssid.lower() in self._bssids
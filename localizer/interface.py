@@ -2,14 +2,11 @@ import atexit
 import logging
 import re
 import shutil
-import threading
-import time
 from subprocess import call, run, PIPE, CalledProcessError
 
 from tqdm import tqdm
 
 import localizer
-from localizer.meta import OPTIMAL_BEACON_INT, STD_CHANNEL_DISTANCE, IEEE80211bg
 
 module_logger = logging.getLogger(__name__)
 
@@ -176,76 +173,28 @@ def set_channel(iface, channel):
         return False
 
 
-class ChannelThread(threading.Thread):
-    def __init__(self, event_flag, iface, duration, hop_int=OPTIMAL_BEACON_INT, response_queue=None, distance=STD_CHANNEL_DISTANCE, init_chan=None, channels=IEEE80211bg):
-        """
-        Wait for commands on the queue and asynchronously change channels of wireless interface with specified timing.
-
-        :param command_queue queue.Queue: A queue to read commands in the format (iface, iterations, hop_int)
-        :param channels list[int]: A list of channels to iterate over
-        """
-
-        super().__init__()
-
-        module_logger.info("Starting Channel Hopper Thread")
-
-        self.daemon = True
-        self._event_flag = event_flag
-        self._iface = iface
-        self._duration = duration
-        self._hop_int = hop_int
-        self._distance = distance
-        self._response_queue = response_queue
-        self._channels = channels
-
-        # Validate initial channel, if given
-        self._init_chan = init_chan
-        if self._init_chan and self._init_chan not in self._channels:
-            raise ValueError("If you specify an initial channel, it must be in the list of channels")
-
-        # Ensure we are in monitor mode
-        if get_interface_mode(self._iface) != "monitor":
-            set_interface_mode(self._iface, "monitor")
-        assert(get_interface_mode(self._iface) == "monitor")
-
-    def run(self):
-
-        _chan_len = len(self._channels)
-
-        # Build local channel str list for speed
-        _channels = [str(channel) for channel in self._channels]
-
-        # Initial channel position - will cycle through all in _channels
-        if self._init_chan:
-            _chan = self._channels.index(self._init_chan)
-        else:
-            _chan = 0
-        set_channel(self._iface, _channels[_chan])  # Set channel to first channel
-
-        # Wait for synchronization signal
-        self._event_flag.wait()
-
-        _start_time = time.time()
-        _stop_time = _start_time + self._duration
+def prepare(iface, channel=None):
+    """
+    Put an interface into monitor mode and tune it to its initial channel ahead of a capture
 
-        # Only hop channels if we have a list of channels to hop, and our duration is greater than 0
-        if self._hop_int > 0 and len(self._channels) > 1:
+    :param iface: Interface to prepare
+    :type iface: str
+    :param channel: Initial channel, if any
+    :type channel: int
+    :return: True if the interface is in monitor mode
+    :rtype: bool
+    """
 
-            # HOP CHANNELS https://github.com/elBradford/snippets/blob/master/chanhop.sh
-            while _stop_time > time.time():
-                time.sleep(self._hop_int)
-                _chan = (_chan + self._distance) % _chan_len
-                set_channel(self._iface, _channels[_chan])
+    if get_interface_mode(iface) != "monitor":
+        set_interface_mode(iface, "monitor")
 
-        else:
-            time.sleep(_stop_time - time.time())
+    if get_interface_mode(iface) != "monitor":
+        return False
 
-        _end_time = time.time()
+    if channel:
+        set_channel(iface, str(channel))
 
-        if self._response_queue is not None:
-            self._response_queue.put((_start_time, _end_time))
-        module_logger.info("Hopped {} channels for {:.2f}s (expected {}s)"
-                           .format(len(self._channels), _end_time-_start_time, self._duration))
+    return True
 
 
 @atexit.register
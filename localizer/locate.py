@@ -1,6 +1,11 @@
 import numpy as np
 import pandas as pd
 
+# Confidence scoring
+PEAK_WINDOW = 15  # Degrees either side of a guess considered to be on the peak
+PEAK_SAMPLES = 6  # Number of samples on the peak for full density
+SHARPNESS_DB = 10  # Contrast between peak and median signal for full sharpness
+
 
 def locate_naive(series):
     if len(series) > 360:
@@ -62,6 +67,44 @@ def interpolate(series, bearing):
     return _guess, _method
 
 
+def confidence(dataframe, guess, method, x='bearing_magnetic', y='ssi'):
+    """
+    Score how well a guess is supported by the samples it was derived from
+
+    :param dataframe: Samples for a single BSSID
+    :param guess: Guessed bearing
+    :param method: Method used to produce the guess
+    :return: (confidence, sharpness, density), each between 0 and 1
+    """
+
+    # Samples close to the guessed bearing
+    _offsets = (dataframe[x] - guess + 180) % 360 - 180
+    _density = min(1., (_offsets.abs() <= PEAK_WINDOW).sum() / PEAK_SAMPLES)
+
+    # Contrast between the peak and the typical signal
+    _sharpness = min(1., max(0., (dataframe[y].max() - dataframe[y].median()) / SHARPNESS_DB))
+
+    return _sharpness * _density * _method_confidence.get(method, 0), _sharpness, _density
+
+
+def estimate(dataframe, bearing):
+    """
+    Guess the bearing of a BSSID and score the guess
+    :param dataframe: Samples for a single BSSID
+    :param bearing: Degrees covered by the capture
+    :return: (guess, method, confidence, sharpness, density)
+    """
+
+    _guess, _method = interpolate(dataframe, bearing)
+    return (_guess, _method) + confidence(dataframe, _guess, _method)
+
+
+_method_confidence = {
+    'naive': .5,
+    'slinear': .75,
+    'pchip': 1,
+}
+
 _error_methods = {
     'naive': locate_naive,
     'quadratic': lambda series: locate_interpolate(series, 'quadratic'),
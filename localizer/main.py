@@ -24,11 +24,25 @@ def main():
     parser.add_argument("-m", "--macs",
                         help="If processing, a file containing mac addresses to filter on")
     parser.add_argument("-ccw", "--counterclockwise",
-                        help="Set this flag if the captures were performed in a counter-clockwise direction",
+                        help="Set this flag if the captures were performed in a counter-clockwise direction (captures that record their direction ignore this)",
+                        action="store_true")
+    parser.add_argument("--moving",
+                        help="If processing, position each beacon along the gps track instead of at the capture's average position (for captures taken on the move)",
                         action="store_true")
     me_group.add_argument("-s", "--shell",
                           help="Start the localizer shell",
                           action="store_true")
+    me_group.add_argument("--consolidate",
+                          help="Add processed captures that are missing from the consolidated dataset",
+                          action="store_true")
+    me_group.add_argument("-q", "--query",
+                          help="Query the consolidated dataset for 'observations' (every beacon) or 'guesses'",
+                          choices=["observations", "guesses"])
+    parser.add_argument("--bssid",
+                        help="If querying, the BSSID to return rows for (may be repeated)",
+                        action="append")
+    parser.add_argument("--since",
+                        help="If querying, the earliest date/time to return rows for")
     parser.add_argument("--serve",
                         help="Serve files from the working directory on port 80. This flag may also be set in the shell",
                         action="store_true")
@@ -51,12 +65,25 @@ def main():
 
     # Shell Mode
     if args.shell:
+        from localizer import motion
         from localizer.shell import LocalizerShell
+        motion.load_profile()
         LocalizerShell(args.macs)
 
     elif args.process:
         from localizer import process
-        process.process_directory(args.macs, not args.counterclockwise)
+        process.process_directory(args.macs, not args.counterclockwise, args.moving)
+
+    elif args.consolidate:
+        from localizer import process
+        process.consolidate()
+
+    elif args.query:
+        from dateutil import parser as date_parser
+        from localizer import dataset
+        _since = date_parser.parse(args.since) if args.since else None
+        _rows = dataset.query(args.bssid, _since, table=args.query)
+        print(_rows.to_string() if not _rows.empty else "No matching rows")
 
     elif args.serve:
         import socket
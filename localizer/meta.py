@@ -1,10 +1,9 @@
-import datetime
+import csv
 import re
 import time
 
-from geomag import WorldMagneticModel
-
 import localizer
+from localizer import declination
 
 # WIFI Constants
 IEEE80211bg = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
@@ -42,6 +41,12 @@ meta_csv_fieldnames = ['name',
                        'elapsed',
                        'num_guesses',
                        'guess_time',
+                       'timeline',
+                       'converged',
+                       'clockwise',
+                       'phases',
+                       'buffer_size',
+                       'drops',
                        ]
 
 
@@ -56,10 +61,144 @@ capture_suffixes = {
                     "guess": "-guess.csv",
                     "results": "-results.csv",
                     "capture": "-capture.conf",
+                    "timeline": "-timeline.csv",
+                    "phases": "-phases.csv",
+                    "drops": "-drops.csv",
+                    "cube": "-cube.npz",
                     }
 
 capture_suffixes.update(required_suffixes)
 
+timeline_csv_fieldnames = ['offset', 'degrees']
+phases_csv_fieldnames = ['phase', 'timestamp']
+drops_csv_fieldnames = ['timestamp', 'packets', 'drops']
+
+
+def _parse_bool(value):
+    return value if isinstance(value, bool) else str(value) == 'True'
+
+
+# Type of each meta field that is not a string
+_meta_types = {'duration': float,
+               'hop_int': float,
+               'pos_lat': float,
+               'pos_lon': float,
+               'pos_alt': float,
+               'pos_lat_err': float,
+               'pos_lon_err': float,
+               'pos_alt_err': float,
+               'start': float,
+               'end': float,
+               'degrees': int,
+               'bearing': float,
+               'elapsed': float,
+               'num_guesses': int,
+               'guess_time': float,
+               'converged': _parse_bool,
+               'clockwise': _parse_bool,
+               'buffer_size': int,
+               }
+
+# Attribute names of meta fields that are not valid identifiers
+_meta_attributes = {'pass': 'pass_num'}
+
+
+class CaptureMeta:
+
+    __slots__ = [_meta_attributes.get(field, field) for field in meta_csv_fieldnames]
+
+    def __init__(self, **fields):
+        """
+        Capture metadata (a -capture.csv row), with numeric and boolean fields parsed once. Fields missing from older
+        captures are None.
+
+        :param fields: Values of meta_csv_fieldnames, as read from the csv or as python values; 'pass' may be given as
+                       pass_num
+        """
+
+        for field in meta_csv_fieldnames:
+            _attribute = _meta_attributes.get(field, field)
+            _value = fields.get(field, fields.get(_attribute))
+            if _value is None or _value == '':
+                _value = None
+            elif field in _meta_types:
+                try:
+                    # Integers may have been written as floats (eg degrees of a converged capture)
+                    _value = _meta_types[field](float(_value) if _meta_types[field] is int else _value)
+                except ValueError:
+                    raise ValueError("Invalid {}: {}".format(field, _value))
+            setattr(self, _attribute, _value)
+
+    @classmethod
+    def from_dict(cls, meta):
+        """
+        :param meta: Row of a -capture.csv
+        :type meta: dict
+        :rtype: CaptureMeta
+        """
+
+        return cls(**meta)
+
+    def to_dict(self):
+        """
+        :return: Row of a -capture.csv
+        :rtype: dict
+        """
+
+        return {field: getattr(self, _meta_attributes.get(field, field)) for field in meta_csv_fieldnames}
+
+    @classmethod
+    def read(cls, path):
+        """
+        Read the meta of a capture
+
+        :param path: Path of the -capture.csv
+        :type path: str
+        :rtype: CaptureMeta
+        """
+
+        with open(path, 'rt') as meta_csv:
+            return cls.from_dict(next(csv.DictReader(meta_csv, dialect='unix')))
+
+    @staticmethod
+    def columns(path):
+        """
+        Columns present in a -capture.csv; older captures lack some of meta_csv_fieldnames
+
+        :param path: Path of the -capture.csv
+        :type path: str
+        :rtype: list[str]
+        """
+
+        with open(path, 'rt') as meta_csv:
+            return csv.DictReader(meta_csv, dialect='unix').fieldnames or []
+
+    def write(self, path):
+        """
+        Write the meta of a capture
+
+        :param path: Path of the -capture.csv
+        :type path: str
+        """
+
+        with open(path, 'w', newline='') as meta_csv:
+            _meta_csv_writer = csv.DictWriter(meta_csv, dialect="unix", fieldnames=meta_csv_fieldnames)
+            _meta_csv_writer.writeheader()
+            _meta_csv_writer.writerow(self.to_dict())
+
+    @property
+    def macs(self):
+        """
+        :return: BSSIDs the capture was focused on, if any
+        :rtype: list[str]
+        """
+
+        return self.focused.split(',') if self.focused else None
+
+    def __repr__(self):
+        return "CaptureMeta({})".format(", ".join("{}={!r}".format(field, getattr(self, field))
+                                                  for field in self.__slots__ if getattr(self, field) is not None))
+
 
 class Params:
 
@@ -73,7 +212,8 @@ class Params:
                     "macs",
                     "channel",
                     "focused",
-                    "capture"]
+                    "capture",
+                    "converge"]
 
     def __init__(self,
                  iface=None,
@@ -85,10 +225,11 @@ class Params:
                  macs=None,
                  channel=None,
                  focused=None,
-                 capture=time.strftime('%Y%m%d-%H-%M-%S')):
+                 capture=time.strftime('%Y%m%d-%H-%M-%S'),
+                 converge=None):
 
         # Default Values
-        self._duration = self._degrees = self._bearing = self._hop_int = self._hop_dist = self._macs = self._channel = self._focused = self._capture = None
+        self._duration = self._degrees = self._bearing = self._hop_int = self._hop_dist = self._macs = self._channel = self._focused = self._capture = self._converge = None
         self._iface = iface
         self.duration = duration
         self.degrees = degrees
@@ -99,6 +240,7 @@ class Params:
         self.channel = channel
         self.focused = focused
         self.capture = capture
+        self.converge = converge
 
     @property
     def iface(self):
@@ -153,10 +295,8 @@ class Params:
         except ValueError:
             raise ValueError("Invalid bearing: {}; should be an int".format(value))
 
-    def bearing_true(self, lat, lon, alt=0, date=datetime.date.today()):
-        wmm = WorldMagneticModel()
-        declination = wmm.calc_mag_field(lat, lon, alt, date).declination
-        return self._bearing + declination
+    def bearing_true(self, lat, lon, alt=0, date=None):
+        return self._bearing + declination.declination(lat, lon, alt, date)
 
     @property
     def hop_int(self):
@@ -267,6 +407,24 @@ class Params:
     def capture(self, value):
         self._capture = str(value)
 
+    @property
+    def converge(self):
+        return self._converge
+
+    @converge.setter
+    def converge(self, value):
+        try:
+            if value is None:
+                self._converge = value
+            else:
+                if not isinstance(value, float):
+                    value = float(value)
+                if value <= 0:
+                    raise ValueError()
+                self._converge = value
+        except ValueError:
+            raise ValueError("Invalid convergence tolerance: {}; should be a float > 0 (degrees)".format(value))
+
     # Validation functions
     def validate_antenna(self):
         return self.duration is not None and \
@@ -324,5 +482,6 @@ class Params:
             deepcopy(self.macs),
             self.channel,
             deepcopy(self.focused),
-            self.capture
+            self.capture,
+            self.converge
         )
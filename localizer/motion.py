@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+
+module_logger = logging.getLogger(__name__)
+
+# Calibrated motion profile, written by localizer.calibrate
+PROFILE_PATH = os.path.join(os.path.expanduser('~'), '.localizer', 'motion.json')
+
+# Cable wrap limits
+bearing_max = 720
+bearing_min = -360
+
+# Constants
+# Reset Rate Curve
+# From utils/model.py
+#   x = [0,90,180,360]
+#   y = [20,10,8,6]
+symmetric_sigmoid = lambda x, a, b, c, d: a + (b - a) / (1 + (x / c) ** d)
+DEFAULT_RESET_PROFILE = (3.235294, 20, 34.68111, 1.29956)
+get_reset_rate = lambda x: symmetric_sigmoid(x, *DEFAULT_RESET_PROFILE)
+RESET_RATE = [get_reset_rate(x) for x in range(1080)]
+get_focused_rate = lambda x: -4 + (20 + 4) / (1 + (x / 180) ** 0.48542683)
+FOCUSED_RATE = [get_focused_rate(x) for x in range(360)]
+
+# Default number of steps per radian
+steps_per_revolution = 200
+degrees_per_step = 360 / steps_per_revolution
+microsteps_per_step = 32
+microsteps_per_revolution = steps_per_revolution*microsteps_per_step*2
+degrees_per_microstep = degrees_per_step / microsteps_per_step
+
+# Ramp stages are used for any rotation larger than this many degrees
+RAMP_MIN_DEGREES = 6
+RAMP_STAGE_DEGREES = 1
+
+
+def build_ramp(degrees, duration):
+    """
+    Build the ramp table used to drive the stepper: 1/4, 1/2 and 3/4 speed stages on either side of the full speed
+    stage, or a single slow stage for very short moves
+
+    :param degrees: Number of degrees to rotate (absolute value)
+    :type degrees: float
+    :param duration: Time to take for rotation for 360 degrees
+    :type duration: float
+    :return: List of [frequency, pulses]
+    :rtype: list
+    """
+
+    degrees = abs(degrees)
+    _frequency = microsteps_per_revolution/duration
+
+    if degrees > RAMP_MIN_DEGREES:
+        _ramp1_frequency = _frequency / 4
+        _ramp1_pulses = round(RAMP_STAGE_DEGREES / degrees_per_microstep)
+
+        _ramp2_frequency = _frequency / 2
+        _ramp2_pulses = round(RAMP_STAGE_DEGREES / degrees_per_microstep)
+
+        _ramp3_frequency = 3 * _frequency / 4
+        _ramp3_pulses = round(RAMP_STAGE_DEGREES / degrees_per_microstep)
+
+        _pulses = round((degrees - 6*RAMP_STAGE_DEGREES) / degrees_per_microstep)
+
+        return [[_ramp1_frequency, _ramp1_pulses],
+                [_ramp2_frequency, _ramp2_pulses],
+                [_ramp3_frequency, _ramp3_pulses],
+                [_frequency, _pulses],
+                [_ramp3_frequency, _ramp3_pulses],
+                [_ramp2_frequency, _ramp2_pulses],
+                [_ramp1_frequency, _ramp1_pulses]]
+
+    else:
+        _pulses = round(degrees/degrees)
+        return [[_frequency/3, _pulses]]
+
+
+def stage_duration(frequency, pulses):
+    """
+    Time taken by a single ramp stage; each pulse is high then low for the same number of microseconds
+
+    :param frequency: Stage frequency
+    :type frequency: float
+    :param pulses: Number of pulses in the stage
+    :type pulses: int
+    :return: Duration of the stage in seconds
+    :rtype: float
+    """
+
+    return int(1000000 / frequency) * pulses * 2 / 1000000
+
+
+def ramp_duration(ramp):
+    """
+    Total time taken to execute a ramp table
+
+    :param ramp: List of [frequency, pulses]
+    :type ramp: list
+    :return: Duration in seconds
+    :rtype: float
+    """
+
+    return sum(stage_duration(frequency, pulses) for frequency, pulses in ramp)
+
+
+def ramp_timeline(ramp):
+    """
+    Build a piecewise-linear motion timeline for a ramp table. Each knot is (seconds since the start of the move,
+    degrees travelled since the start of the move); motion between knots is at constant speed.
+
+    :param ramp: List of [frequency, pulses]
+    :type ramp: list
+    :return: List of (offset, degrees) knots, starting at (0, 0)
+    :rtype: list
+    """
+
+    _offset = 0
+    _degrees = 0
+    _timeline = [(0.0, 0.0)]
+
+    for frequency, pulses in ramp:
+        _offset += stage_duration(frequency, pulses)
+        _degrees += pulses * degrees_per_microstep
+        _timeline.append((round(_offset, 6), round(_degrees, 6)))
+
+    return _timeline
+
+
+def timeline(degrees, duration):
+    """
+    Motion timeline for a rotation of degrees at the rate given by duration
+
+    :param degrees: Number of degrees to rotate
+    :type degrees: float
+    :param duration: Time to take for rotation for 360 degrees
+    :type duration: float
+    :return: List of (offset, degrees) knots; degrees are always positive (direction is tracked separately)
+    :rtype: list
+    """
+
+    return ramp_timeline(build_ramp(degrees, duration))
+
+
+def best_path(bearing_from, new_bearing, degrees):
+    """
+    Return an optimized path to arrive at the provided bearing based on how far the travel is and the position of the
+    antenna, keeping the antenna within the cable wrap limits
+
+    :param bearing_from: Current (unwrapped) bearing of the antenna
+    :type bearing_from: float
+    :param new_bearing: New bearing to set the antenna to
+    :type new_bearing: float
+    :param degrees: How far will the antenna be traveling from this bearing (negative for counter-clockwise)
+    :type degrees: float
+    :return: Travel in degrees (signed) to reach an equivalent of the new bearing
+    :rtype: float
+    """
+
+    _edge_case = bool(new_bearing == bearing_from % 360)
+    if _edge_case and (bearing_from >= bearing_max or bearing_from <= bearing_min):
+        _travel = new_bearing - bearing_from
+    else:
+        # Use algorithm tested and optimized in tests/antenna_motion.py
+        _travel = 180 - (540 + (bearing_from - new_bearing)) % 360
+        _proposed_new_bearing = bearing_from + _travel
+        # Counter-clockwise moves (negative degrees) end below the new bearing
+        if max(_proposed_new_bearing, _proposed_new_bearing + degrees) >= bearing_max:
+            _travel = _travel - 360
+        elif min(_proposed_new_bearing, _proposed_new_bearing + degrees) <= bearing_min:
+            _travel = _travel + 360
+
+    return _travel
+
+
+def reset_duration(travel):
+    """
+    Time taken to slew the antenna by travel degrees at the reset rate
+
+    :param travel: Degrees to travel (signed)
+    :type travel: float
+    :return: Duration in seconds
+    :rtype: float
+    """
+
+    _travel = int(round(abs(travel)))
+    if _travel == 0:
+        return 0
+
+    return ramp_duration(build_ramp(_travel, RESET_RATE[_travel]))
+
+
+def progress(timeline, offset):
+    """
+    Degrees travelled at a given time into a move
+
+    :param timeline: List of (offset, degrees) knots
+    :type timeline: list
+    :param offset: Seconds since the start of the move
+    :type offset: float
+    :return: Degrees travelled
+    :rtype: float
+    """
+
+    if offset <= timeline[0][0]:
+        return timeline[0][1]
+
+    for (t1, d1), (t2, d2) in zip(timeline, timeline[1:]):
+        if offset <= t2:
+            return d1 + (d2 - d1) * (offset - t1) / (t2 - t1) if t2 > t1 else d2
+
+    return timeline[-1][1]
+
+
+def truncate(timeline, offset):
+    """
+    Truncate a motion timeline for a move that was stopped early
+
+    :param timeline: List of (offset, degrees) knots
+    :type timeline: list
+    :param offset: Seconds since the start of the move when it was stopped
+    :type offset: float
+    :return: List of (offset, degrees) knots ending at the stop
+    :rtype: list
+    """
+
+    if offset >= timeline[-1][0]:
+        return list(timeline)
+
+    _timeline = [knot for knot in timeline if knot[0] < offset] or [timeline[0]]
+    _timeline.append((round(offset, 6), round(progress(timeline, offset), 6)))
+
+    return _timeline
+
+
+def set_reset_profile(profile):
+    """
+    Replace the reset rate curve, updating RESET_RATE in place so that existing references see the new values
+
+    :param profile: Symmetric sigmoid parameters (a, b, c, d)
+    :type profile: tuple
+    """
+
+    RESET_RATE[:] = [symmetric_sigmoid(x, *profile) for x in range(len(RESET_RATE))]
+
+
+def save_profile(profile, path=PROFILE_PATH):
+    """
+    Persist a calibrated reset rate profile and apply it
+
+    :param profile: Symmetric sigmoid parameters (a, b, c, d)
+    :type profile: tuple
+    :param path: Path to write the profile to
+    :type path: str
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as profile_file:
+        json.dump({'reset': list(profile)}, profile_file)
+
+    set_reset_profile(profile)
+    module_logger.info("Saved motion profile to {}".format(path))
+
+
+def load_profile(path=PROFILE_PATH):
+    """
+    Load and apply a calibrated reset rate profile, if one has been saved
+
+    :param path: Path to read the profile from
+    :type path: str
+    :return: True if a profile was loaded
+    :rtype: bool
+    """
+
+    try:
+        with open(path, 'r') as profile_file:
+            _profile = json.load(profile_file)['reset']
+        set_reset_profile(_profile)
+    except FileNotFoundError:
+        return False
+    except (ValueError, KeyError, TypeError) as e:
+        module_logger.warning("Ignoring invalid motion profile {} ({})".format(path, e))
+        return False
+
+    module_logger.info("Loaded motion profile from {}".format(path))
+    return True
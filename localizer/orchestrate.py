@@ -0,0 +1,457 @@
+import asyncio
+import logging
+import re
+import shutil
+import signal
+import threading
+import time
+from concurrent import futures
+from subprocess import PIPE, DEVNULL
+
+from tqdm import tqdm
+
+import localizer
+from localizer import afpacket, antenna, gps, gpsstream, interface
+from localizer.meta import IEEE80211bg
+
+module_logger = logging.getLogger(__name__)
+
+# Seconds to wait for dumpcap to open its output file before giving up
+DUMPCAP_START_TIMEOUT = 10
+# Seconds to wait for a subprocess to exit after it has been interrupted
+TERMINATE_TIMEOUT = 3
+
+# Seconds between samples of the capture ring's drop counters
+DROP_SAMPLE_INTERVAL = 1
+
+# Packet capture backends
+BACKEND_DUMPCAP = "dumpcap"
+BACKEND_RING = "ring"
+BACKENDS = [BACKEND_DUMPCAP, BACKEND_RING]
+
+
+class CaptureOrchestrator:
+
+    def __init__(self, params, pcap, nmea_output, csv_output, degrees, bearing, reset=None, reset_degrees=None,
+                 start_flag=None, stop_flag=None, session=None, backend=BACKEND_DUMPCAP, buffer_size=12, gps_service=None):
+        """
+        Run a capture on a single event loop: dumpcap and channel switching are subprocess tasks, gps is streamed from gpsd, and antenna
+        moves are awaited from a worker thread. Every phase transition is timestamped, and canceling the capture
+        (Ctrl-C), or a failure during it, stops any antenna move in progress and terminates every subprocess it
+        started.
+
+        :param params: Capture parameters
+        :type params: Params
+        :param pcap: Path of the pcap to write
+        :type pcap: str
+        :param nmea_output: Path of the nmea log to write
+        :type nmea_output: str
+        :param csv_output: Path of the gps csv to write
+        :type csv_output: str
+        :param degrees: Degrees to sweep (negative for counter-clockwise)
+        :type degrees: float
+        :param bearing: Bearing to start the sweep from
+        :type bearing: float
+        :param reset: (Optional) Bearing to move to once the sweep is complete
+        :type reset: float
+        :param reset_degrees: Width (signed) of the sweep that follows the reset
+        :type reset_degrees: float
+        :param start_flag: (Optional) Event set when packets start being captured
+        :type start_flag: threading.Event
+        :param stop_flag: (Optional) Event that ends the capture early when set
+        :type stop_flag: threading.Event
+        :param session: (Optional) Running capture session to extract the pcap from, instead of starting dumpcap
+        :type session: session.CaptureSession
+        :param backend: Packet capture backend: dumpcap, or an in-process TPACKET_V3 ring
+        :type backend: str
+        :param buffer_size: Kernel capture buffer size (MiB)
+        :type buffer_size: int
+        :param gps_service: (Optional) Running gps service to record from, instead of connecting to gpsd
+        :type gps_service: gpsstream.GpsService
+        """
+
+        self._params = params
+        self._pcap = pcap
+        self._nmea_output = nmea_output
+        self._csv_output = csv_output
+        self._degrees = degrees
+        self._bearing = bearing
+        self._reset = reset
+        self._reset_degrees = reset_degrees if reset_degrees is not None else degrees
+        self._start_flag = start_flag if start_flag is not None else threading.Event()
+        self._stop_flag = stop_flag if stop_flag is not None else threading.Event()
+        self._session = session
+        self._backend = backend
+        self._buffer_size = buffer_size
+        self._gps_service = gps_service
+        self._ring = None
+        # Stops antenna moves; unlike the stop flag, which ends every capture, this is only set when the capture is
+        # canceled or fails
+        self._cancel_flag = threading.Event()
+
+        # Antenna moves block on pigpio, so they run one at a time on their own thread
+        self._executor = futures.ThreadPoolExecutor(max_workers=1)
+        self._stopped = None
+        self._procs = []
+        self._stage_times = {}
+        self.phases = []
+
+    def _phase(self, name):
+        """
+        Record the time of a phase transition
+        """
+
+        self.phases.append((name, time.time()))
+        module_logger.debug("Capture phase '{}'".format(name))
+
+    def run(self):
+        """
+        Run the capture to completion
+
+        :return: Dictionary of results, or None if the capture was canceled. The antenna reset to the next bearing
+                 continues in the background; wait on the 'reset' future before moving the antenna again.
+        :rtype: dict
+        """
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _task = asyncio.ensure_future(self._capture(loop), loop=loop)
+
+        try:
+            return loop.run_until_complete(_task)
+        except KeyboardInterrupt:
+            module_logger.warning("Capture canceled, stopping antenna and subprocesses")
+            self._phase("canceled")
+            self._cancel_flag.set()
+            self._stop_flag.set()
+            _task.cancel()
+            try:
+                loop.run_until_complete(_task)
+            except asyncio.CancelledError:
+                pass
+            return None
+        finally:
+            # Release anything waiting on the stop flag
+            self._stop_flag.set()
+            loop.close()
+            asyncio.set_event_loop(None)
+
+    async def _capture(self, loop):
+        # Resolves as soon as anything (eg the convergence thread) sets the stop flag
+        self._stopped = loop.run_in_executor(None, self._stop_flag.wait)
+
+        try:
+            self._phase("setup")
+            # Setup takes as long as the slowest stage rather than the sum of all of them
+            _setup = asyncio.gather(
+                self._stage("antenna", loop.run_in_executor(self._executor, antenna.Antenna.reset_antenna,
+                                                            self._bearing, self._degrees, self._cancel_flag)),
+                self._stage("interface", self._prepare_interface(loop)),
+                self._stage("dumpcap", self._warm_up_dumpcap())
+                if self._session is None and self._backend == BACKEND_DUMPCAP else asyncio.sleep(0),
+                self._stage("gps", self._wait_for_fix(loop)))
+            try:
+                await _setup
+            except BaseException:
+                _setup.cancel()
+                raise
+            self._phase("ready")
+            module_logger.info("Setup took {:.2f}s ({})".format(
+                max(self._stage_times.values()),
+                ', '.join("{} {:.2f}s".format(name, seconds) for name, seconds in self._stage_times.items())))
+
+            if self._session is None and self._backend == BACKEND_RING:
+                _packets = await self._start_ring(loop)
+            elif self._session is None:
+                _packets = self._finish_dumpcap(await self._start_dumpcap())
+            else:
+                # The session is already capturing, so packets are extracted from it once the capture ends
+                _packets = self._extract(loop, time.time())
+            self._phase("capture_started")
+            self._start_flag.set()
+
+            _sweep, _gps, _channels, _dumpcap_stats, _, _drops = await asyncio.gather(
+                loop.run_in_executor(self._executor, antenna.Antenna.sweep,
+                                     self._degrees, self._params.duration, self._stop_flag),
+                self._log_gps(loop),
+                self._hop_channels(),
+                _packets,
+                self._show_progress(),
+                self._sample_drops())
+            self._phase("capture_stopped")
+
+            # dumpcap's totals are the only drop counts it gives for its capture
+            if not _drops and _dumpcap_stats[0] is not None:
+                _drops = [(time.time(),) + tuple(_dumpcap_stats)]
+
+            _reset = None
+            if self._reset is not None:
+                # Let the antenna move to the next capture while this one is processed
+                _reset = self._executor.submit(self._reset_antenna)
+
+            return {'sweep': _sweep,
+                    'gps': _gps,
+                    'channels': _channels,
+                    'packets': _dumpcap_stats,
+                    'drops': _drops,
+                    'reset': _reset,
+                    'phases': self.phases}
+        except BaseException:
+            # Don't leave the antenna slewing after a failed or canceled capture
+            self._cancel_flag.set()
+            raise
+        finally:
+            self._terminate()
+            self._stop_flag.set()
+            self._executor.shutdown(wait=False)
+
+    async def _stage(self, name, awaitable):
+        """
+        Await a setup stage, recording how long it took
+        """
+
+        _start = time.time()
+        _result = await awaitable
+        self._stage_times[name] = time.time() - _start
+        self._phase("{}_ready".format(name))
+        return _result
+
+    async def _prepare_interface(self, loop):
+        """
+        Put the interface into monitor mode on its initial channel. Failing raises straight away, so that setup is
+        abandoned (and the other stages released) without waiting for the rest of them.
+        """
+
+        if not await loop.run_in_executor(None, interface.prepare, self._params.iface, self._params.channel):
+            raise RuntimeError("Could not put {} into monitor mode".format(self._params.iface))
+
+    def _reset_antenna(self):
+        # Pause for a moment to reduce drift
+        time.sleep(.5)
+        antenna.Antenna.reset_antenna(self._reset, self._reset_degrees, self._cancel_flag)
+
+    async def _until_stopped(self, timeout):
+        """
+        Sleep for up to timeout seconds, returning early if the capture is stopped
+
+        :return: True if the capture was stopped
+        :rtype: bool
+        """
+
+        if timeout > 0 and not self._stopped.done():
+            await asyncio.wait([self._stopped], timeout=timeout)
+        return self._stopped.done()
+
+    async def _subprocess(self, *args, **kwargs):
+        proc = await asyncio.create_subprocess_exec(*args, **kwargs)
+        self._procs.append(proc)
+        return proc
+
+    def _terminate(self):
+        """
+        Make sure no subprocess outlives the capture
+        """
+
+        for proc in self._procs:
+            if proc.returncode is None:
+                try:
+                    proc.terminate()
+                except ProcessLookupError:
+                    pass
+
+    async def _wait_for_fix(self, loop):
+        if localizer.debug:
+            return True
+        if self._gps_service is not None:
+            return await loop.run_in_executor(None, self._gps_service.wait_for_fix, self._stop_flag)
+        return await loop.run_in_executor(None, gps.wait_for_fix, self._stop_flag)
+
+    async def _warm_up_dumpcap(self):
+        """
+        Run dumpcap against the interface once before the capture, so that the capture itself starts from a warm page
+        cache and problems with the interface are found while the antenna is still moving
+        """
+
+        if shutil.which("dumpcap") is None:
+            raise RuntimeError("Required packet capture system tool 'dumpcap' is not installed")
+
+        proc = await self._subprocess("dumpcap", "-i", self._params.iface, "-L", stdout=DEVNULL, stderr=PIPE)
+        _, stderr = await proc.communicate()
+        if proc.returncode != 0:
+            module_logger.warning("dumpcap could not open {} ({})"
+                                  .format(self._params.iface, stderr.decode().strip()))
+
+    async def _start_dumpcap(self):
+        """
+        Start dumpcap and wait until it reports that it is writing packets
+
+        :return: dumpcap process
+        """
+
+        _dur = int(self._params.duration + 1)
+        proc = await self._subprocess("dumpcap", "-i", self._params.iface, "-B", str(self._buffer_size), "-q",
+                                      "-a", "duration:{}".format(_dur), "-w", self._pcap,
+                                      stdout=DEVNULL, stderr=PIPE)
+
+        _deadline = time.time() + DUMPCAP_START_TIMEOUT
+        while True:
+            _line = await asyncio.wait_for(proc.stderr.readline(), max(0, _deadline - time.time()))
+            if not _line:
+                raise RuntimeError("dumpcap exited before starting the capture")
+            if _line.decode().startswith("File:"):
+                return proc
+
+    async def _finish_dumpcap(self, proc):
+        """
+        Wait for dumpcap to finish, interrupting it if the capture is stopped early
+
+        :return: (packets captured, packets dropped)
+        :rtype: (int, int)
+        """
+
+        _stderr = asyncio.ensure_future(proc.stderr.read())
+        _exited = asyncio.ensure_future(proc.wait())
+        await asyncio.wait([_exited, self._stopped], return_when=asyncio.FIRST_COMPLETED)
+        if not _exited.done():
+            proc.send_signal(signal.SIGINT)
+
+        await asyncio.wait_for(_exited, TERMINATE_TIMEOUT)
+        self._phase("dumpcap_stopped")
+
+        matches = re.search(r"(?<=dropped on interface\s')(?:\S+':\s)(\d+)/(\d+)", (await _stderr).decode())
+        if matches is None or len(matches.groups()) != 2:
+            raise ValueError("Capture failed")
+
+        return int(matches.groups()[0]), int(matches.groups()[1])
+
+    async def _start_ring(self, loop):
+        """
+        Open the capture ring; packets are queued in the ring from here on
+
+        :return: Coroutine that captures for the duration of the capture
+        """
+
+        self._ring = afpacket.RingCapture(self._params.iface, self._pcap,
+                                          block_count=max(1, self._buffer_size * (1 << 20) // afpacket.RING_BLOCK_SIZE))
+        await loop.run_in_executor(None, self._ring.open)
+        return self._finish_ring(loop, self._ring)
+
+    async def _finish_ring(self, loop, ring):
+        """
+        Capture from the ring, stopping early if the capture is stopped
+
+        :return: (packets captured, packets dropped)
+        :rtype: (int, int)
+        """
+
+        try:
+            return await loop.run_in_executor(None, ring.run, self._params.duration, self._stop_flag)
+        finally:
+            ring.close()
+            self._phase("ring_stopped")
+
+    async def _sample_drops(self):
+        """
+        Sample the ring's drop counters every second while the capture runs. dumpcap only reports the drops of its
+        capture socket when it exits, and the interface's own counters don't include them, so captures with the other
+        backends aren't sampled.
+
+        :return: List of (timestamp, packets, drops) since the start of the capture
+        :rtype: list
+        """
+
+        _samples = []
+        if self._ring is None:
+            return _samples
+
+        _end = time.time() + self._params.duration
+        while not await self._until_stopped(min(DROP_SAMPLE_INTERVAL, _end - time.time())):
+            self._ring.statistics()
+            _samples.append((time.time(), self._ring.packets, self._ring.drops))
+            if time.time() >= _end:
+                break
+
+        return _samples
+
+    async def _extract(self, loop, start):
+        """
+        Wait for the capture to finish, then extract its packets from the session
+
+        :return: (packets captured, packets dropped), which the session does not report per capture
+        :rtype: (None, None)
+        """
+
+        await self._until_stopped(self._params.duration)
+        _end = time.time()
+        self._phase("session_stopped")
+
+        if not await loop.run_in_executor(None, self._session.extract, start, _end, self._pcap):
+            raise ValueError("Capture failed")
+        self._phase("session_extracted")
+
+        return None, None
+
+    async def _log_gps(self, loop):
+        """
+        Record the gps position while the capture runs, logging raw nmea
+
+        :return: (lat, lon, alt, lat error, lon error, alt error) averages
+        :rtype: tuple
+        """
+
+        if self._gps_service is not None:
+            _recording = self._gps_service.start_recording(self._csv_output, self._nmea_output)
+            try:
+                await self._until_stopped(self._params.duration)
+            finally:
+                _averages = self._gps_service.stop_recording(_recording)
+            self._phase("gps_stopped")
+            return _averages
+
+        # Record every fix gpsd reports, and the raw nmea, over a single gpsd connection
+        _averages = await loop.run_in_executor(None, gpsstream.record, self._csv_output, self._params.duration,
+                                               self._stop_flag, None, self._nmea_output)
+        self._phase("gps_stopped")
+
+        return _averages
+
+    async def _show_progress(self):
+        """
+        Show a progress bar while packets are captured
+        """
+
+        with tqdm(total=int(self._params.duration), desc="{:<35}".format(
+                "Capturing packets for {}s".format(self._params.duration))) as pbar:
+            for _ in range(int(self._params.duration)):
+                if await self._until_stopped(1):
+                    break
+                pbar.update()
+
+    async def _hop_channels(self):
+        """
+        Hop channels for the duration of the capture
+
+        :return: (start time, end time)
+        :rtype: (float, float)
+        """
+
+        _channels = [str(channel) for channel in IEEE80211bg]
+        _chan = _channels.index(str(self._params.channel)) if self._params.channel else 0
+
+        _start_time = time.time()
+        _stop_time = _start_time + self._params.duration
+
+        # Only hop channels if we have a list of channels to hop, and our duration is greater than 0
+        if self._params.hop_int > 0 and len(_channels) > 1:
+            while not await self._until_stopped(min(self._params.hop_int, _stop_time - time.time())):
+                if time.time() >= _stop_time:
+                    break
+                _chan = (_chan + self._params.hop_dist) % len(_channels)
+                proc = await self._subprocess("iwconfig", self._params.iface, "channel", _channels[_chan],
+                                              stdout=DEVNULL, stderr=DEVNULL)
+                await proc.wait()
+        else:
+            await self._until_stopped(_stop_time - time.time())
+
+        self._phase("hopping_stopped")
+        return _start_time, time.time()
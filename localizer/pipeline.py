@@ -0,0 +1,157 @@
+import logging
+import os
+import time
+from concurrent import futures
+
+from localizer import index, process
+from localizer.meta import CaptureMeta
+
+module_logger = logging.getLogger(__name__)
+
+# Niceness of processing workers, so that they yield the CPU to capture threads
+WORKER_NICENESS = 10
+# Number of captures that may be waiting for or undergoing processing before new captures are deferred
+MAX_PENDING = 2
+
+_worker_niced = False
+
+
+def _process(meta_path, clockwise, macs):
+    """
+    Process a single capture in a worker process
+
+    :return: (beacon count, processing start time, processing end time)
+    :rtype: (int, float, float)
+    """
+
+    global _worker_niced
+    if not _worker_niced:
+        os.nice(WORKER_NICENESS)
+        _worker_niced = True
+
+    _start_time = time.time()
+
+    _meta = CaptureMeta.read(meta_path)
+    _path = os.path.dirname(meta_path)
+    _beacon_count, _results_df, _, _ = process.process_capture(_meta, _path, True, False, clockwise, macs)
+
+    # Add the capture to the consolidated dataset and the index, as process_directory would, since it now counts as
+    # processed. Only the single worker writes the index while the batch runs.
+    process.record_capture(_meta, _path, _results_df, index.BssidIndex.load())
+
+    return _beacon_count, _start_time, time.time()
+
+
+def _overlap(intervals, others):
+    """
+    Total time that intervals overlap with others
+
+    :param intervals: List of (start, end)
+    :param others: List of (start, end)
+    :return: Seconds of overlap
+    :rtype: float
+    """
+
+    return sum(max(0, min(end, other_end) - max(start, other_start))
+               for start, end in intervals
+               for other_start, other_end in others)
+
+
+class ProcessingPipeline:
+
+    def __init__(self, macs=None, clockwise=True, max_pending=MAX_PENDING):
+        """
+        Process finished captures in a background worker while the next capture runs. The worker runs at a lower
+        priority, and when more than max_pending captures are queued further captures are deferred until the batch
+        finishes instead of blocking the capture loop.
+
+        :param macs: list of macs to filter on
+        :type macs: list[str]
+        :param clockwise: Direction of antenna travel
+        :type clockwise: bool
+        :param max_pending: Maximum number of captures queued for processing
+        :type max_pending: int
+        """
+
+        self._macs = macs
+        self._clockwise = clockwise
+        self._max_pending = max_pending
+        self._executor = futures.ProcessPoolExecutor(max_workers=1)
+        self._pending = {}
+        self._submitted = set()
+        self._deferred = []
+        self._captures = []
+        self._processing = []
+        self._beacons = 0
+        self._deferred_count = 0
+
+    def submit(self, capture_path, capture_start, capture_end):
+        """
+        Hand the unprocessed captures under a capture path to the processing worker
+
+        :param capture_path: Path returned by capture.capture
+        :type capture_path: str
+        :param capture_start: Time the capture started
+        :type capture_start: float
+        :param capture_end: Time the capture finished
+        :type capture_end: float
+        """
+
+        self._captures.append((capture_start, capture_end))
+        self._reap()
+
+        for root, dirs, files in os.walk(capture_path):
+            if not process._check_capture_dir(files) or process._check_capture_processed(files):
+                continue
+
+            _meta_path = os.path.join(root, process._get_capture_meta(files))
+            if _meta_path in self._submitted:
+                continue
+
+            self._submitted.add(_meta_path)
+            if len(self._pending) < self._max_pending:
+                self._pending[self._executor.submit(_process, _meta_path, self._clockwise, self._macs)] = _meta_path
+            else:
+                module_logger.info("Processing is behind, deferring {}".format(_meta_path))
+                self._deferred.append(_meta_path)
+                self._deferred_count += 1
+
+    def _reap(self):
+        """
+        Collect finished processing jobs
+        """
+
+        for future in [f for f in self._pending if f.done()]:
+            _meta_path = self._pending.pop(future)
+            try:
+                _beacon_count, _start, _end = future.result()
+                self._beacons += _beacon_count
+                self._processing.append((_start, _end))
+            except Exception as e:
+                module_logger.error("Failed to process {} ({})".format(_meta_path, e))
+
+        # Move deferred captures into the worker as it frees up
+        while self._deferred and len(self._pending) < self._max_pending:
+            _meta_path = self._deferred.pop(0)
+            self._pending[self._executor.submit(_process, _meta_path, self._clockwise, self._macs)] = _meta_path
+
+    def close(self):
+        """
+        Finish processing all submitted captures
+
+        :return: Summary of the processing performed
+        :rtype: dict
+        """
+
+        while self._pending or self._deferred:
+            futures.wait(list(self._pending), return_when=futures.FIRST_COMPLETED)
+            self._reap()
+
+        self._executor.shutdown()
+
+        _processing_time = sum(end - start for start, end in self._processing)
+        return {'captures': len(self._processing),
+                'beacons': self._beacons,
+                'processing_time': _processing_time,
+                'overlap_time': _overlap(self._processing, self._captures),
+                'deferred': self._deferred_count}
@@ -0,0 +1,273 @@
+import logging
+import math
+
+from localizer import motion
+
+module_logger = logging.getLogger(__name__)
+
+# Limit on improvement passes when refining a plan
+MAX_IMPROVEMENT_PASSES = 10
+
+# Focused captures are narrowed down to this fraction of their width as guess confidence increases
+MIN_WIDTH_FRACTION = .5
+# Guesses at least this confident are not worth a focused capture
+SKIP_CONFIDENCE = .9
+# Access points with a guessed bearing from at least this many earlier captures are not worth a focused capture
+COVERED_CAPTURES = 3
+
+
+def simulate(captures, bearing_start, bearing_end=None):
+    """
+    Simulate a sequence of captures and return the time spent slewing between them and the total time
+
+    :param captures: Ordered list of Params objects to capture
+    :type captures: list
+    :param bearing_start: Current (unwrapped) bearing of the antenna
+    :type bearing_start: float
+    :param bearing_end: Bearing to return to after the last capture, if any
+    :type bearing_end: float
+    :return: (slew time, total time) in seconds
+    :rtype: (float, float)
+    """
+
+    _position = bearing_start
+    _slew = 0
+    _capture = 0
+
+    for cap in captures:
+        _travel = motion.best_path(_position, cap.bearing_magnetic, cap.degrees)
+        _slew += motion.reset_duration(_travel)
+        _position += _travel + cap.degrees
+        _capture += cap.duration
+
+    if bearing_end is not None:
+        _slew += motion.reset_duration(motion.best_path(_position, bearing_end, 0))
+
+    return _slew, _slew + _capture
+
+
+def _cost(captures, bearing_start, bearing_end):
+    return simulate(captures, bearing_start, bearing_end)[0]
+
+
+def _candidate_orders(captures, bearing_start):
+    """
+    Generate starting orders for the planner: sweep-line orders (sorted by bearing, starting at each capture, in both
+    directions) and a nearest-neighbour order
+    """
+
+    _n = len(captures)
+    _sorted = sorted(range(_n), key=lambda i: captures[i].bearing_magnetic % 360)
+
+    for k in range(_n):
+        _order = _sorted[k:] + _sorted[:k]
+        yield _order
+        yield _order[::-1]
+
+    # Nearest neighbour from the current position
+    _position = bearing_start
+    _remaining = list(range(_n))
+    _order = []
+    while _remaining:
+        _next = min(_remaining,
+                    key=lambda i: motion.reset_duration(
+                        motion.best_path(_position, captures[i].bearing_magnetic, captures[i].degrees)))
+        _remaining.remove(_next)
+        _order.append(_next)
+        _position += motion.best_path(_position, captures[_next].bearing_magnetic, captures[_next].degrees) + \
+            captures[_next].degrees
+    yield _order
+
+
+def _improve(captures, order, bearing_start, bearing_end):
+    """
+    Improve an order using 2-opt moves, evaluated by simulating the antenna (including cable wrap)
+    """
+
+    _best = [captures[i] for i in order]
+    _best_order = list(order)
+    _best_cost = _cost(_best, bearing_start, bearing_end)
+
+    for _ in range(MAX_IMPROVEMENT_PASSES):
+        _improved = False
+        for i in range(len(order) - 1):
+            for j in range(i + 1, len(order)):
+                _order = _best_order[:i] + _best_order[i:j + 1][::-1] + _best_order[j + 1:]
+                _candidate = [captures[k] for k in _order]
+                _candidate_cost = _cost(_candidate, bearing_start, bearing_end)
+                if _candidate_cost < _best_cost - 1e-6:
+                    _best_order, _best_cost = _order, _candidate_cost
+                    _improved = True
+        if not _improved:
+            break
+
+    return _best_order, _best_cost
+
+
+def plan(captures, bearing_start, bearing_end=None):
+    """
+    Order captures to minimize the time the antenna spends slewing between them. Candidate orders are built by sweeping
+    around the compass and by nearest neighbour, then refined with 2-opt; every candidate is costed by simulating the
+    reset slews with the cable wrap limits applied.
+
+    :param captures: List of Params objects to capture
+    :type captures: list
+    :param bearing_start: Current (unwrapped) bearing of the antenna
+    :type bearing_start: float
+    :param bearing_end: Bearing to return to after the last capture, if any
+    :type bearing_end: float
+    :return: (ordered indices, estimated total time, naive total time)
+    :rtype: (list, float, float)
+    """
+
+    _naive = simulate(captures, bearing_start, bearing_end)[1]
+    if len(captures) < 2:
+        return list(range(len(captures))), _naive, _naive
+
+    _best_order = list(range(len(captures)))
+    _best_cost = _cost(captures, bearing_start, bearing_end)
+
+    for order in _candidate_orders(captures, bearing_start):
+        _candidate_cost = _cost([captures[i] for i in order], bearing_start, bearing_end)
+        if _candidate_cost < _best_cost:
+            _best_order, _best_cost = order, _candidate_cost
+
+    _best_order, _ = _improve(captures, _best_order, bearing_start, bearing_end)
+    _estimated = simulate([captures[i] for i in _best_order], bearing_start, bearing_end)[1]
+
+    module_logger.info("Planned {} captures: estimated {:.1f}s (naive {:.1f}s)".format(len(captures), _estimated, _naive))
+
+    return _best_order, _estimated, _naive
+
+
+def _cluster_bearings(guesses, max_spread):
+    """
+    Group guesses whose bearings lie within max_spread degrees of the first guess in the group, walking around the
+    compass from the widest gap so that groups can span north
+
+    :param guesses: List of guesses with a bearing attribute
+    :type guesses: list
+    :param max_spread: Maximum angular spread of a group
+    :type max_spread: float
+    :return: List of (first bearing, spread, guesses)
+    :rtype: list
+    """
+
+    _sorted = sorted(guesses, key=lambda g: g.bearing % 360)
+    if len(_sorted) > 1:
+        _gaps = [(_sorted[(i + 1) % len(_sorted)].bearing - _sorted[i].bearing) % 360 for i in range(len(_sorted))]
+        _start = (_gaps.index(max(_gaps)) + 1) % len(_sorted)
+        _sorted = _sorted[_start:] + _sorted[:_start]
+
+    _clusters = []
+    for guess in _sorted:
+        if _clusters:
+            _first, _, _members = _clusters[-1]
+            _spread = (guess.bearing - _first) % 360
+            if _spread <= max_spread:
+                _members.append(guess)
+                _clusters[-1] = (_first, _spread, _members)
+                continue
+        _clusters.append((guess.bearing, 0, [guess]))
+
+    return _clusters
+
+
+def _confidence(guess):
+    """
+    Confidence of a guess, or 0 if the guess has no confidence
+    """
+
+    try:
+        _value = float(getattr(guess, 'confidence', None))
+    except (TypeError, ValueError):
+        return 0
+
+    return 0 if math.isnan(_value) else _value
+
+
+def focused_width(guess, width):
+    """
+    Width of the focused capture for a guess, shrunk for high confidence guesses
+
+    :param guess: Guess with an optional confidence attribute
+    :param width: Width of a focused capture for a guess with no confidence
+    :type width: float
+    :return: Width in degrees
+    :rtype: float
+    """
+
+    return width * (1 - (1 - MIN_WIDTH_FRACTION) * min(1, _confidence(guess)))
+
+
+def focused_captures(params, guesses, width, duration, max_spread=None, skip_confident=True, index=None):
+    """
+    Build focused captures for a list of guesses. Guesses on the same channel whose bearings lie close together are
+    merged into a single focused sweep covering all of them, filtered on all of their BSSIDs. Guesses are narrowed
+    according to their confidence, and guesses that are already well localized, or that earlier captures already
+    cover, are skipped.
+
+    :param params: Parameters of the parent capture
+    :type params: Params
+    :param guesses: List of guesses with bearing, channel and bssid attributes (and optionally confidence)
+    :type guesses: list
+    :param width: Width of a focused capture for a single access point
+    :type width: float
+    :param duration: Duration of a focused capture for a single access point
+    :type duration: float
+    :param max_spread: Maximum spread of guessed bearings to merge into one capture (default: half the width)
+    :type max_spread: float
+    :param skip_confident: Whether to skip guesses with confidence of at least SKIP_CONFIDENCE
+    :type skip_confident: bool
+    :param index: (Optional) Index of earlier captures; access points guessed in COVERED_CAPTURES of them are skipped
+    :type index: index.BssidIndex
+    :return: List of (Params, focused) where focused is a comma separated list of BSSIDs
+    :rtype: list
+    """
+
+    if max_spread is None:
+        max_spread = width / 2
+
+    _channels = {}
+    _skipped = 0
+    _covered = 0
+    for guess in guesses:
+        if skip_confident and _confidence(guess) >= SKIP_CONFIDENCE:
+            _skipped += 1
+            continue
+        if index is not None and index.coverage(guess.bssid) >= COVERED_CAPTURES:
+            _covered += 1
+            continue
+        _channels.setdefault(guess.channel, []).append(guess)
+
+    if _skipped:
+        module_logger.info("Skipping {} well localized access points".format(_skipped))
+    if _covered:
+        module_logger.info("Skipping {} access points covered by earlier captures".format(_covered))
+
+    _captures = []
+    for channel, _guesses in _channels.items():
+        for first, spread, members in _cluster_bearings(_guesses, max_spread):
+            # Union of the windows of each member, relative to the first bearing
+            _offsets = [(member.bearing - first) % 360 for member in members]
+            _widths = [focused_width(member, width) for member in members]
+            _start = min(o - w/2 for o, w in zip(_offsets, _widths))
+            _end = max(o + w/2 for o, w in zip(_offsets, _widths))
+            # Params hold whole degrees; round the window outwards so that it still covers every member's window
+            _start = math.floor(first + _start)
+            _degrees = math.ceil(first + _end - _start)
+
+            _param = params.copy()
+            _param.bearing_magnetic = _start
+            _param.degrees = _degrees
+            _param.duration = duration * _degrees / width
+            _param.channel = channel
+            _param.hop_int = 0
+            _param.focused = None
+            _param.macs = [member.bssid for member in members]
+            _captures.append((_param, ','.join(_param.macs)))
+
+    if len(_captures) < len(guesses):
+        module_logger.info("Planned {} focused captures for {} access points".format(len(_captures), len(guesses)))
+
+    return _captures
@@ -3,42 +3,74 @@ import logging
 import os
 import time
 from concurrent import futures
-from datetime import date
 
+import numpy as np
 import pandas as pd
 import pyshark
 from dateutil import parser
-from geomag import WorldMagneticModel
 from tqdm import tqdm
 
-from localizer import locate
-from localizer.meta import meta_csv_fieldnames, capture_suffixes, required_suffixes
+from localizer import afpacket, cube, dataset, declination as _declination_service, index, locate
+from localizer.gpsstream import position_fieldnames
+from localizer.meta import CaptureMeta, meta_csv_fieldnames, capture_suffixes, required_suffixes, timeline_csv_fieldnames
 
 module_logger = logging.getLogger(__name__)
 
-
-def process_capture(meta, path, write_to_disk=False, guess=False, clockwise=True, macs=None):
+# Seconds beacons may fall outside of a capture's gps track (fixes arrive about once a second) before being reported
+TRACK_MARGIN = 2
+
+# Types of the results columns. Strings repeated for every beacon are dictionary encoded, and numbers are only as wide
+# as they need to be. Channels are 16 bit, as beacons without a channel tag record the frequency (MHz) instead
+results_dtypes = {'capture': 'category',
+                  'pass': 'category',
+                  'duration': np.float32,
+                  'hop-rate': np.float32,
+                  'timestamp': np.float64,
+                  'bssid': 'category',
+                  'ssid': 'category',
+                  'encryption': 'category',
+                  'cipher': 'category',
+                  'auth': 'category',
+                  'ssi': np.int8,
+                  'channel': np.uint16,
+                  'bearing_magnetic': np.float32,
+                  'bearing_true': np.float32,
+                  'lat': np.float64,
+                  'lon': np.float64,
+                  'alt': np.float32,
+                  'lat_err': np.float32,
+                  'lon_error': np.float32,
+                  'alt_error': np.float32,
+                  'mw': np.float32,
+                  }
+
+
+def process_capture(meta, path, write_to_disk=False, guess=False, clockwise=True, macs=None, moving=False,
+                    declination=None):
     """
     Process a captured data set
-    :param meta:            meta dict containing capture results
+    :param meta:            CaptureMeta (or meta dict) containing capture results
     :param write_to_disk:   bool designating whether to write to disk
     :param guess:           bool designating whether to return a table of guessed bearings for detected BSSIDs
-    :param clockwise:       direction antenna was moving during the capture,
+    :param clockwise:       direction antenna was moving during the capture, if not recorded in the meta
     :param macs:            list of macs to filter on
+    :param moving:          bool designating whether to position each beacon from the gps track, instead of the
+                            capture's average position
+    :param declination:     magnetic declination at the capture, if already resolved
     :return: (_beacon_count, _results_path):
     """
 
+    if not isinstance(meta, CaptureMeta):
+        meta = CaptureMeta.from_dict(meta)
+
     module_logger.info("Processing capture (meta: {})".format(str(meta)))
 
     _beacon_count = 0
     _beacon_failures = 0
 
     # Correct bearing to compensate for magnetic declination
-    _declination = WorldMagneticModel()\
-        .calc_mag_field(float(meta[meta_csv_fieldnames[6]]),
-                        float(meta[meta_csv_fieldnames[7]]),
-                        date=date.fromtimestamp(float(meta["start"])))\
-        .declination
+    _declination = declination if declination is not None else \
+        _declination_service.declination(meta.pos_lat, meta.pos_lon, date=meta.start)
 
     # Read results into a DataFrame
     # Build columns
@@ -65,21 +97,16 @@ def process_capture(meta, path, write_to_disk=False, guess=False, clockwise=True
                         ]
 
     _rows = []
-    _pcap = os.path.join(path, meta[meta_csv_fieldnames[16]])
+    _pcap = os.path.join(path, meta.pcap)
 
-    # Build filter string
-    _filter = 'wlan[0] == 0x80'
     # Override any provide mac filter list if we have one in the capture metadata
-    if meta_csv_fieldnames[19] in meta and meta[meta_csv_fieldnames[19]]:
-        macs = [meta[meta_csv_fieldnames[19]]]
-    if macs:
-        _mac_string = ' and ('
-        _mac_strings = ['wlan.bssid == ' + mac for mac in macs]
-        _mac_string += ' or '.join(_mac_strings)
-        _mac_string += ')'
-        _filter += _mac_string
+    if meta.macs:
+        macs = meta.macs
 
-    packets = pyshark.FileCapture(_pcap, display_filter=_filter, keep_packets=False, use_json=True)
+    packets = pyshark.FileCapture(_pcap, display_filter=_beacon_filter(macs), keep_packets=False, use_json=True,
+                                  include_raw=True)
+    # (bssid, information elements): (ssid, channel, encryption, cipher, auth)
+    _ie_cache = {}
 
     for packet in packets:
 
@@ -87,103 +114,30 @@ def process_capture(meta, path, write_to_disk=False, guess=False, clockwise=True
             # Get time, bssid & db from packet
             pbssid = packet.wlan.bssid
             ptime = parser.parse(packet.sniff_timestamp).timestamp()
-            pssid = next((tag.ssid for tag in packet.wlan_mgt.tagged.all.tag if hasattr(tag, 'ssid')), None)
             pssi = int(packet.wlan_radio.signal_dbm) if hasattr(packet.wlan_radio, 'signal_dbm') else int(packet.radiotap.dbm_antsignal)
-            pchannel = next((int(tag.current_channel) for tag in packet.wlan_mgt.tagged.all.tag if hasattr(tag, 'current_channel')), None)
-            if not pchannel:
-                pchannel = int(packet.wlan_radio.channel) if hasattr(packet.wlan_radio, 'channel') else int(packet.radiotap.channel.freq)
-
-            # Determine AP security, if any https://ccie-or-null.net/2011/06/22/802-11-beacon-frames/
-            pencryption = None
-            pcipher = None
-            pauth = None
-
-            _cipher_tree = None
-            _auth_tree = None
-
-            # Parse Security Details
-            # Check for MS WPA tag
-            _ms_wpa = next((i for i, tag in enumerate(packet.wlan_mgt.tagged.all.tag) if hasattr(tag, 'wfa.ie.wpa.version')), None)
-            if _ms_wpa is not None:
-                pencryption = "WPA"
-
-                if hasattr(packet.wlan_mgt.tagged.all.tag[_ms_wpa].wfa.ie.wpa, 'akms.list'):
-                    _auth_tree = packet.wlan_mgt.tagged.all.tag[_ms_wpa].wfa.ie.wpa.akms.list.akms_tree
-
-                if hasattr(packet.wlan_mgt.tagged.all.tag[_ms_wpa].wfa.ie.wpa, 'ucs.list'):
-                    _cipher_tree = packet.wlan_mgt.tagged.all.tag[_ms_wpa].wfa.ie.wpa.ucs.list.ucs_tree
-
-            # Check for RSN Tag
-            _rsn = next((i for i, tag in enumerate(packet.wlan_mgt.tagged.all.tag) if hasattr(tag, 'rsn')), None)
-            if _rsn is not None:
-                pencryption = "WPA"
-
-                if hasattr(packet.wlan_mgt.tagged.all.tag[_rsn].rsn, 'akms.list') and _auth_tree is None:
-                    _auth_tree = packet.wlan_mgt.tagged.all.tag[_rsn].rsn.akms.list.akms_tree
-
-                if hasattr(packet.wlan_mgt.tagged.all.tag[_rsn].rsn, 'pcs.list') and _cipher_tree is None:
-                    _cipher_tree = packet.wlan_mgt.tagged.all.tag[_rsn].rsn.pcs.list.pcs_tree
 
-            # Parse _auth_tree
-            if _auth_tree:
-                try:
-                    _type = _auth_tree.type == '2'
-                except AttributeError:
-                    _type = next((_node.type for _node in _auth_tree if hasattr(_node, 'type') and (_node.type == '2' or _node.type == '3')), False)
+            # Beacons of an AP repeat the same information elements, so only parse them once per distinct body
+            _key = _ie_key(packet)
+            _ies = _ie_cache.get((pbssid, _key)) if _key is not None else None
+            if _ies is None:
+                _ies = _parse_ies(packet)
+                if _key is not None:
+                    _ie_cache[(pbssid, _key)] = _ies
+            pssid, pchannel, pencryption, pcipher, pauth = _ies
 
-                if _type == '3':
-                    pauth = "FT"
-                elif _type == '2':
-                    pauth = "PSK"
-
-            # Parse _cipher_tree
-            if _cipher_tree:
-                _types = []
-                try:
-                    _types.append(_cipher_tree.type)
-                except AttributeError:
-                    _types += [_node.type for _node in _cipher_tree if hasattr(_node, 'type')]
-
-                if _types:
-                    _types_str = []
-                    for _type in _types:
-                        if _type == '4':
-                            _types_str.append("CCMP")
-                        elif _type == '2':
-                            _types_str.append("TKIP")
-                    pcipher = "+".join(_types_str)
-
-            if not pencryption:
-                # WEP
-                pencryption = "WEP" if packet.wlan_mgt.fixed.all.capabilities_tree.has_field("privacy") and packet.wlan_mgt.fixed.all.capabilities_tree.privacy == 1 else "Open"
-                if pencryption == "WEP":
-                    pcipher = "WEP"
+            if not pchannel:
+                pchannel = int(packet.wlan_radio.channel) if hasattr(packet.wlan_radio, 'channel') else int(packet.radiotap.channel.freq)
 
         except AttributeError as e:
             module_logger.warning("Failed to parse packet: {}".format(e))
             _beacon_failures += 1
             continue
 
-        # Antenna correlation
-        # Compute the timespan for the rotation, and use the relative packet time to determine
-        # where in the rotation the packet was captured
-        # This is necessary to have a smooth antenna rotation with microstepping
-        total_time = float(meta["end"]) - float(meta["start"])
-        pdiff = ptime - float(meta["start"])
-        if pdiff <= 0:
-            pdiff = 0
-
-        cw = 1 if clockwise else -1
-
-        pprogress = pdiff / total_time
-        pbearing_magnetic = (cw * pprogress * float(meta["degrees"]) + float(meta["bearing"])) % 360
-        pbearing_true = (pbearing_magnetic + _declination) % 360
-
         _rows.append([
-            meta[meta_csv_fieldnames[0]],
-            meta[meta_csv_fieldnames[1]],
-            meta[meta_csv_fieldnames[4]],
-            meta[meta_csv_fieldnames[5]],
+            meta.name,
+            meta.pass_num,
+            meta.duration,
+            meta.hop_int,
             ptime,
             str(pbssid),
             str(pssid),
@@ -192,33 +146,70 @@ def process_capture(meta, path, write_to_disk=False, guess=False, clockwise=True
             pauth,
             pssi,
             pchannel,
-            pbearing_magnetic,
-            pbearing_true,
-            meta[meta_csv_fieldnames[6]],
-            meta[meta_csv_fieldnames[7]],
-            meta[meta_csv_fieldnames[8]],
-            meta[meta_csv_fieldnames[9]],
-            meta[meta_csv_fieldnames[10]],
-            meta[meta_csv_fieldnames[11]],
+            None,
+            None,
+            meta.pos_lat,
+            meta.pos_lon,
+            meta.pos_alt,
+            meta.pos_lat_err,
+            meta.pos_lon_err,
+            meta.pos_alt_err,
         ])
 
         _beacon_count += 1
 
+    module_logger.debug("Parsed information elements of {} distinct beacon bodies for {} beacons"
+                        .format(len(_ie_cache), _beacon_count))
+
     _results_df = pd.DataFrame(_rows, columns=_default_columns)
+
+    # Antenna correlation
+    # Use the antenna motion timeline to determine where in the rotation each packet was captured. Captures without
+    # a timeline fall back to assuming a constant rotation speed between start and end
+    if meta.clockwise is not None:
+        clockwise = meta.clockwise
+    cw = 1 if clockwise else -1
+    _offsets, _degrees = _load_timeline(meta, path)
+    _pdiff = (_results_df['timestamp'].values.astype(float) - meta.start).clip(min=0)
+    _pprogress = np.interp(_pdiff, _offsets, _degrees)
+    _results_df['bearing_magnetic'] = (cw * _pprogress + meta.bearing) % 360
+    _results_df['bearing_true'] = (_results_df['bearing_magnetic'] + _declination) % 360
+
+    # Position each beacon along the gps track when the platform was moving during the capture
+    if moving:
+        _track = _load_track(meta, path)
+        if _track is not None:
+            _timestamps = _results_df['timestamp'].values.astype(float)
+            _outside = np.count_nonzero((_timestamps < _track[0][0] - TRACK_MARGIN) |
+                                        (_timestamps > _track[0][-1] + TRACK_MARGIN))
+            if _outside:
+                module_logger.warning("{} of {} beacons in {} fall outside its gps track and take the position of the "
+                                      "nearest fix".format(_outside, len(_timestamps), meta.name))
+            _positions = _interpolate_track(_timestamps, *_track)
+            for column, values in zip(_default_columns[14:], _positions):
+                _results_df[column] = values
+        else:
+            module_logger.warning("No gps track for {}, using the capture's average position".format(meta.name))
+
     # Add mw column
     _results_df.loc[:, 'mw'] = dbm_to_mw(_results_df['ssi'])
     module_logger.info("Completed processing {} beacons ({} failures)".format(_beacon_count, _beacon_failures))
 
+    if module_logger.isEnabledFor(logging.DEBUG):
+        module_logger.debug("Results use {narrow:.0f} bytes per beacon ({wide:.0f} unencoded)"
+                            .format(**memory_report(_results_df)))
+    _results_df = narrow_results(_results_df)
+
     # If asked to guess, return list of bssids and a guess as to their bearing
     if guess:
-        _columns = ['ssid', 'bssid', 'channel', 'security', 'strength', 'method', 'bearing']
+        _columns = ['ssid', 'bssid', 'channel', 'security', 'strength', 'method', 'bearing', 'confidence', 'sharpness', 'density']
         _rows = []
 
         with futures.ProcessPoolExecutor() as executor:
 
             _guess_processes = {}
 
-            for names, group in _results_df.groupby(['ssid', 'bssid']):
+            for names, group in _results_df.groupby(['ssid', 'bssid'], observed=True):
                 _channel = group.groupby('channel').count()['capture'].idxmax()
                 _encryption = pd.unique(group['encryption'])[0]
                 # _cipher = pd.unique(group['cipher'])[0]
@@ -228,25 +219,275 @@ def process_capture(meta, path, write_to_disk=False, guess=False, clockwise=True
                     names = ('<blank>', names[1])
 
                 _row = [names[0], names[1], _channel, _encryption, _strength]
-                _guess_processes[executor.submit(locate.interpolate, group, int(meta['degrees']))] = _row
+                _guess_processes[executor.submit(locate.estimate, group, meta.degrees)] = _row
 
             for future in futures.as_completed(_guess_processes):
                 _row = _guess_processes[future]
-                _guess, _method = future.result()
-                _rows.append(_row + [_method, _guess])
+                _guess, _method, _confidence, _sharpness, _density = future.result()
+                _rows.append(_row + [_method, _guess, _confidence, _sharpness, _density])
 
             guess = pd.DataFrame(_rows, columns=_columns).sort_values('strength', ascending=False)
 
     # If a path is given, write the results to a file
     if write_to_disk:
-        _results_path = os.path.join(path, time.strftime('%Y%m%d-%H-%M-%S') + "-results" + ".csv")
+        _prefix = time.strftime('%Y%m%d-%H-%M-%S')
+        _results_path = os.path.join(path, _prefix + "-results" + ".csv")
         _results_df.to_csv(_results_path, sep=',', index=False)
         module_logger.info("Wrote results to {}".format(_results_path))
         write_to_disk = _results_path
 
+        # Write the bearing/power cube, so that guesses can be re-estimated without the results
+        cube.Cube.build(_results_df, meta.degrees).save(os.path.join(path, _prefix + capture_suffixes["cube"]))
+
     return _beacon_count, _results_df, write_to_disk, guess
 
 
+def _ie_key(packet):
+    """
+    Cache key for the information elements of a beacon, from its raw bytes
+
+    :param packet: Beacon, read with include_raw
+    :type packet: pyshark.packet.packet.Packet
+    :return: Signature of the beacon, or None if its raw bytes aren't available
+    :rtype: bytes
+    """
+
+    try:
+        return afpacket.beacon_signature(packet.get_raw_packet())
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _parse_ies(packet):
+    """
+    Parse the ssid, channel and security of a beacon from its information elements
+
+    :param packet: Beacon
+    :type packet: pyshark.packet.packet.Packet
+    :return: (ssid, channel, encryption, cipher, auth); channel is None if the beacon has no DS parameter set
+    :rtype: tuple
+    """
+
+    _tags = packet.wlan_mgt.tagged.all.tag
+
+    pssid = None
+    pchannel = None
+    _ms_wpa = None
+    _rsn = None
+    for tag in _tags:
+        if pssid is None and hasattr(tag, 'ssid'):
+            pssid = tag.ssid
+        if pchannel is None and hasattr(tag, 'current_channel'):
+            pchannel = int(tag.current_channel)
+        if _ms_wpa is None and hasattr(tag, 'wfa.ie.wpa.version'):
+            _ms_wpa = tag
+        if _rsn is None and hasattr(tag, 'rsn'):
+            _rsn = tag
+
+    # Determine AP security, if any https://ccie-or-null.net/2011/06/22/802-11-beacon-frames/
+    pencryption = None
+    pcipher = None
+    pauth = None
+
+    _cipher_tree = None
+    _auth_tree = None
+
+    # Parse Security Details
+    # Check for MS WPA tag
+    if _ms_wpa is not None:
+        pencryption = "WPA"
+
+        if hasattr(_ms_wpa.wfa.ie.wpa, 'akms.list'):
+            _auth_tree = _ms_wpa.wfa.ie.wpa.akms.list.akms_tree
+
+        if hasattr(_ms_wpa.wfa.ie.wpa, 'ucs.list'):
+            _cipher_tree = _ms_wpa.wfa.ie.wpa.ucs.list.ucs_tree
+
+    # Check for RSN Tag
+    if _rsn is not None:
+        pencryption = "WPA"
+
+        if hasattr(_rsn.rsn, 'akms.list') and _auth_tree is None:
+            _auth_tree = _rsn.rsn.akms.list.akms_tree
+
+        if hasattr(_rsn.rsn, 'pcs.list') and _cipher_tree is None:
+            _cipher_tree = _rsn.rsn.pcs.list.pcs_tree
+
+    # Parse _auth_tree
+    if _auth_tree:
+        try:
+            _type = _auth_tree.type == '2'
+        except AttributeError:
+            _type = next((_node.type for _node in _auth_tree if hasattr(_node, 'type') and (_node.type == '2' or _node.type == '3')), False)
+
+        if _type == '3':
+            pauth = "FT"
+        elif _type == '2':
+            pauth = "PSK"
+
+    # Parse _cipher_tree
+    if _cipher_tree:
+        _types = []
+        try:
+            _types.append(_cipher_tree.type)
+        except AttributeError:
+            _types += [_node.type for _node in _cipher_tree if hasattr(_node, 'type')]
+
+        if _types:
+            _types_str = []
+            for _type in _types:
+                if _type == '4':
+                    _types_str.append("CCMP")
+                elif _type == '2':
+                    _types_str.append("TKIP")
+            pcipher = "+".join(_types_str)
+
+    if not pencryption:
+        # WEP
+        pencryption = "WEP" if packet.wlan_mgt.fixed.all.capabilities_tree.has_field("privacy") and packet.wlan_mgt.fixed.all.capabilities_tree.privacy == 1 else "Open"
+        if pencryption == "WEP":
+            pcipher = "WEP"
+
+    return pssid, pchannel, pencryption, pcipher, pauth
+
+
+def _beacon_filter(macs=None):
+    """
+    Build a display filter for beacons, optionally limited to a list of BSSIDs
+
+    :param macs: list of macs to filter on
+    :type macs: list[str]
+    :return: Display filter string
+    :rtype: str
+    """
+
+    _filter = 'wlan[0] == 0x80'
+    if macs:
+        _mac_string = ' and ('
+        _mac_strings = ['wlan.bssid == ' + mac for mac in macs]
+        _mac_string += ' or '.join(_mac_strings)
+        _mac_string += ')'
+        _filter += _mac_string
+
+    return _filter
+
+
+def read_signal(pcap, macs=None):
+    """
+    Quickly read the time, bssid and signal strength of each beacon in a capture. The capture may still be in
+    progress; a truncated final packet is ignored.
+
+    :param pcap: Path to the pcapng file
+    :type pcap: str
+    :param macs: list of macs to filter on
+    :type macs: list[str]
+    :return: DataFrame with timestamp, bssid, ssi and mw columns
+    :rtype: pd.DataFrame
+    """
+
+    _rows = []
+    packets = pyshark.FileCapture(pcap, display_filter=_beacon_filter(macs), keep_packets=False, use_json=True)
+
+    try:
+        for packet in packets:
+            try:
+                pssi = int(packet.wlan_radio.signal_dbm) if hasattr(packet.wlan_radio, 'signal_dbm') else int(packet.radiotap.dbm_antsignal)
+                _rows.append((parser.parse(packet.sniff_timestamp).timestamp(), str(packet.wlan.bssid), pssi))
+            except AttributeError:
+                continue
+    except pyshark.capture.capture.TSharkCrashException as e:
+        module_logger.debug("Stopped reading capture in progress: {}".format(e))
+    finally:
+        packets.close()
+
+    _signal_df = pd.DataFrame(_rows, columns=['timestamp', 'bssid', 'ssi'])
+    _signal_df['mw'] = dbm_to_mw(_signal_df['ssi'])
+    return _signal_df
+
+
+def _load_timeline(meta, path):
+    """
+    Load the antenna motion timeline for a capture
+
+    :param meta: Capture meta
+    :type meta: CaptureMeta
+    :param path: Path of the capture
+    :type path: str
+    :return: Arrays of (offsets, degrees) knots
+    :rtype: (np.ndarray, np.ndarray)
+    """
+
+    _timeline = meta.timeline
+    if _timeline and os.path.isfile(os.path.join(path, _timeline)):
+        with open(os.path.join(path, _timeline), 'rt') as timeline_csv:
+            _timeline_reader = csv.DictReader(timeline_csv, dialect='unix')
+            _knots = [(float(row[timeline_csv_fieldnames[0]]), float(row[timeline_csv_fieldnames[1]]))
+                      for row in _timeline_reader]
+
+        if len(_knots) >= 2:
+            _offsets, _degrees = zip(*_knots)
+            return np.array(_offsets), np.array(_degrees)
+
+    # Linear motion between start and end
+    return np.array([0, meta.end - meta.start]), np.array([0, meta.degrees])
+
+
+def _load_track(meta, path):
+    """
+    Load the gps track recorded during a capture
+
+    :param meta: Capture meta
+    :type meta: CaptureMeta
+    :param path: Path of the capture
+    :type path: str
+    :return: Array of fix timestamps, and array of (lat, lon, alt, lat error, lon error, alt error) for each fix, or
+             None if the capture has no fixes
+    :rtype: (np.ndarray, np.ndarray)
+    """
+
+    _coords = meta.coords
+    if not _coords or not os.path.isfile(os.path.join(path, _coords)):
+        return None
+
+    try:
+        _track_df = pd.read_csv(os.path.join(path, _coords))
+    except pd.errors.EmptyDataError:
+        return None
+
+    # Place fixes by the host clock, which beacons are timestamped with, rather than by the gps clock; the two can be
+    # minutes apart on a platform without NTP or an RTC. Tracks recorded before the host clock was logged only have
+    # the gps time
+    _time = 'received' if 'received' in _track_df.columns else 'timestamp'
+    _track_df = _track_df.dropna(subset=[_time, 'lat', 'lon']).sort_values(_time)
+    if _track_df.empty:
+        return None
+
+    return _track_df[_time].values.astype(float), _track_df[position_fieldnames].values.astype(float).T
+
+
+def _interpolate_track(timestamps, track_timestamps, track):
+    """
+    Interpolate positions along a gps track. Beacons before the first fix or after the last take that fix's position.
+
+    :param timestamps: Timestamps to interpolate positions for
+    :type timestamps: np.ndarray
+    :param track_timestamps: Timestamps of the fixes
+    :type track_timestamps: np.ndarray
+    :param track: Array of (lat, lon, alt, lat error, lon error, alt error) for each fix
+    :type track: np.ndarray
+    :return: Array of (lat, lon, alt, lat error, lon error, alt error) for each timestamp
+    :rtype: np.ndarray
+    """
+
+    _positions = np.empty((len(track), len(timestamps)))
+    for i, values in enumerate(track):
+        # Skip fixes missing this field (eg altitude from a 2D fix)
+        _valid = ~np.isnan(values)
+        _positions[i] = np.interp(timestamps, track_timestamps[_valid], values[_valid]) if _valid.any() else np.nan
+
+    return _positions
+
+
 def _check_capture_dir(files):
     """
     Check whether the list of files has the required files in it to be considered a capture directory
@@ -297,14 +538,75 @@ def _get_capture_meta(files):
     return None
 
 
-def process_directory(macs=None, clockwise=True):
+def find_captures(path=None, unprocessed=False):
+    """
+    Find and load the meta of every capture under a directory
+
+    :param path: Directory to search; the working directory by default
+    :type path: str
+    :param unprocessed: Only find captures that have not been processed yet
+    :type unprocessed: bool
+    :return: List of (capture directory, meta)
+    :rtype: list[(str, CaptureMeta)]
+    """
+
+    _captures = []
+    for root, dirs, files in os.walk(path if path is not None else os.getcwd()):
+        if not _check_capture_dir(files) or (unprocessed and _check_capture_processed(files)):
+            continue
+
+        _file = _get_capture_meta(files)
+        assert _file is not None
+        _captures.append((root, CaptureMeta.read(os.path.join(root, _file))))
+
+    return _captures
+
+
+def meta_table(captures):
+    """
+    Build a single typed table of capture metas
+
+    :param captures: List of (capture directory, meta), as returned by find_captures
+    :type captures: list[(str, CaptureMeta)]
+    :return: DataFrame with a row per capture, a column per meta field, and the capture directory
+    :rtype: pd.DataFrame
+    """
+
+    _table = pd.DataFrame.from_records([meta.to_dict() for _, meta in captures], columns=meta_csv_fieldnames)
+    _table['directory'] = [root for root, _ in captures]
+    return _table.infer_objects()
+
+
+def record_capture(meta, path, results, bssid_index):
+    """
+    Add a processed capture to the consolidated dataset and the BSSID index. The index is saved straight away: once
+    the capture is in the dataset it counts as consolidated, and its index entries would not be added again.
+
+    :param meta: Capture meta
+    :type meta: CaptureMeta
+    :param path: Path of the capture
+    :type path: str
+    :param results: Results of process_capture
+    :type results: pd.DataFrame
+    :param bssid_index: Index to add the capture to
+    :type bssid_index: index.BssidIndex
+    """
+
+    dataset.append(meta, path, results)
+    bssid_index.add_capture(meta, path, results)
+    bssid_index.save()
+
+
+def process_directory(macs=None, clockwise=True, moving=False):
     """
     Process entire directory - will search subdirectories for required files and process them if not already processed
 
     :param macs: list of mac addresses to filter on
     :type macs: list[str]
-    :param clockwise: Direction of antenna travel
+    :param clockwise: Direction of antenna travel for captures that do not record their direction
     :type clockwise: bool
+    :param moving: Position each beacon from the capture's gps track, for captures taken on the move
+    :type moving: bool
     :return: The number of directories processed
     :rtype: int
     """
@@ -312,38 +614,123 @@ def process_directory(macs=None, clockwise=True):
     # Walk through each subdirectory of working directory
     module_logger.info("Building list of directories to process")
 
+    _captures = find_captures(unprocessed=True)
+
+    # Resolve the declination of every capture up front, so that workers don't each load the magnetic model
+    _declinations = _declination_service.declinations(
+        (meta.pos_lat, meta.pos_lon, 0, meta.start) for _, meta in _captures)
+
+    _index = index.BssidIndex.load()
+
     with futures.ProcessPoolExecutor() as executor:
 
         _processes = {}
         _results = 0
+        # Memory used by the results, with compact column types and without, over every beacon processed
+        _rows = _narrow_total = _wide_total = 0
 
-        for root, dirs, files in os.walk(os.getcwd()):
-            if not _check_capture_dir(files):
-                continue
-            elif _check_capture_processed(files):
-                continue
-            else:
-                # Add meta file to list
-                _file = _get_capture_meta(files)
-                assert _file is not None
-                _path = os.path.join(root, _file)
-
-                with open(_path, 'rt') as meta_csv:
-                    _meta_reader = csv.DictReader(meta_csv, dialect='unix')
-                    meta = next(_meta_reader)
-
-                _processes[executor.submit(process_capture, meta, root, True, False, clockwise, macs)] = _path
+        for (root, meta), _declination in zip(_captures, _declinations):
+            _processes[executor.submit(process_capture, meta, root, True, False, clockwise, macs, moving,
+                                       _declination)] = (root, meta)
 
         print("Found {} unprocessed data sets".format(len(_processes)))
 
         if _processes:
             with tqdm(total = len(_processes), desc = "Processing") as _pbar:
                 for future in futures.as_completed(_processes):
-                    _beacon_count, _, _, _ = future.result()
+                    _beacon_count, _results_df, _, _ = future.result()
                     _results += _beacon_count
+                    _rows += len(_results_df)
+                    _report = memory_report(_results_df)
+                    _narrow_total += _report['narrow_total']
+                    _wide_total += _report['wide_total']
+
+                    # Add the capture to the consolidated dataset
+                    _root, _meta = _processes[future]
+                    record_capture(_meta, _root, _results_df, _index)
                     _pbar.update(1)
 
                 print("Processed {} packets in {} directories".format(_results, len(_processes)))
+                if _rows:
+                    print("Results use {:.0f} bytes per beacon ({:.0f} unencoded)"
+                          .format(_narrow_total / _rows, _wide_total / _rows))
+
+
+def consolidate(path=None):
+    """
+    Add every processed capture under a directory that is missing from the consolidated dataset to it, and to the
+    BSSID index, from its most recent -results.csv
+
+    :param path: Directory to search; the working directory by default
+    :type path: str
+    :return: The number of captures added
+    :rtype: int
+    """
+
+    _index = index.BssidIndex.load()
+    _added = 0
+    for root, meta in find_captures(path):
+        if dataset.contains(meta):
+            continue
+
+        _results = sorted(file for file in os.listdir(root) if file.endswith(capture_suffixes["results"]))
+        if not _results:
+            continue
+
+        record_capture(meta, root, read_results(os.path.join(root, _results[-1])), _index)
+        _added += 1
+
+    print("Added {} captures to the dataset".format(_added))
+    return _added
+
+
+def narrow_results(results):
+    """
+    Convert results to their compact column types
+
+    :param results: Results of process_capture
+    :type results: pd.DataFrame
+    :rtype: pd.DataFrame
+    """
+
+    return results.astype({column: dtype for column, dtype in results_dtypes.items() if column in results})
+
+
+def read_results(path):
+    """
+    Read a -results.csv with its compact column types
+
+    :param path: Path of the -results.csv
+    :type path: str
+    :rtype: pd.DataFrame
+    """
+
+    # Read pass and capture names as written (eg '01'), rather than as numbers
+    return narrow_results(pd.read_csv(path, dtype={'capture': str, 'pass': str}))
+
+
+def memory_report(results):
+    """
+    Memory footprint of results, with compact column types and without (every string a python object and every number
+    64 bit)
+
+    :param results: Results of process_capture
+    :type results: pd.DataFrame
+    :return: Dictionary of bytes per beacon, 'narrow' and 'wide', and the total bytes, 'narrow_total' and 'wide_total'
+    :rtype: dict
+    """
+
+    _wide = results.astype({column: object if dtype == 'category' else
+                            (np.int64 if np.issubdtype(dtype, np.integer) else np.float64)
+                            for column, dtype in results_dtypes.items() if column in results})
+    _narrow = narrow_results(results)
+
+    _wide_total = _wide.memory_usage(index=False, deep=True).sum()
+    _narrow_total = _narrow.memory_usage(index=False, deep=True).sum()
+    _rows = max(1, len(results))
+
+    return {'wide': _wide_total / _rows, 'narrow': _narrow_total / _rows,
+            'wide_total': _wide_total, 'narrow_total': _narrow_total}
 
 
 def dbm_to_mw(dbm):
@@ -0,0 +1,220 @@
+import datetime
+import glob
+import logging
+import math
+import os
+import select
+import shutil
+import signal
+import threading
+import time
+from subprocess import Popen, PIPE, DEVNULL, run
+
+from localizer import interface
+
+module_logger = logging.getLogger(__name__)
+
+# Seconds to wait for dumpcap to flush packets to disk before extracting a capture from the session
+FLUSH_DELAY = 1
+# Seconds to wait for the session's dumpcap to open its first file
+START_TIMEOUT = 10
+# Seconds of packets per session file. Extracting a capture (and checking convergence) only reads the files that
+# overlap it, so this keeps the cost of each capture independent of how long the session has been running
+SEGMENT_DURATION = 60
+# Session files kept in the ring buffer, beyond those needed to hold the longest capture
+SEGMENT_FILES = 5
+
+_editcap_time_format = "%Y-%m-%d %H:%M:%S.%f"
+_segment_time_format = "%Y%m%d%H%M%S"
+
+
+class CaptureSession:
+
+    def __init__(self, iface, path, segment=SEGMENT_DURATION, files=SEGMENT_FILES, buffer_size=12):
+        """
+        A single dumpcap process that stays up across many captures. Each capture is defined by its start and end time
+        and is extracted from the session into its own pcapng, which avoids starting dumpcap (and waiting for it to open
+        its file) for every capture in a batch.
+
+        :param iface: Interface to capture on
+        :type iface: str
+        :param path: Directory to write the session files to
+        :type path: str
+        :param segment: Seconds of packets per session file, or None to write the session to a single file
+        :type segment: int
+        :param files: Number of session files to keep when segmented, as a ring buffer, or None to keep them all
+        :type files: int
+        :param buffer_size: Kernel buffer size (MiB)
+        :type buffer_size: int
+        """
+
+        if shutil.which("dumpcap") is None or shutil.which("editcap") is None:
+            raise RuntimeError("Capture sessions need 'dumpcap' and 'editcap' to be installed")
+        # Captures that span session files are merged back together
+        if segment and shutil.which("mergecap") is None:
+            raise RuntimeError("Segmented capture sessions need 'mergecap' to be installed")
+
+        self.iface = iface
+        self._path = path
+        self._segment = segment
+        self._files = files
+        self._buffer_size = buffer_size
+        self._proc = None
+        self._prefix = os.path.join(path, "session-" + time.strftime('%Y%m%d-%H-%M-%S'))
+
+    def start(self):
+        """
+        Start the session's dumpcap, returning once it is writing packets
+        """
+
+        if not interface.prepare(self.iface):
+            raise RuntimeError("Could not put {} into monitor mode".format(self.iface))
+
+        os.makedirs(self._path, exist_ok=True)
+
+        command = ['dumpcap', '-i', self.iface, '-B', str(self._buffer_size), '-q', '-w', self._prefix + '.pcapng']
+        if self._segment:
+            command += ['-b', 'duration:{}'.format(self._segment)]
+            if self._files:
+                command += ['-b', 'files:{}'.format(self._files)]
+
+        self._proc = Popen(command, stdout=DEVNULL, stderr=PIPE)
+
+        # Read stderr without blocking, so that the timeout applies even if dumpcap hangs without printing anything
+        _deadline = time.time() + START_TIMEOUT
+        _output = b""
+        while not any(line.startswith(b"File:") for line in _output.splitlines()):
+            _remaining = _deadline - time.time()
+            _chunk = None
+            if _remaining > 0 and select.select([self._proc.stderr], [], [], _remaining)[0]:
+                _chunk = os.read(self._proc.stderr.fileno(), 4096)
+            if not _chunk:
+                self._proc.kill()
+                self._proc.wait()
+                raise RuntimeError("Capture session on {} failed to start ({})"
+                                   .format(self.iface, _output.decode().strip() or "timed out"))
+            _output += _chunk
+
+        # Keep reading dumpcap's stderr for the rest of the session, so that a full pipe can't block it
+        _drain = threading.Thread(target=self._drain, args=(self._proc.stderr,), name="session-stderr", daemon=True)
+        _drain.start()
+
+        module_logger.info("Started capture session on {} ({})".format(self.iface, self._prefix))
+
+    def _drain(self, stderr):
+        for line in iter(stderr.readline, b''):
+            module_logger.debug("dumpcap ({}): {}".format(self.iface, line.decode(errors='replace').rstrip()))
+        stderr.close()
+
+    @staticmethod
+    def ring_files(duration, segment=SEGMENT_DURATION, files=SEGMENT_FILES):
+        """
+        Number of session files a ring buffer needs to keep every capture of a batch until it has been extracted
+
+        :param duration: Duration of the longest capture
+        :type duration: float
+        :param segment: Seconds of packets per session file
+        :type segment: int
+        :param files: Spare files to keep
+        :type files: int
+        :rtype: int
+        """
+
+        return int(math.ceil(duration / segment)) + 1 + files
+
+    @property
+    def running(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def segments(self, start=None, end=None):
+        """
+        Session files holding packets between start and end, oldest first
+
+        :param start: (Optional) Time of the first packet of interest
+        :type start: float
+        :param end: (Optional) Time of the last packet of interest
+        :type end: float
+        :return: List of paths
+        :rtype: list
+        """
+
+        if not self._segment:
+            return [self._prefix + '.pcapng']
+
+        # Segments are named <prefix>_<number>_<start time>.pcapng
+        _segments = []
+        for path in sorted(glob.glob(self._prefix + '_*.pcapng')):
+            _stamp = os.path.splitext(path)[0].rsplit('_', 1)[-1]
+            _segments.append((time.mktime(time.strptime(_stamp, _segment_time_format)), path))
+
+        _selected = []
+        for i, (segment_start, path) in enumerate(_segments):
+            # Segment start times only have a resolution of a second, so keep the neighbouring segments
+            _next_start = _segments[i + 1][0] if i + 1 < len(_segments) else float('inf')
+            if (end is None or segment_start - 1 <= end) and (start is None or _next_start + 1 >= start):
+                _selected.append(path)
+
+        return _selected
+
+    def extract(self, start, end, output):
+        """
+        Write the packets captured between start and end to their own pcapng
+
+        :param start: Start of the capture
+        :type start: float
+        :param end: End of the capture
+        :type end: float
+        :param output: Path of the pcapng to write
+        :type output: str
+        :return: True if the capture was extracted
+        :rtype: bool
+        """
+
+        # Give dumpcap time to flush the end of the capture to disk
+        time.sleep(max(0, end + FLUSH_DELAY - time.time()))
+
+        _start = datetime.datetime.fromtimestamp(start).strftime(_editcap_time_format)
+        _end = datetime.datetime.fromtimestamp(end).strftime(_editcap_time_format)
+
+        _segments = self.segments(start, end)
+        if not _segments:
+            module_logger.error("No session files hold packets from {} to {}".format(_start, _end))
+            return False
+
+        _parts = [output] if len(_segments) == 1 else \
+            ["{}.part{}".format(output, i) for i in range(len(_segments))]
+
+        for segment, part in zip(_segments, _parts):
+            proc = run(['editcap', '-A', _start, '-B', _end, segment, part], stdout=DEVNULL, stderr=PIPE)
+            if proc.returncode != 0:
+                module_logger.error("Could not extract capture from {} ({})".format(segment, proc.stderr.decode().strip()))
+                return False
+
+        if len(_parts) > 1:
+            proc = run(['mergecap', '-w', output] + _parts, stdout=DEVNULL, stderr=PIPE)
+            for part in _parts:
+                os.remove(part)
+            if proc.returncode != 0:
+                module_logger.error("Could not merge capture {} ({})".format(output, proc.stderr.decode().strip()))
+                return False
+
+        return True
+
+    def close(self, remove=False):
+        """
+        Stop the session
+
+        :param remove: Delete the session files, once every capture has been extracted
+        :type remove: bool
+        """
+
+        if self.running:
+            self._proc.send_signal(signal.SIGINT)
+            self._proc.wait()
+
+        module_logger.info("Closed capture session on {}".format(self.iface))
+
+        if remove:
+            for path in self.segments():
+                if os.path.isfile(path):
+                    os.remove(path)
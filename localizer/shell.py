@@ -1,6 +1,5 @@
 import abc
 import configparser
-import csv
 import datetime
 import logging
 import os
@@ -10,10 +9,12 @@ import time
 from cmd import Cmd
 from distutils.util import strtobool
 
+from tabulate import tabulate
 from tqdm import tqdm
 
 import localizer
-from localizer import capture, process, meta, antenna, interface
+from localizer import capture, process, meta, antenna, index, interface, motion, orchestrate, pipeline, planner, session, \
+    gpsstream
 from localizer.capture import APs
 
 module_logger = logging.getLogger(__name__)
@@ -108,6 +109,22 @@ class DirCmd(Cmd, object, metaclass=abc.ABCMeta):
         raise NotImplementedError("Subclasses of this class must implement _update_prompt")
 
 
+def _start_gps_service():
+    """
+    Start a gps service to share across captures
+
+    :return: Running gps service, or None in debug mode
+    :rtype: gpsstream.GpsService
+    """
+
+    if localizer.debug:
+        return None
+
+    _service = gpsstream.GpsService()
+    _service.start()
+    return _service
+
+
 # Base Localizer Shell Class
 class LocalizerShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
 
@@ -119,6 +136,7 @@ class LocalizerShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
         if macs:
             self._params.macs = macs
         self._aps = APs()
+        self._gps_service = None
 
         # Ensure we have root
         if os.getuid() != 0:
@@ -139,6 +157,12 @@ class LocalizerShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
         self._update_prompt()
         self.cmdloop('Welcome to Localizer Shell...')
 
+    def postloop(self):
+        # Stop the gps service kept warm between captures
+        if self._gps_service is not None:
+            self._gps_service.stop()
+            self._gps_service = None
+
     @staticmethod
     def do_serve(args):
         """
@@ -223,6 +247,8 @@ class LocalizerShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
                     self._params.channel = value
                 elif param == "capture":
                     self._params.capture = value
+                elif param == "converge":
+                    self._params.converge = value
 
                 print("Parameter '{}' set to '{}'".format(param, value))
 
@@ -268,50 +294,81 @@ class LocalizerShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
         else:
             print("No detected aps, or scan hasn't been performed")
 
+    @staticmethod
+    def do_history(args):
+        """
+        Show every processed capture an access point was heard in. Provide a BSSID, or an SSID to show each of its BSSIDs
+        """
+
+        if not args:
+            print("Provide a BSSID or SSID")
+            return
+
+        _index = index.BssidIndex.load()
+        _bssids = [args] if args in _index else sorted(_index.bssids(args))
+        if not _bssids:
+            print("'{}' has not been heard in any processed capture".format(args))
+            return
+
+        for bssid in _bssids:
+            _rows = [(capture_id, datetime.datetime.fromtimestamp(entry['start']), entry['ssid'], entry['beacons'],
+                      entry['max_ssi'], entry['bearing'], entry['confidence'])
+                     for capture_id, entry in _index.history(bssid)]
+            print("{} ({} captures)".format(bssid, len(_rows)))
+            print(tabulate(_rows, headers=['capture', 'start', 'ssid', 'beacons', 'max ssi', 'bearing', 'confidence']))
+
     def do_capture(self, args):
         """
-        Start the capture with the needed parameters set
+        Start the capture with the needed parameters set. Provide one or more access point numbers from the list
+        command to perform focused captures on them; co-channel access points close together are captured together
         """
 
         split_args = args.split()
 
-        if len(split_args) >= 1 and int(split_args[0]) < len(self._aps):
-            # Build focused capture based on selected access point
-            _ap = self._aps[int(split_args[0])]
-            _prediction = _ap.bearing
-            _bearing = _prediction - capture.OPTIMAL_CAPTURE_DEGREES_FOCUSED/2
-            _duration = antenna.FOCUSED_RATE[capture.OPTIMAL_CAPTURE_DEGREES_FOCUSED] * capture.OPTIMAL_CAPTURE_DEGREES_FOCUSED / 360
-            _channel = _ap.channel
-            _bssid = _ap.bssid
-            _try_params = localizer.meta.Params(self._params.iface, _duration, capture.OPTIMAL_CAPTURE_DEGREES_FOCUSED, _bearing, hop_int=0, channel=_channel, macs=[_bssid])
+        try:
+            _selected = [int(arg) for arg in split_args]
+        except ValueError:
+            module_logger.error("Access point numbers must be integers")
+            return
+
+        if _selected and all(i < len(self._aps) for i in _selected):
+            # Build focused captures based on selected access points
+            _width = capture.OPTIMAL_CAPTURE_DEGREES_FOCUSED
+            _duration = motion.FOCUSED_RATE[_width] * _width / 360
+            _focused_params = self._params.copy()
+            _focused_params.macs = None
+            _captures = [_p for _p, _ in planner.focused_captures(_focused_params, [self._aps[i] for i in _selected], _width, _duration, skip_confident=False)]
+            _order, _, _ = planner.plan(_captures, antenna.bearing_current)
+            _captures = [_captures[i] for i in _order]
             module_logger.info("Setting capture to focused mode")
         else:
-            _try_params = self._params
+            _captures = [self._params]
 
-        if not _try_params.validate():
+        if not all(_try_params.validate() for _try_params in _captures):
             module_logger.error("You must set 'iface' and 'duration' parameters first")
         else:
             # Shutdown http server if it's on
             localizer.shutdown_httpd()
 
+            # Keep gps warm between captures
+            if self._gps_service is None:
+                self._gps_service = _start_gps_service()
+
             module_logger.info("Starting capture")
             try:
-                _result = capture.capture(_try_params, reset=_try_params.bearing_magnetic)
-                if _result:
-                    _capture_path, _meta = _result
-
-                    with open(os.path.join(_capture_path, _meta), 'rt') as meta_csv:
-                        _meta_reader = csv.DictReader(meta_csv, dialect='unix')
-                        meta_values = next(_meta_reader)
-
-                    _, _, _, _aps = process.process_capture(meta_values, _capture_path, write_to_disk=False, guess=True, macs=_try_params.macs)
-                    if len(self._aps):
-                        self._aps.update(_aps)
+                for i, _try_params in enumerate(_captures):
+                    # Reset the antenna to the start of the next capture, or back to the start of this one
+                    _reset = _captures[i + 1].bearing_magnetic if i + 1 < len(_captures) else _try_params.bearing_magnetic
+                    _result = capture.capture(_try_params, reset=_reset, gps_service=self._gps_service)
+                    if _result:
+                        _capture_path, _meta = _result
+
+                        _capture_meta = meta.CaptureMeta.read(os.path.join(_capture_path, _meta))
+                        _, _, _, _aps = process.process_capture(_capture_meta, _capture_path, write_to_disk=False, guess=True, macs=_try_params.macs)
+                        self._aps.update(_aps, _capture_path)
+                        print(self._aps)
                     else:
-                        self._aps.aps = _aps
-                    print(self._aps)
-                else:
-                    raise RuntimeError("Capture failed")
+                        raise RuntimeError("Capture failed")
 
             except RuntimeError as e:
                 module_logger.error(e)
@@ -332,7 +389,7 @@ class LocalizerShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
             _ap = self._aps[int(split_args[0])]
             _prediction = int(_ap.bearing)
             # Set antenna to predicted bearing
-            antenna.AntennaThread.reset_antenna(_prediction)
+            antenna.Antenna.reset_antenna(_prediction)
 
             # Connect to the access point
             try:
@@ -342,6 +399,37 @@ class LocalizerShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
         else:
             print("You must provide an AP number and a password")
 
+    @staticmethod
+    def do_calibrate(args):
+        """
+        Calibrate the antenna reset speed. The antenna is moved out and back over a series of distances at increasing
+        speeds; after each test confirm whether it returned to its reference mark. Provide 'sim' to run against a
+        simulated antenna.
+
+        :param args: (Optional) 'sim' to calibrate against the simulated backend
+        :type args: str
+        """
+
+        from localizer import calibrate
+
+        if args.strip() == 'sim':
+            _backend = calibrate.SimulatedBackend()
+        else:
+            input("Line the antenna up with a reference mark and press enter to begin calibration")
+            _backend = calibrate.RigBackend()
+
+        try:
+            _profile, _measurements = calibrate.calibrate(_backend)
+        except ValueError as e:
+            module_logger.error(e)
+            return
+
+        for degrees, rate in _measurements:
+            print("\t{:>5} degrees: {:>6.2f}s/360 (currently {:.2f}s/360)".format(degrees, rate, motion.RESET_RATE[degrees]))
+
+        if input("Save calibrated motion profile to {}? (yes/no): ".format(motion.PROFILE_PATH)).strip().lower() in ['y', 'yes']:
+            motion.save_profile(_profile)
+
     @staticmethod
     def do_batch(_):
         """
@@ -374,6 +462,10 @@ class BatchShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
         super().__init__()
 
         self._pause = True
+        self._pipeline = False
+        self._serpentine = False
+        self._session = False
+        self._backend = orchestrate.BACKEND_DUMPCAP
         self._batches = []
 
         # Start the command loop - these need to be the last lines in the initializer
@@ -434,16 +526,55 @@ class BatchShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
 
             _start_time = time.time()
             print("Starting batch of {} captures".format(_total))
-            _curr = 0
-            for _, _passes, _captures in self._batches:
-                _len_pass = len(str(_passes))
-                for cap in _captures:
-                    for p in range(_passes):
-                        print(localizer.R + "Capture {:>4}/{}\t\t{} elapsed".format(_curr, _total, datetime.timedelta(seconds=time.time()-_start_time)) + localizer.W)
-                        capture.capture(cap, str(p).zfill(_len_pass), cap.bearing_magnetic)
-                        _curr += 1
-
-            print("Complete - total time elapsed: {}".format(datetime.timedelta(seconds=time.time()-_start_time)))
+            _pipeline = _session = _gps_service = None
+            _complete = False
+            try:
+                _pipeline = pipeline.ProcessingPipeline() if self._pipeline else None
+                _session = self._start_session() if self._session else None
+                _gps_service = _start_gps_service()
+                _curr = 0
+                for _, _passes, _captures in self._batches:
+                    _len_pass = len(str(_passes))
+                    for cap in _captures:
+                        for p in range(_passes):
+                            print(localizer.R + "Capture {:>4}/{}\t\t{} elapsed".format(_curr, _total, datetime.timedelta(seconds=time.time()-_start_time)) + localizer.W)
+                            _capture_start = time.time()
+                            _clockwise, _reset, _reset_clockwise = BatchShell._sweep(cap, p, _passes, self._serpentine)
+                            _result = capture.capture(cap, str(p).zfill(_len_pass), _reset,
+                                                      clockwise=_clockwise, reset_clockwise=_reset_clockwise,
+                                                      session=_session, backend=self._backend,
+                                                      gps_service=_gps_service)
+                            _curr += 1
+
+                            # Hand the capture to the processing worker while the next capture runs
+                            if _pipeline is not None and _result:
+                                _pipeline.submit(_result[0], _capture_start, time.time())
+
+                            # Skip the remaining passes once bearings have converged
+                            if cap.converge and _result and BatchShell._converged(*_result):
+                                print("Bearings converged, skipping {} remaining passes".format(_passes - p - 1))
+                                _curr += _passes - p - 1
+                                break
+                _complete = True
+            finally:
+                # Shut everything down even if a capture failed or the batch was interrupted
+                if _session is not None:
+                    _session.close(remove=True)
+                if _gps_service is not None:
+                    _gps_service.stop()
+
+                print("{} - total time elapsed: {}".format("Complete" if _complete else "Stopped",
+                                                           datetime.timedelta(seconds=time.time()-_start_time)))
+
+                if _pipeline is not None:
+                    print("Finishing processing...")
+                    _summary = _pipeline.close()
+                    print("Processed {} beacons in {} captures; {} of {} processing overlapped with capture ({} deferred)"
+                          .format(_summary['beacons'], _summary['captures'],
+                                  datetime.timedelta(seconds=round(_summary['overlap_time'])),
+                                  datetime.timedelta(seconds=round(_summary['processing_time'])),
+                                  _summary['deferred']))
+                    print("Total time elapsed: {}".format(datetime.timedelta(seconds=time.time()-_start_time)))
 
     def do_get(self, _):
         """
@@ -475,6 +606,96 @@ class BatchShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
 
         print("Pause is {}".format("ENABLED" if self._pause else "DISABLED"))
 
+    def do_pipeline(self, args):
+        """
+        Process each capture in the background while the next capture runs
+
+        :param args: True to process captures during the batch, False to leave them for the process command
+        :type args: str
+        """
+
+        args = args.split()
+        if len(args) > 0:
+            try:
+                self._pipeline = strtobool(args[0])
+            except ValueError:
+                module_logger.error("Could not understand pipeline value '{}'".format(args[0]))
+
+        print("Pipeline is {}".format("ENABLED" if self._pipeline else "DISABLED"))
+
+    def do_serpentine(self, args):
+        """
+        Alternate the direction of each pass so that the antenna does not slew back to the start between passes
+
+        :param args: True to alternate clockwise and counter-clockwise passes, False to capture every pass clockwise
+        :type args: str
+        """
+
+        args = args.split()
+        if len(args) > 0:
+            try:
+                self._serpentine = strtobool(args[0])
+            except ValueError:
+                module_logger.error("Could not understand serpentine value '{}'".format(args[0]))
+
+        print("Serpentine is {}".format("ENABLED" if self._serpentine else "DISABLED"))
+
+    def do_session(self, args):
+        """
+        Keep a single dumpcap session running across the batch, extracting each capture from it, instead of starting
+        dumpcap for every capture
+
+        :param args: True to capture through a session, False to start dumpcap for each capture
+        :type args: str
+        """
+
+        args = args.split()
+        if len(args) > 0:
+            try:
+                self._session = strtobool(args[0])
+            except ValueError:
+                module_logger.error("Could not understand session value '{}'".format(args[0]))
+
+        print("Session is {}".format("ENABLED" if self._session else "DISABLED"))
+
+    def do_backend(self, args):
+        """
+        Choose how packets are captured: 'dumpcap', or 'ring' to capture in process from a memory-mapped ring
+
+        :param args: Name of the backend
+        :type args: str
+        """
+
+        args = args.split()
+        if len(args) > 0:
+            if args[0] in orchestrate.BACKENDS:
+                self._backend = args[0]
+            else:
+                module_logger.error("Unknown backend '{}', choose from {}".format(args[0], orchestrate.BACKENDS))
+
+        print("Backend is {}".format(self._backend))
+
+    def _start_session(self):
+        """
+        Start a capture session, as a ring of time-segmented files, on the interface of the first imported capture
+
+        :return: Running session, or None if it could not be started
+        :rtype: session.CaptureSession
+        """
+
+        _cap = self._batches[0][2][0]
+        # Keep enough session files in the ring to hold the longest capture until it is extracted
+        _longest = max(cap.duration for _, _, captures in self._batches for cap in captures)
+        try:
+            _session = session.CaptureSession(_cap.iface, os.path.join(_cap.capture, "session"),
+                                              files=session.CaptureSession.ring_files(_longest),
+                                              buffer_size=capture.buffer_size)
+            _session.start()
+            return _session
+        except RuntimeError as e:
+            module_logger.error("Could not start capture session, starting dumpcap for each capture ({})".format(e))
+            return None
+
     def do_clear(self, _):
         """
         Clear all batches
@@ -506,6 +727,49 @@ class BatchShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
         return datetime.timedelta(seconds=_time)
 
 
+    @staticmethod
+    def _sweep(cap, pass_num, passes, serpentine):
+        """
+        Direction of a pass, and where to leave the antenna for the following pass. Serpentine passes alternate
+        direction, so each pass starts where the previous one finished; the last pass returns to the start of the
+        capture.
+
+        :param cap: Capture parameters
+        :type cap: Params
+        :param pass_num: Index of the pass
+        :type pass_num: int
+        :param passes: Number of passes of this capture
+        :type passes: int
+        :param serpentine: Whether to alternate the direction of passes
+        :type serpentine: bool
+        :return: (clockwise, reset bearing, whether the following sweep is clockwise)
+        :rtype: (bool, float, bool)
+        """
+
+        _clockwise = not (serpentine and pass_num % 2)
+
+        if not serpentine or pass_num == passes - 1:
+            return _clockwise, cap.bearing_magnetic, True
+
+        if _clockwise:
+            return _clockwise, (cap.bearing_magnetic + cap.degrees) % 360, False
+        return _clockwise, cap.bearing_magnetic, True
+
+    @staticmethod
+    def _converged(capture_path, meta_file):
+        """
+        Check whether a capture was stopped early because its bearing estimates converged
+
+        :param capture_path: Path of the capture
+        :type capture_path: str
+        :param meta_file: Filename of the capture meta
+        :type meta_file: str
+        :return: True if the capture converged
+        :rtype: bool
+        """
+
+        return bool(meta.CaptureMeta.read(os.path.join(capture_path, meta_file)).converged)
+
     @staticmethod
     def _parse_batch(file):
         """
@@ -588,14 +852,14 @@ class BatchShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
             elif 'hop_int' in meta_section:
                 _hop_int = meta_section['hop_int']
             else:
-                _hop_int = interface.OPTIMAL_BEACON_INT
+                _hop_int = meta.OPTIMAL_BEACON_INT
 
             if 'hop_dist' in capture_section:
                 _hop_dist = capture_section['hop_dist']
             elif 'hop_dist' in meta_section:
                 _hop_dist = meta_section['hop_dist']
             else:
-                _hop_dist = interface.STD_CHANNEL_DISTANCE
+                _hop_dist = meta.STD_CHANNEL_DISTANCE
 
             if 'capture' in capture_section:
                 _capture = capture_section['capture']
@@ -625,7 +889,14 @@ class BatchShell(ExitCmd, ShellCmd, DirCmd, DebugCmd):
             else:
                 _focused = None
 
-            cap = localizer.meta.Params(_iface, _duration, _degrees, _bearing, _hop_int, _hop_dist, _macs, _channel, _focused, _capture)
+            if 'converge' in capture_section:
+                _converge = capture_section['converge']
+            elif 'converge' in meta_section:
+                _converge = meta_section['converge']
+            else:
+                _converge = None
+
+            cap = localizer.meta.Params(_iface, _duration, _degrees, _bearing, _hop_int, _hop_dist, _macs, _channel, _focused, _capture, _converge)
             # Validate iface
             module_logger.debug("Setting iface {}".format(_iface))
             cap.iface = _iface
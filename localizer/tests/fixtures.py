@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from localizer import process
+
+
+def results_frame(bssids, ssids=None, ssis=None, start=1767268800, capture='test', pass_num='01', lat=40.123456,
+                  lon=-70.123456):
+    """
+    Results of process_capture with a beacon per bssid, a second apart
+
+    :param bssids: BSSID of each beacon
+    :type bssids: list[str]
+    :param ssids: (Optional) SSID of each beacon; None by default
+    :type ssids: list[str]
+    :param ssis: (Optional) Signal strength of each beacon; -40 dBm and weaker by default
+    :type ssis: list[int]
+    :rtype: pd.DataFrame
+    """
+
+    _count = len(bssids)
+    _ssis = np.array(ssis) if ssis is not None else -40 - np.arange(_count) % 50
+    return pd.DataFrame({'capture': capture, 'pass': pass_num, 'duration': 15., 'hop-rate': .18,
+                         'timestamp': start + np.arange(_count, dtype=float), 'bssid': list(bssids),
+                         'ssid': list(ssids) if ssids is not None else [None] * _count, 'encryption': 'WPA',
+                         'cipher': 'CCMP', 'auth': 'PSK', 'ssi': _ssis, 'channel': 6,
+                         'bearing_magnetic': np.arange(_count) % 360., 'bearing_true': np.arange(_count) % 360.,
+                         'lat': lat, 'lon': lon, 'alt': None, 'lat_err': 3., 'lon_error': 2., 'alt_error': None,
+                         'mw': process.dbm_to_mw(_ssis)})
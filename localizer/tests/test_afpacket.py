@@ -0,0 +1,107 @@
+import os
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import unittest
+from unittest import TestCase
+
+from localizer import afpacket
+
+_bssid = bytes.fromhex('0a1b2c3d4e5f')
+
+
+def _beacon(ssi, elements=b'', flags=0, fcs=b''):
+    # Radiotap header with flags, channel and antenna signal present
+    _radiotap = struct.pack('<BBHI', 0, 0, 16, (1 << 1) | (1 << 3) | (1 << 5)) + \
+        struct.pack('<BxHHb', flags, 2412, 0x00a0, ssi) + b'\0' * 1
+    _header = bytes([0x80, 0]) + b'\0' * 2 + b'\xff' * 6 + _bssid + _bssid + b'\0' * 2
+    return _radiotap + _header + b'\0' * 12 + elements + fcs
+
+
+def _element(id, body):
+    return bytes([id, len(body)]) + body
+
+
+class TestAFPacket(TestCase):
+
+    def test_parse_beacon(self):
+        _frame = _beacon(-42)
+        self.assertEqual(afpacket.parse_beacon(_frame), ('0a:1b:2c:3d:4e:5f', -42))
+        self.assertIsNone(afpacket.parse_beacon(_frame[:16] + b'\x40' + _frame[17:]))
+
+    def test_beacon_signature(self):
+        _ssid = _element(0, b'test')
+        _rsn = _element(48, bytes.fromhex('0100000fac040100000fac040100000fac020000'))
+        _frame = _beacon(-42, _ssid + _element(5, b'\x00\x03\x00\x00') + _rsn)
+
+        # Beacons differing only in their TIM or signal strength have the same signature
+        _signature = afpacket.beacon_signature(_frame)
+        self.assertEqual(_signature, afpacket.beacon_signature(_beacon(-60, _ssid + _element(5, b'\x01\x03\x00\x00') + _rsn)))
+        self.assertEqual(_signature, afpacket.beacon_signature(_beacon(-42, _ssid + _element(5, b'\x00\x03\x00\x00') + _rsn,
+                                                                       flags=0x10, fcs=b'\x30\x02\xff\xff')))
+        self.assertNotEqual(_signature, afpacket.beacon_signature(_beacon(-42, _ssid)))
+        self.assertIsNone(afpacket.beacon_signature(_frame[:16] + b'\x40' + _frame[17:]))
+
+    def test_pcapng_writer(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            _path = os.path.join(tmp, 'test.pcapng')
+            _writer = afpacket.PcapngWriter(_path, 127)
+            _writer.write(1500000000123456, _beacon(-50))
+            _writer.close()
+
+            with open(_path, 'rb') as f:
+                _data = f.read()
+
+        # Section header, interface description and one enhanced packet block
+        _types = []
+        _offset = 0
+        while _offset < len(_data):
+            _type, _length = struct.unpack_from('=II', _data, _offset)
+            self.assertEqual(struct.unpack_from('=I', _data, _offset + _length - 4)[0], _length)
+            _types.append(_type)
+            _offset += _length
+        self.assertEqual(_types, [0x0A0D0D0A, 1, 6])
+
+    @unittest.skipUnless(hasattr(os, 'geteuid') and os.geteuid() == 0, "Needs root to create a veth pair")
+    def test_ring_capture(self):
+        if subprocess.call(['ip', 'link', 'add', 'lzrtest0', 'type', 'veth', 'peer', 'name', 'lzrtest1'],
+                           stderr=subprocess.DEVNULL) != 0:
+            self.skipTest("Could not create a veth pair")
+
+        try:
+            for iface in ['lzrtest0', 'lzrtest1']:
+                subprocess.check_call(['ip', 'link', 'set', iface, 'up'])
+
+            _frames = []
+            _started = threading.Event()
+            with tempfile.TemporaryDirectory() as tmp:
+                _ring = afpacket.RingCapture('lzrtest1', os.path.join(tmp, 'test.pcapng'),
+                                             callback=lambda ts, frame: _frames.append(frame))
+                _result = []
+                _thread = threading.Thread(target=lambda: _result.append(_ring.run(2, started=_started)))
+                _thread.start()
+                _started.wait()
+
+                _sender = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+                _sender.bind(('lzrtest0', 0))
+                for ssi in range(-60, -40):
+                    _sender.send(_beacon(ssi))
+                _sender.close()
+
+                _thread.join()
+                _ring.close()
+
+                self.assertTrue(os.path.getsize(os.path.join(tmp, 'test.pcapng')) > 0)
+
+            _beacons = [afpacket.parse_beacon(frame) for frame in _frames]
+            self.assertEqual([ssi for _, ssi in filter(None, _beacons)], list(range(-60, -40)))
+            self.assertGreaterEqual(_result[0][0], 20)
+            self.assertEqual(_result[0][1], 0)
+        finally:
+            subprocess.call(['ip', 'link', 'del', 'lzrtest0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
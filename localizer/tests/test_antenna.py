@@ -1,12 +1,8 @@
-import queue
 import time
 import unittest
-from threading import Event
-
-from tqdm import trange
 
 import localizer
-from localizer.antenna import AntennaThread
+from localizer.antenna import Antenna
 
 _
 
@@ -22,35 +18,20 @@ class TestAntenna(unittest.TestCase):
         self.assertTrue(localizer.meta.validate_antenna(), msg=("Invalid parameters:\n" + str(localizer.meta)))
 
     def test_2_antenna_rotation(self):
-        _response_queue = queue.Queue()
-        _flag = Event()
-        _thread = AntennaThread(_response_queue,
-                                _flag,
-                                localizer.meta.duration,
-                                localizer.meta.degrees,
-                                localizer.meta.bearing)
-        _thread.start()
-
-        _flag.set()
-
-        # Display timer
-        for sec in trange(localizer.meta.duration, desc="Executing test for {}s"
-                .format((str(localizer.meta.duration)))):
-            time.sleep(1)
-
-        loop_start_time, loop_stop_time, loop_expected_time, loop_average_time = _response_queue.get()
+        _start = time.time()
+        loop_start_time, loop_stop_time, _timeline = Antenna.sweep(localizer.meta.degrees, localizer.meta.duration)
 
         self.assertGreater(loop_stop_time, loop_start_time, msg="Somethings horribly wrong")
 
-        print("Antenna test complete (total time: {}s)".format(loop_stop_time - loop_start_time))
+        loop_expected_time = _timeline[-1][0]
+        loop_actual_time = loop_stop_time - loop_start_time
+        print("Antenna test complete (total time: {}s)".format(time.time() - _start))
         print("\tExpected loop time:\t{:.15f}s".format(loop_expected_time))
-        print("\tActual loop time:\t{:>.15f}s".format(loop_average_time))
+        print("\tActual loop time:\t{:>.15f}s".format(loop_actual_time))
         print("\tActual loop time {:.2%} longer than expected".format(
-            (loop_average_time - loop_expected_time) / loop_expected_time))
-
-        self.assertAlmostEqual(loop_expected_time, loop_average_time, msg="Antenna loop is too slow")
+            (loop_actual_time - loop_expected_time) / loop_expected_time))
 
-        _thread.join()
+        self.assertAlmostEqual(loop_expected_time, loop_actual_time, delta=.1, msg="Antenna loop is too slow")
 
 
 # Script can be run standalone to test the antenna
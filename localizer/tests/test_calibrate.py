@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from localizer import calibrate, motion
+
+
+class TestCalibrate(TestCase):
+
+    def test_simulated_calibration(self):
+        _backend = calibrate.SimulatedBackend()
+        _profile, _measurements = calibrate.calibrate(_backend)
+
+        self.assertEqual(len(_measurements), len(calibrate.CALIBRATION_DISTANCES))
+        for degrees, rate in _measurements:
+            # The fitted curve should stay close to the measured safe rates
+            self.assertAlmostEqual(motion.symmetric_sigmoid(degrees, *_profile), rate, delta=rate * .2)
+            # Measured rates must pass on the simulated antenna
+            self.assertTrue(_backend.move(degrees, rate))
+
+        # Longer moves should be faster than short ones
+        self.assertLess(motion.symmetric_sigmoid(720, *_profile), motion.symmetric_sigmoid(10, *_profile))
+
+    def test_save_and_load_profile(self):
+        _previous = list(motion.RESET_RATE)
+        _path = os.path.join(tempfile.mkdtemp(), 'motion.json')
+
+        try:
+            motion.save_profile((2, 10, 50, 1.5), _path)
+            self.assertAlmostEqual(motion.RESET_RATE[0], 10)
+
+            motion.set_reset_profile(motion.DEFAULT_RESET_PROFILE)
+            self.assertEqual(motion.RESET_RATE, [motion.get_reset_rate(x) for x in range(len(motion.RESET_RATE))])
+
+            self.assertTrue(motion.load_profile(_path))
+            self.assertAlmostEqual(motion.RESET_RATE[0], 10)
+            self.assertFalse(motion.load_profile(_path + '.missing'))
+        finally:
+            motion.RESET_RATE[:] = _previous
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,19 @@
 import math
 import os
-import queue
 import tempfile
 import time
 import unittest
-from threading import Event
+from threading import Event, Thread
+from unittest import mock
 
-from tqdm import trange
+import pandas as pd
 
 import localizer
-from localizer.capture import CaptureThread
+from localizer import capture, dataset, index, interface, orchestrate
+from localizer.capture import APs
 from localizer.interface import get_first_interface
+from localizer.meta import CaptureMeta, Params
+from localizer.tests.fixtures import results_frame
 
 
 class TestCapture(unittest.TestCase):
@@ -29,44 +32,141 @@ class TestCapture(unittest.TestCase):
         self.assertTrue(localizer.meta.validate_capture(), msg=("Invalid parameters:\n" + str(localizer.meta)))
 
     def test_2_packet_capture(self):
-        _response_queue = queue.Queue()
-        _flag = Event()
-        _dummyflag = Event()
+        _params = Params(iface=localizer.meta.iface, duration=localizer.meta.duration)
         _tmp_path = os.path.join(localizer.meta.path, 'tmp.pcapng')
-        _thread = CaptureThread(_response_queue,
-                                _flag,
-                                _dummyflag,
-                                localizer.meta.iface,
-                                localizer.meta.duration,
-                                _tmp_path)
-        _thread.start()
-        _flag.set()
-
-        # Display timer
-        for sec in trange(localizer.meta.duration, desc="Executing test for {}s"
-                .format((str(localizer.meta.duration)))):
-            time.sleep(1)
-
-        num_rcv, num_drop = _response_queue.get()
-        _start, _end = _response_queue.get()
-
-        self.assertEquals(math.floor(_end - _start - localizer.meta.duration), 0, "Capture took too long (> 1s difference)")
+        _tmp_nmea = os.path.join(localizer.meta.path, 'tmp.nmea')
+        _tmp_csv = os.path.join(localizer.meta.path, 'tmp.csv')
+        _started = Event()
+
+        # Check the channel changes at least once during the capture
+        _channels = set()
+
+        def _watch_channel():
+            _started.wait()
+            _end = time.time() + _params.duration
+            while time.time() < _end:
+                _channels.add(interface.get_channel(_params.iface))
+                time.sleep(.5)
+
+        _watcher = Thread(target=_watch_channel, daemon=True)
+        _watcher.start()
+
+        _results = orchestrate.CaptureOrchestrator(_params, _tmp_path, _tmp_nmea, _tmp_csv, _params.degrees,
+                                                   _params.bearing_magnetic, start_flag=_started).run()
+        _watcher.join()
+
+        num_rcv, num_drop = _results['packets']
+        _start, _end = _results['channels']
+
+        self.assertEquals(math.floor(_end - _start - _params.duration), 0, "Capture took too long (> 1s difference)")
         print("Received {} packets (dropped {} packets)".format(num_rcv, num_drop))
         self.assertGreater(num_rcv, 0, "Failed to capture any packets")
         self.assertEqual(num_drop, 0, "Dropped packets")
+        self.assertGreater(len(_channels), 1, "Failed to hop channels")
 
         self.assertTrue(os.path.isfile(_tmp_path), msg="Failed to create packet capture")
-        # Cleanup file
-        os.remove(_tmp_path)
+        # Cleanup files
+        for path in [_tmp_path, _tmp_nmea, _tmp_csv]:
+            if os.path.isfile(path):
+                os.remove(path)
         self.assertFalse(os.path.isfile(_tmp_path), msg="Failed to remove packet capture")
 
-        _thread.join()
+
+class TestAPs(unittest.TestCase):
+
+    @staticmethod
+    def _guesses(rows):
+        return pd.DataFrame([{'ssid': ssid, 'bssid': bssid, 'channel': 6, 'security': 'WPA', 'strength': strength,
+                              'method': 'pchip', 'bearing': bearing, 'confidence': .5, 'sharpness': 1, 'density': .5}
+                             for ssid, bssid, strength, bearing in rows])
+
+    def test_update(self):
+        _aps = APs()
+        _aps.update(self._guesses([('one', '00:00:00:00:00:01', -40, 10), ('two', '00:00:00:00:00:02', -60, 20)]),
+                    'capture/1')
+        _aps.update(self._guesses([('three', '00:00:00:00:00:03', -30, 30), ('two', '00:00:00:00:00:02', -50, 25)]),
+                    'capture/2')
+
+        # Access points keep their index, and are updated in place
+        self.assertEqual(len(_aps), 3)
+        self.assertEqual([ap.ssid for ap in _aps], ['one', 'two', 'three'])
+        self.assertEqual(_aps[1].bearing, 25)
+        self.assertEqual(_aps[1].strength, -50)
+        self.assertEqual(_aps[1].captures, ['capture/1', 'capture/2'])
+        self.assertIn('00:00:00:00:00:03', _aps)
+
+        _table = _aps.table()
+        self.assertEqual(list(_table['bssid']), ['00:00:00:00:00:01', '00:00:00:00:00:02', '00:00:00:00:00:03'])
+        self.assertIn('three', str(_aps))
+
+
+class TestFocusedRecord(unittest.TestCase):
+
+    def test_record(self):
+        # A focused parent capture is processed inline, so it must reach the dataset and index itself
+        _guesses = pd.DataFrame([{'ssid': 'net', 'bssid': '00:00:00:00:00:01', 'channel': 6, 'security': 'WPA',
+                                  'strength': -40, 'method': 'pchip', 'bearing': 90., 'confidence': .8,
+                                  'sharpness': 1, 'density': .5}])
+        _orchestrator = mock.Mock()
+        _orchestrator.run.return_value = {'sweep': (1767268800, 1767268815, [(0, 0), (15, 360)]),
+                                          'gps': (40.1, -70.1, None, 3, 3, None),
+                                          'packets': (100, 0),
+                                          'drops': [],
+                                          'reset': None,
+                                          'phases': [('start', 1767268800)]}
+
+        _cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                _params = Params(iface='wlan0', duration=15, capture='test', focused=(84, 6))
+                with mock.patch.object(orchestrate, 'CaptureOrchestrator', return_value=_orchestrator), \
+                        mock.patch.object(capture.process, 'process_capture',
+                                          return_value=(2, results_frame(['00:00:00:00:00:01'] * 2), None, _guesses)), \
+                        mock.patch.object(capture.planner, 'focused_captures', return_value=[]):
+                    _path, _meta_file = capture.capture(_params, '1')
+
+                _meta = CaptureMeta.read(os.path.join(_path, _meta_file))
+                self.assertTrue(dataset.contains(_meta))
+                self.assertEqual(list(dataset.query(table=dataset.GUESSES)['bssid']), ['00:00:00:00:00:01'])
+                # Its guesses reach the index that plans later focused captures
+                self.assertEqual(index.BssidIndex.load().coverage('00:00:00:00:00:01'), 1)
+            finally:
+                os.chdir(_cwd)
+
+
+class TestBufferSize(unittest.TestCase):
+
+    def setUp(self):
+        capture.buffer_size = capture.DEFAULT_BUFFER_SIZE
+
+    def tearDown(self):
+        capture.buffer_size = capture.DEFAULT_BUFFER_SIZE
+
+    def test_below_threshold(self):
+        self.assertFalse(capture._adjust_buffer_size(12, 100000, 0))
+        self.assertFalse(capture._adjust_buffer_size(12, 100000, int(100000 * capture.DROP_THRESHOLD)))
+        self.assertEqual(capture.buffer_size, capture.DEFAULT_BUFFER_SIZE)
+
+    def test_doubles(self):
+        self.assertTrue(capture._adjust_buffer_size(12, 1000, 10))
+        self.assertEqual(capture.buffer_size, 24)
+
+        # A capture that started with a smaller buffer doesn't shrink it
+        self.assertTrue(capture._adjust_buffer_size(12, 1000, 10))
+        self.assertEqual(capture.buffer_size, 24)
+
+    def test_cap(self):
+        self.assertTrue(capture._adjust_buffer_size(capture.MAX_BUFFER_SIZE - 1, 1000, 10))
+        self.assertEqual(capture.buffer_size, capture.MAX_BUFFER_SIZE)
+
+        self.assertFalse(capture._adjust_buffer_size(capture.MAX_BUFFER_SIZE, 1000, 10))
+        self.assertEqual(capture.buffer_size, capture.MAX_BUFFER_SIZE)
 
 
 # Script can be run standalone
 if __name__ == "__main__":
     import argparse
-    from localizer import interface
 
     parser = argparse.ArgumentParser(description="Test packet capture by capturing from dumpcap")
     parser.add_argument("duration",
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from localizer import cube
+
+
+def _results(bssid, peak, step=2, offset=0):
+    _bearings = np.arange(offset, 360, step, dtype=float)
+    _ssi = -80 + 40 * np.cos(np.radians(_bearings - peak)).clip(min=0)
+    return pd.DataFrame({'bssid': bssid, 'bearing_magnetic': _bearings, 'ssi': _ssi, 'mw': 10 ** (_ssi / 10)})
+
+
+class TestCube(TestCase):
+
+    def test_build(self):
+        _results_df = pd.DataFrame({'bssid': ['a', 'a', 'a', 'b'],
+                                    'bearing_magnetic': [10.2, 9.8, 359.7, 180],
+                                    'mw': [1., 3., 2., 4.]})
+        _cube = cube.Cube.build(_results_df, 360)
+
+        self.assertEqual(list(_cube.bssids), ['a', 'b'])
+        self.assertEqual(_cube.count[0, 10], 2)
+        self.assertEqual(_cube.max_mw[0, 10], 3)
+        self.assertEqual(_cube.mean_mw[0, 10], 2)
+        # Bearings round to the nearest bin, wrapping around north
+        self.assertEqual(_cube.count[0, 0], 1)
+        self.assertTrue(np.isnan(_cube.mean_mw[1, 0]))
+
+    def test_save_and_estimate(self):
+        _cube = cube.Cube.build(pd.concat([_results('a', 90), _results('b', 250)]), 360)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _path = os.path.join(tmp, 'test-cube.npz')
+            _cube.save(_path)
+            _cube = cube.Cube.load(_path)
+
+        _guesses = _cube.estimate().set_index('bssid')
+        self.assertAlmostEqual(_guesses.loc['a', 'bearing'], 90, delta=2)
+        self.assertAlmostEqual(_guesses.loc['b', 'bearing'], 250, delta=2)
+        self.assertEqual(_guesses.loc['a', 'beacons'], 180)
+
+    def test_fuse(self):
+        # Two sparse captures of the same access points, interleaved
+        _first = cube.Cube.build(pd.concat([_results('a', 90, 10), _results('b', 200, 10)]), 360)
+        _second = cube.Cube.build(_results('a', 90, 10, 5), 360)
+        _fused = cube.fuse([_first, _second])
+
+        self.assertEqual(list(_fused.bssids), ['a', 'b'])
+        self.assertEqual(_fused.count[0].sum(), 72)
+        self.assertEqual(_fused.count[1].sum(), 36)
+        self.assertAlmostEqual(_fused.estimate().set_index('bssid').loc['a', 'bearing'], 90, delta=2)
+
+        with self.assertRaises(ValueError):
+            cube.fuse([_first, cube.Cube.build(_results('a', 90), 360, bins=72)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import pandas as pd
+
+from localizer import dataset
+from localizer.meta import CaptureMeta
+from localizer.tests.fixtures import results_frame
+
+
+def _results(meta, bssids):
+    return results_frame(bssids, start=meta.start, capture=meta.name, pass_num=meta.pass_num, lat=meta.pos_lat,
+                         lon=meta.pos_lon)
+
+
+class TestDataset(TestCase):
+
+    def test_append_and_query(self):
+        _day = datetime.datetime(2026, 1, 1, 12).timestamp()
+        _metas = [CaptureMeta(name='first', pass_num='0', duration=15, start=_day, pos_lat=40.001, pos_lon=-70.002),
+                  CaptureMeta(name='second', pass_num='1', duration=15, start=_day + 86400 * 2, pos_lat=41,
+                              pos_lon=-71, guess='test-guess.csv')]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _root = os.path.join(tmp, 'dataset')
+            pd.DataFrame([{'ssid': 'net', 'bssid': 'aa:aa:aa:aa:aa:aa', 'channel': 6, 'security': 'WPA',
+                           'strength': -40, 'method': 'interpolation', 'bearing': 90, 'confidence': 80,
+                           'sharpness': 1, 'density': 1}]).to_csv(os.path.join(tmp, 'test-guess.csv'))
+
+            dataset.append(_metas[0], tmp, _results(_metas[0], ['aa:aa:aa:aa:aa:aa', 'bb:bb:bb:bb:bb:bb']), _root)
+            dataset.append(_metas[1], tmp, _results(_metas[1], ['aa:aa:aa:aa:aa:aa']), _root)
+            # Adding a capture again replaces it
+            dataset.append(_metas[1], tmp, _results(_metas[1], ['aa:aa:aa:aa:aa:aa']), _root)
+
+            self.assertTrue(dataset.contains(_metas[0], _root))
+            self.assertEqual(len(dataset.query(root=_root)), 3)
+
+            _rows = dataset.query('aa:aa:aa:aa:aa:aa', root=_root)
+            self.assertEqual(sorted(_rows['capture']), ['first', 'second'])
+            self.assertEqual(set(_rows['site']), {'40.00_-70.00', '41.00_-71.00'})
+            # Repeated strings come back dictionary encoded, and numbers narrow
+            self.assertEqual(_rows['bssid'].dtype.name, 'category')
+            self.assertEqual(_rows['ssi'].dtype.name, 'int8')
+
+            _rows = dataset.query('aa:aa:aa:aa:aa:aa', since=datetime.datetime(2026, 1, 2), root=_root)
+            self.assertEqual(list(_rows['capture']), ['second'])
+
+            # Beacons after midnight belong to the partition of the day the capture started
+            _late = CaptureMeta(name='late', pass_num='0', duration=15, start=datetime.datetime(2026, 1, 5, 23, 59, 59).timestamp(),
+                                pos_lat=41, pos_lon=-71)
+            dataset.append(_late, tmp, _results(_late, ['cc:cc:cc:cc:cc:cc', 'cc:cc:cc:cc:cc:cc']), _root)
+            _rows = dataset.query('cc:cc:cc:cc:cc:cc', since=datetime.datetime(2026, 1, 6), root=_root)
+            self.assertEqual(len(_rows), 1)
+            self.assertEqual(list(_rows['date']), ['2026-01-05'])
+
+            _guesses = dataset.query(['aa:aa:aa:aa:aa:aa'], table=dataset.GUESSES, root=_root)
+            self.assertEqual(list(_guesses['capture']), ['second'])
+            self.assertEqual(_guesses['bearing'][0], 90)
+
+            self.assertTrue(dataset.query('aa:aa:aa:aa:aa:aa', root=os.path.join(tmp, 'missing')).empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import datetime
+import unittest
+from unittest import TestCase, mock
+
+from localizer import declination
+
+
+class TestDeclination(TestCase):
+
+    def setUp(self):
+        declination._lookup.cache_clear()
+
+    def test_cached_lookups(self):
+        with mock.patch.object(declination, '_get_model', wraps=declination._get_model) as _get_model:
+            _first = declination.declination(40.0001, -70.0001, 10, datetime.date(2026, 1, 1))
+            _second = declination.declination(40.0002, -70.0002, 20, datetime.date(2026, 1, 1))
+
+        self.assertEqual(_first, _second)
+        self.assertEqual(_get_model.call_count, 1)
+        self.assertEqual(declination.cache_info().hits, 1)
+
+    def test_batch(self):
+        _start = datetime.datetime(2026, 1, 1, 12).timestamp()
+        _positions = [(40, -70, 0, _start + i) for i in range(100)] + [(41, -71, 0, _start)]
+
+        _declinations = declination.declinations(_positions)
+
+        self.assertEqual(len(_declinations), 101)
+        self.assertEqual(declination.cache_info().misses, 2)
+        self.assertEqual(_declinations[-1], declination.declination(41, -71, 0, datetime.date(2026, 1, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
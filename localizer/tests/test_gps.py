@@ -1,16 +1,13 @@
 import math
 import os
-import queue
 import tempfile
 import time
 import unittest
-from threading import Event
 
 import gpsd
-from tqdm import trange
 
 import localizer
-from localizer import gps
+from localizer import gpsstream
 
 
 class TestGPS(unittest.TestCase):
@@ -34,21 +31,13 @@ class TestGPS(unittest.TestCase):
             self.fail("Failed to connect to gpsd and gps device")
 
     def test_3_gps_capture(self):
-        _response_queue = queue.Queue()
-        _flag = Event()
         _tmp_nmea = os.path.join(localizer.meta.path, 'tmp.nmea')
         _tmp_csv = os.path.join(localizer.meta.path, 'tmp.csv')
-        _thread = gps.GPSThread(_response_queue, _flag, localizer.meta.duration, _tmp_nmea, _tmp_csv)
-        _thread.start()
-        _flag.set()
 
-        # Display timer
-        for sec in trange(localizer.meta.duration, desc="Executing test for {}s"
-                .format((str(localizer.meta.duration)))):
-            time.sleep(1)
-
-        _avg_lat, _avg_lon, _avg_alt, _avg_lat_err, _avg_lon_err, _avg_alt_err = _response_queue.get()
-        _start, _end = _response_queue.get()
+        _start = time.time()
+        _avg_lat, _avg_lon, _avg_alt, _avg_lat_err, _avg_lon_err, _avg_alt_err = \
+            gpsstream.record(_tmp_csv, localizer.meta.duration, nmea_output=_tmp_nmea)
+        _end = time.time()
 
         self.assertEquals(math.floor(_end - _start - localizer.meta.duration), 0, "GPS Capture took too long (> 1s difference)")
 
@@ -64,8 +53,6 @@ class TestGPS(unittest.TestCase):
         self.assertFalse(os.path.isfile(_tmp_nmea), msg="Failed to remove NMEA capture")
         self.assertFalse(os.path.isfile(_tmp_csv), msg="Failed to remove parsed NMEA capture")
 
-        _thread.join()
-
 # Script can be run standalone to test the antenna
 if __name__ == "__main__":
     import argparse
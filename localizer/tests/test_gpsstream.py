@@ -0,0 +1,156 @@
+import csv
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import TestCase
+
+from localizer import gpsstream
+
+
+def _tpv(lat, lon, second):
+    return {"class": "TPV", "mode": 3, "time": "2026-01-01T12:00:{:02d}.500Z".format(second),
+            "lat": lat, "lon": lon, "alt": 100 + second, "epx": 2, "epy": 3, "epv": 5}
+
+
+class FakeGpsd(threading.Thread):
+
+    def __init__(self, reports, hold=None):
+        """
+        Serve a fixed list of reports to the first client that sends a WATCH command, keeping the connection open until
+        the hold event is set
+        """
+
+        super().__init__()
+        self.daemon = True
+        self._reports = reports
+        self._hold = hold
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(1)
+        self.port = self._server.getsockname()[1]
+        self.watch = None
+
+    def run(self):
+        _conn, _ = self._server.accept()
+        self.watch = _conn.recv(1024).decode()
+        _conn.sendall(b'{"class":"VERSION","release":"3.17"}\n')
+        for report in self._reports:
+            if isinstance(report, dict):
+                report = json.dumps(report)
+            _conn.sendall((report + '\r\n').encode())
+        if self._hold is not None:
+            self._hold.wait(10)
+        _conn.close()
+        self._server.close()
+
+
+class TestGpsStream(TestCase):
+
+    def test_running_stats(self):
+        _stats = gpsstream.RunningStats()
+        for value in [2, 4, 4, 4, 5, 5, 7, 9]:
+            _stats.update(value)
+        _stats.update(None)
+
+        self.assertEqual(_stats.count, 8)
+        self.assertAlmostEqual(_stats.mean, 5)
+        self.assertAlmostEqual(_stats.variance, 32 / 7)
+
+    def test_report_time(self):
+        self.assertAlmostEqual(gpsstream.report_time({"time": "2026-01-01T12:00:01.500Z"}), 1767268801.5)
+        self.assertAlmostEqual(gpsstream.report_time({"time": 1767268801.25}), 1767268801.25)
+
+    def test_record_from_fake_gpsd(self):
+        _reports = [{"class": "SKY", "satellites": []},
+                    {"class": "TPV", "mode": 1}] + [_tpv(40 + i / 100, -70 - i / 100, i) for i in range(10)]
+        _server = FakeGpsd(_reports)
+        _server.start()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _csv = os.path.join(tmp, 'test-gps.csv')
+            _client = gpsstream.GpsdClient(port=_server.port)
+            _summary = gpsstream.record(_csv, 5, client=_client)
+            _client.close()
+
+            with open(_csv) as f:
+                _rows = list(csv.DictReader(f))
+
+        self.assertIn('"json": true', _server.watch)
+        self.assertEqual(len(_rows), 10)
+        self.assertAlmostEqual(float(_rows[1]['timestamp']), 1767268801.5)
+        # Fixes also record when they arrived by the host clock
+        self.assertAlmostEqual(float(_rows[1]['received']), time.time(), delta=10)
+        self.assertAlmostEqual(_summary[0], 40.045)
+        self.assertAlmostEqual(_summary[1], -70.045)
+        self.assertAlmostEqual(_summary[3], 3)
+
+    def test_record_nmea(self):
+        _sentence = '$GPGGA,120001.50,4000.000,N,07000.000,W,1,08,0.9,101.0,M,,M,,*47'
+        _server = FakeGpsd([_sentence, _tpv(40, -70, 1), _sentence])
+        _server.start()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _nmea = os.path.join(tmp, 'test.nmea')
+            _client = gpsstream.GpsdClient(port=_server.port, nmea=True)
+            gpsstream.record(os.path.join(tmp, 'test-gps.csv'), 5, client=_client, nmea_output=_nmea)
+            _client.close()
+
+            with open(_nmea, 'rb') as f:
+                _lines = f.read().split(b'\r\n')
+
+        self.assertIn('"nmea": true', _server.watch)
+        self.assertEqual(_lines, [_sentence.encode()] * 2 + [b''])
+
+    @staticmethod
+    def _serve(reports):
+        _hold = threading.Event()
+        _server = FakeGpsd(reports, _hold)
+        _server.start()
+        _service = gpsstream.GpsService(gpsstream.GpsdClient(port=_server.port, nmea=True))
+        _service.start()
+
+        # Wait for the service to read every fix
+        _deadline = time.time() + 5
+        while (_service.latest or {}).get('time') != reports[-1]['time'] and time.time() < _deadline:
+            time.sleep(.05)
+
+        return _service, _hold
+
+    def test_service_stationary(self):
+        _service, _hold = self._serve([_tpv(40 + (i % 2) / 1e6, -70, i) for i in range(20)])
+
+        try:
+            self.assertTrue(_service.wait_for_fix())
+            self.assertTrue(_service.stationary)
+
+            # A capture started on a warm, stationary service reuses the accumulated position
+            with tempfile.TemporaryDirectory() as tmp:
+                _recording = _service.start_recording(os.path.join(tmp, 'test-gps.csv'))
+                _summary = _service.stop_recording(_recording)
+
+            self.assertAlmostEqual(_summary[0], 40 + .5e-6)
+            self.assertAlmostEqual(_service.position()[1], 20)
+        finally:
+            _hold.set()
+            _service.stop()
+
+    def test_service_moving(self):
+        # The platform moves ~100m north after 15s
+        _service, _hold = self._serve([_tpv(40 + (i >= 15) * .001, -70, i) for i in range(20)])
+
+        try:
+            self.assertFalse(_service.stationary)
+            _position, _count = _service.position()
+            self.assertEqual(_count, 5)
+            self.assertAlmostEqual(_position[0], 40.001)
+        finally:
+            _hold.set()
+            _service.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
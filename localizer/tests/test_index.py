@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import pandas as pd
+
+from localizer.index import BssidIndex
+from localizer.tests.fixtures import results_frame
+
+
+def _results(rows):
+    _bssids, _ssids, _ssis = zip(*rows)
+    return results_frame(_bssids, _ssids, _ssis)
+
+
+class TestBssidIndex(TestCase):
+
+    def test_add_and_lookup(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            _path = os.path.join(tmp, 'bssid-index.json')
+            _index = BssidIndex.load(_path)
+            _index.add('site/001', 200, _results([('aa:aa:aa:aa:aa:aa', 'net', -50), ('aa:aa:aa:aa:aa:aa', 'net', -40),
+                                                 ('bb:bb:bb:bb:bb:bb', None, -70)]))
+            _index.add('site/000', 100, _results([('aa:aa:aa:aa:aa:aa', 'net', -60)]),
+                       pd.DataFrame([{'bssid': 'aa:aa:aa:aa:aa:aa', 'bearing': 45., 'confidence': .5}]))
+            _index.save()
+
+            _index = BssidIndex.load(_path)
+
+        self.assertEqual(len(_index), 2)
+        self.assertIn('AA:AA:AA:AA:AA:AA', _index)
+        self.assertEqual(_index.bssids('net'), {'aa:aa:aa:aa:aa:aa'})
+
+        _history = _index.history('aa:aa:aa:aa:aa:aa')
+        self.assertEqual([capture for capture, _ in _history], ['site/000', 'site/001'])
+        self.assertEqual(_history[0][1]['bearing'], 45)
+        self.assertEqual(_history[1][1]['beacons'], 2)
+        self.assertEqual(_history[1][1]['max_ssi'], -40)
+        self.assertEqual(_index.coverage('aa:aa:aa:aa:aa:aa'), 1)
+        self.assertEqual(_index.coverage('cc:cc:cc:cc:cc:cc'), 0)
+
+    def test_replace_capture(self):
+        _index = BssidIndex()
+        _index.add('site/000', 100, _results([('aa:aa:aa:aa:aa:aa', 'net', -60)]))
+        _index.add('site/000', 100, _results([('aa:aa:aa:aa:aa:aa', 'net', -60), ('aa:aa:aa:aa:aa:aa', 'net', -60)]))
+
+        self.assertEqual(len(_index.history('aa:aa:aa:aa:aa:aa')), 1)
+        self.assertEqual(_index.history('aa:aa:aa:aa:aa:aa')[0][1]['beacons'], 2)
+
+        # BSSIDs missing from the new results are dropped from the capture
+        _index.add('site/001', 200, _results([('aa:aa:aa:aa:aa:aa', 'net', -50)]))
+        _index.add('site/000', 100, _results([('bb:bb:bb:bb:bb:bb', 'other', -60)]))
+        self.assertEqual([capture for capture, _ in _index.history('aa:aa:aa:aa:aa:aa')], ['site/001'])
+        self.assertEqual(_index.bssids('net'), {'aa:aa:aa:aa:aa:aa'})
+        self.assertEqual(_index.bssids('other'), {'bb:bb:bb:bb:bb:bb'})
+
+        _index.add('site/001', 200, _results([('bb:bb:bb:bb:bb:bb', 'other', -60)]))
+        self.assertNotIn('aa:aa:aa:aa:aa:aa', _index)
+        self.assertEqual(_index.bssids('net'), set())
+        self.assertEqual(len(_index.history('bb:bb:bb:bb:bb:bb')), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+from localizer.meta import CaptureMeta, meta_csv_fieldnames
+
+
+class TestCaptureMeta(TestCase):
+
+    def test_round_trip(self):
+        _meta = CaptureMeta(name='test', pass_num='01', duration=15, start=1767268800.5, end=1767268815.5,
+                            degrees=360, bearing=90, pcap='test.pcapng', focused='aa:bb:cc:dd:ee:ff,11:22:33:44:55:66',
+                            clockwise=False, converged=None)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _path = os.path.join(tmp, 'test-capture.csv')
+            _meta.write(_path)
+            _read = CaptureMeta.read(_path)
+
+        self.assertEqual(_read.pass_num, '01')
+        self.assertEqual(_read.duration, 15.)
+        self.assertEqual(_read.start, 1767268800.5)
+        self.assertEqual(_read.degrees, 360)
+        self.assertIs(_read.clockwise, False)
+        self.assertIsNone(_read.converged)
+        self.assertEqual(_read.macs, ['aa:bb:cc:dd:ee:ff', '11:22:33:44:55:66'])
+        self.assertEqual(_read.to_dict(), _meta.to_dict())
+
+    def test_legacy_meta(self):
+        # Older captures are missing later columns, and may have written degrees as a float
+        _fields = meta_csv_fieldnames[:16]
+        with tempfile.TemporaryDirectory() as tmp:
+            _path = os.path.join(tmp, 'test-capture.csv')
+            with open(_path, 'w', newline='') as meta_csv:
+                _writer = csv.DictWriter(meta_csv, dialect='unix', fieldnames=_fields)
+                _writer.writeheader()
+                _writer.writerow({'name': 'old', 'pos_lat': '40.5', 'degrees': '84.0', 'bearing': '10'})
+
+            _meta = CaptureMeta.read(_path)
+            _columns = CaptureMeta.columns(_path)
+
+        # An empty value and a missing column both read as None; only the header tells them apart
+        self.assertEqual(_columns, _fields)
+        self.assertIsNone(_meta.pcap)
+        self.assertEqual(_meta.pos_lat, 40.5)
+        self.assertEqual(_meta.degrees, 84)
+        self.assertIsNone(_meta.timeline)
+        self.assertIsNone(_meta.clockwise)
+        with self.assertRaises(AttributeError):
+            _meta.unknown = 1
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            CaptureMeta(start='yesterday')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from unittest import TestCase
+
+from localizer import motion
+
+
+class TestMotion(TestCase):
+
+    def test_timeline_matches_ramp(self):
+        _ramp = motion.build_ramp(360, 20)
+        _timeline = motion.timeline(360, 20)
+
+        self.assertEqual(len(_timeline), len(_ramp) + 1)
+        self.assertEqual(_timeline[0], (0.0, 0.0))
+        self.assertAlmostEqual(_timeline[-1][0], motion.ramp_duration(_ramp), places=5)
+        self.assertAlmostEqual(_timeline[-1][1], 360, delta=motion.degrees_per_microstep)
+
+    def test_timeline_ramps_are_slower(self):
+        _timeline = motion.timeline(90, 10)
+
+        # Speed of each stage in degrees/s
+        _speeds = [(d2 - d1) / (t2 - t1) for (t1, d1), (t2, d2) in zip(_timeline, _timeline[1:])]
+        self.assertLess(_speeds[0], _speeds[1])
+        self.assertLess(_speeds[1], _speeds[2])
+        self.assertLess(_speeds[2], _speeds[3])
+        self.assertAlmostEqual(_speeds[0], _speeds[-1])
+
+    def test_timeline_short_move(self):
+        _timeline = motion.timeline(-3, 10)
+
+        self.assertEqual(len(_timeline), 2)
+        self.assertGreater(_timeline[-1][1], 0)
+
+    def test_truncate(self):
+        _timeline = motion.timeline(360, 20)
+        _middle = _timeline[-1][0] / 2
+
+        _truncated = motion.truncate(_timeline, _middle)
+        self.assertEqual(_truncated[-1][0], round(_middle, 6))
+        self.assertAlmostEqual(_truncated[-1][1], 180, delta=1)
+        self.assertAlmostEqual(motion.progress(_timeline, _middle), _truncated[-1][1], places=5)
+
+        self.assertEqual(motion.truncate(_timeline, _timeline[-1][0] + 1), _timeline)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from collections import namedtuple
+from unittest import TestCase
+
+import pandas as pd
+
+from localizer import motion, planner
+from localizer.index import BssidIndex
+from localizer.meta import Params
+
+
+class TestPlanner(TestCase):
+
+    @staticmethod
+    def _captures(bearings, degrees=84, duration=6):
+        return [Params(duration=duration, degrees=degrees, bearing=bearing) for bearing in bearings]
+
+    def test_best_path_within_limits(self):
+        for bearing_from in range(motion.bearing_min, motion.bearing_max, 45):
+            for new_bearing in range(0, 360, 30):
+                _end = bearing_from + motion.best_path(bearing_from, new_bearing, 84)
+                self.assertEqual(_end % 360, new_bearing)
+                self.assertGreater(_end, motion.bearing_min)
+                self.assertLessEqual(_end + 84, motion.bearing_max)
+
+    def test_best_path_counterclockwise(self):
+        # A counter-clockwise sweep must not run past the lower limit
+        _end = motion.bearing_min + 30 + motion.best_path(motion.bearing_min + 30, 0, -84)
+        self.assertEqual(_end % 360, 0)
+        self.assertGreater(_end - 84, motion.bearing_min)
+
+        self.assertEqual(motion.best_path(90, 45, -84), motion.best_path(90, 45, 84))
+
+    def test_plan_is_permutation(self):
+        _captures = self._captures([300, 10, 200, 90, 250, 30])
+        _order, _estimated, _naive = planner.plan(_captures, 0, 0)
+
+        self.assertEqual(sorted(_order), list(range(len(_captures))))
+        self.assertLessEqual(_estimated, _naive)
+
+    def test_plan_reduces_slewing(self):
+        # Alternating sides of the compass is the worst case for strength ordering
+        _captures = self._captures([0, 180, 10, 190, 20, 200, 30, 210])
+        _order, _estimated, _naive = planner.plan(_captures, 0, 0)
+
+        self.assertLess(_estimated, _naive)
+
+    def test_plan_single(self):
+        _order, _estimated, _naive = planner.plan(self._captures([45]), 0)
+
+        self.assertEqual(_order, [0])
+        self.assertEqual(_estimated, _naive)
+
+    def test_focused_captures_merge(self):
+        Guess = namedtuple('Guess', ['bssid', 'channel', 'bearing'])
+        _guesses = [Guess('00:00:00:00:00:01', 1, 100),
+                    Guess('00:00:00:00:00:02', 1, 110),
+                    Guess('00:00:00:00:00:03', 6, 105),
+                    Guess('00:00:00:00:00:04', 1, 300),
+                    Guess('00:00:00:00:00:05', 11, 355),
+                    Guess('00:00:00:00:00:06', 11, 5)]
+        _captures = planner.focused_captures(Params(), _guesses, 84, 6)
+
+        self.assertEqual(len(_captures), 4)
+        _focused = {f: p for p, f in _captures}
+        self.assertIn('00:00:00:00:00:01,00:00:00:00:00:02', _focused)
+        self.assertEqual(_focused['00:00:00:00:00:01,00:00:00:00:00:02'].degrees, 94)
+        self.assertEqual(_focused['00:00:00:00:00:01,00:00:00:00:00:02'].bearing_magnetic, 58)
+        self.assertIn('00:00:00:00:00:05,00:00:00:00:00:06', _focused)
+        self.assertEqual(_focused['00:00:00:00:00:05,00:00:00:00:00:06'].macs, ['00:00:00:00:00:05', '00:00:00:00:00:06'])
+
+    def test_focused_captures_rounding(self):
+        Guess = namedtuple('Guess', ['bssid', 'channel', 'bearing'])
+        _captures = planner.focused_captures(Params(), [Guess('00:00:00:00:00:01', 1, 3.5)], 80, 8)
+
+        # The window (-36.5 to 43.5 degrees) is widened to whole degrees rather than truncated towards zero
+        _param = _captures[0][0]
+        self.assertEqual(_param.bearing_magnetic, 323)
+        self.assertEqual(_param.degrees, 81)
+        self.assertAlmostEqual(_param.duration, 8.1)
+
+    def test_focused_captures_confidence(self):
+        Guess = namedtuple('Guess', ['bssid', 'channel', 'bearing', 'confidence'])
+        _guesses = [Guess('00:00:00:00:00:01', 1, 100, 0),
+                    Guess('00:00:00:00:00:02', 6, 100, .5),
+                    Guess('00:00:00:00:00:03', 11, 100, .95)]
+        _captures = planner.focused_captures(Params(), _guesses, 80, 8)
+
+        self.assertEqual(len(_captures), 2)
+        _focused = {f: p for p, f in _captures}
+        self.assertEqual(_focused['00:00:00:00:00:01'].degrees, 80)
+        self.assertEqual(_focused['00:00:00:00:00:02'].degrees, 60)
+        self.assertAlmostEqual(_focused['00:00:00:00:00:02'].duration, 6)
+
+        _captures = planner.focused_captures(Params(), _guesses, 80, 8, skip_confident=False)
+        self.assertEqual(len(_captures), 3)
+
+    def test_focused_captures_coverage(self):
+        Guess = namedtuple('Guess', ['bssid', 'channel', 'bearing'])
+        _guesses = [Guess('00:00:00:00:00:01', 1, 100),
+                    Guess('00:00:00:00:00:02', 6, 100)]
+        _index = BssidIndex()
+        for i in range(planner.COVERED_CAPTURES):
+            _index.add(str(i), i, pd.DataFrame([('00:00:00:00:00:02', 'net', -50)], columns=['bssid', 'ssid', 'ssi']),
+                       pd.DataFrame([{'bssid': '00:00:00:00:00:02', 'bearing': 100, 'confidence': .5}]))
+
+        _captures = planner.focused_captures(Params(), _guesses, 80, 8, index=_index)
+
+        self.assertEqual([f for _, f in _captures], ['00:00:00:00:00:01'])
+
+
+if __name__ == '__main__':
+    unittest.main()
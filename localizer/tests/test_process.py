@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from localizer import dataset, index, process
+from localizer.meta import CaptureMeta
+from localizer.tests.fixtures import results_frame
+
+
+def _results(count):
+    return results_frame(['00:00:00:00:00:{:02x}'.format(i % 20) for i in range(count)],
+                         ssids=['net{}'.format(i % 20) for i in range(count)])
+
+
+class TestProcess(TestCase):
+
+    def test_results_round_trip(self):
+        _results_df = process.narrow_results(_results(100))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            _path = os.path.join(tmp, 'test-results.csv')
+            _results_df.to_csv(_path, sep=',', index=False)
+            _read = process.read_results(_path)
+
+        for column, dtype in process.results_dtypes.items():
+            self.assertEqual(_read[column].dtype.name, pd.Series([], dtype=dtype).dtype.name, msg=column)
+        self.assertEqual(list(_read['pass'].unique()), ['01'])
+        self.assertEqual(_read['ssi'].min(), -89)
+        self.assertAlmostEqual(_read['lat'][0], 40.123456)
+
+    def test_memory_report(self):
+        _report = process.memory_report(_results(1000))
+
+        self.assertLess(_report['narrow'], _report['wide'] / 4)
+        self.assertEqual(_report['narrow_total'], process.narrow_results(_results(1000)).memory_usage(
+            index=False, deep=True).sum())
+
+    def test_record_capture(self):
+        _meta = CaptureMeta(name='test', pass_num='01', start=1767268800, pos_lat=40.123456, pos_lon=-70.123456)
+        _cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                process.record_capture(_meta, tmp, _results(10), index.BssidIndex.load())
+
+                # The index is on disk as soon as the capture is in the dataset
+                self.assertTrue(dataset.contains(_meta))
+                self.assertIn('00:00:00:00:00:00', index.BssidIndex.load())
+            finally:
+                os.chdir(_cwd)
+
+    def test_meta_table(self):
+        _captures = [('/data/1', CaptureMeta(name='a', pass_num='1', duration='15', degrees='360', converged='True')),
+                     ('/data/2', CaptureMeta(name='b', duration='20.5'))]
+        _table = process.meta_table(_captures)
+
+        self.assertEqual(list(_table['name']), ['a', 'b'])
+        self.assertEqual(list(_table['directory']), ['/data/1', '/data/2'])
+        self.assertEqual(_table['duration'].dtype.name, 'float64')
+        self.assertEqual(list(_table['duration']), [15., 20.5])
+        self.assertEqual(_table['pass'][0], '1')
+        self.assertTrue(pd.isnull(_table['degrees'][1]))
+        self.assertTrue(pd.isnull(_table['timeline']).all())
+
+    @staticmethod
+    def _track(tmp, rows, columns=('timestamp', 'lat', 'lon', 'alt', 'lat_err', 'lon_error', 'alt_error', 'received')):
+        with open(os.path.join(tmp, 'test-gps.csv'), 'w') as f:
+            f.write(','.join(columns) + '\n')
+            for row in rows:
+                f.write(','.join('' if value is None else str(value) for value in row) + '\n')
+        return process._load_track(CaptureMeta(coords='test-gps.csv'), tmp)
+
+    def test_load_track(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Fixes are ordered by the host clock, and fixes without a position are dropped
+            _times, _track = self._track(tmp, [(500, 40.2, -70.2, 10, 3, 3, 5, 1002),
+                                               (400, 40.0, -70.0, 10, 3, 3, 5, 1000),
+                                               (450, None, None, None, None, None, None, 1001)])
+            self.assertEqual(list(_times), [1000, 1002])
+            self.assertEqual(list(_track[0]), [40.0, 40.2])
+            self.assertEqual(_track.shape, (6, 2))
+
+            # Older tracks only have the gps time
+            _times, _ = self._track(tmp, [(500, 40.2, -70.2, 10, 3, 3, 5), (400, 40.0, -70.0, 10, 3, 3, 5)],
+                                    columns=('timestamp', 'lat', 'lon', 'alt', 'lat_err', 'lon_error', 'alt_error'))
+            self.assertEqual(list(_times), [400, 500])
+
+            self.assertIsNone(self._track(tmp, []))
+            self.assertIsNone(self._track(tmp, [(400, None, None, None, None, None, None, 1000)]))
+            self.assertIsNone(process._load_track(CaptureMeta(coords='missing-gps.csv'), tmp))
+
+    def test_interpolate_track(self):
+        _track = np.array([[40.0, 40.2, 40.4],
+                           [-70.0, -70.2, -70.4],
+                           [np.nan, np.nan, np.nan],
+                           [3, 5, 3],
+                           [3, 5, 3],
+                           [np.nan, 5, np.nan]])
+        _positions = process._interpolate_track(np.array([999, 1000.5, 1001.5, 1010]), np.array([1000, 1001, 1002]),
+                                                _track)
+
+        # Interior beacons are interpolated between fixes, and the ends take the first or last fix
+        np.testing.assert_allclose(_positions[0], [40.0, 40.1, 40.3, 40.4])
+        np.testing.assert_allclose(_positions[3], [3, 4, 4, 3])
+        # A field no fix has stays empty, and fixes missing a field are skipped
+        self.assertTrue(np.isnan(_positions[2]).all())
+        np.testing.assert_allclose(_positions[5], [5, 5, 5, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
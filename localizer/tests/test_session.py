@@ -0,0 +1,86 @@
+import os
+import stat
+import tempfile
+import time
+import unittest
+from unittest import TestCase, mock
+
+from localizer import session
+
+
+def _tool(directory, name, script):
+    _path = os.path.join(directory, name)
+    with open(_path, 'w') as f:
+        f.write("#!/bin/sh\n" + script + "\n")
+    os.chmod(_path, os.stat(_path).st_mode | stat.S_IEXEC)
+
+
+class TestCaptureSession(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._bin = os.path.join(self._tmp.name, 'bin')
+        os.makedirs(self._bin)
+        _tool(self._bin, 'editcap', 'exit 0')
+        _tool(self._bin, 'mergecap', 'exit 0')
+        self._path = mock.patch.dict(os.environ, {'PATH': self._bin + os.pathsep + os.environ.get('PATH', '')})
+        self._path.start()
+
+    def tearDown(self):
+        self._path.stop()
+        self._tmp.cleanup()
+
+    def test_segments(self):
+        _tool(self._bin, 'dumpcap', 'exit 0')
+        _session = session.CaptureSession('wlan0', self._tmp.name, segment=60)
+
+        _starts = [1500000000, 1500000060, 1500000120, 1500000180]
+        for i, start in enumerate(_starts):
+            _stamp = time.strftime(session._segment_time_format, time.localtime(start))
+            open("{}_{:05d}_{}.pcapng".format(_session._prefix, i + 1, _stamp), 'w').close()
+
+        self.assertEqual(len(_session.segments()), 4)
+        # Only the segments overlapping the capture (and their neighbours, within a second) are read
+        _selected = _session.segments(1500000070, 1500000100)
+        self.assertEqual([os.path.basename(path).split('_')[1] for path in _selected], ['00002'])
+        self.assertEqual(len(_session.segments(1500000170)), 2)
+
+    def test_ring_files(self):
+        self.assertEqual(session.CaptureSession.ring_files(20, 60, 5), 7)
+        self.assertEqual(session.CaptureSession.ring_files(150, 60, 0), 4)
+
+    def test_requires_mergecap(self):
+        _tool(self._bin, 'dumpcap', 'exit 0')
+        os.remove(os.path.join(self._bin, 'mergecap'))
+        with mock.patch.dict(os.environ, {'PATH': self._bin}):
+            with self.assertRaises(RuntimeError):
+                session.CaptureSession('wlan0', self._tmp.name)
+            session.CaptureSession('wlan0', self._tmp.name, segment=None)
+
+    def test_drains_stderr(self):
+        # dumpcap keeps writing to stderr for the whole session; more than a pipe holds must not block it
+        _tool(self._bin, 'dumpcap', 'echo "File: session" >&2; head -c 262144 /dev/zero | tr "\\0" "x" >&2; '
+                                    'echo >&2; touch "$0.done"')
+        _session = session.CaptureSession('wlan0', self._tmp.name)
+
+        with mock.patch.object(session.interface, 'prepare', return_value=True):
+            _session.start()
+        _session._proc.wait(timeout=5)
+        self.assertTrue(os.path.isfile(os.path.join(self._bin, 'dumpcap.done')))
+
+    def test_start_timeout(self):
+        # A dumpcap that hangs without printing anything must not block the session from starting
+        _tool(self._bin, 'dumpcap', 'exec sleep 30')
+        _session = session.CaptureSession('wlan0', self._tmp.name)
+
+        _start = time.time()
+        with mock.patch.object(session, 'START_TIMEOUT', .5), \
+                mock.patch.object(session.interface, 'prepare', return_value=True):
+            with self.assertRaises(RuntimeError):
+                _session.start()
+        self.assertLess(time.time() - _start, 5)
+        self.assertFalse(_session.running)
+
+
+if __name__ == '__main__':
+    unittest.main()
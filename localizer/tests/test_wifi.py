@@ -1,11 +1,5 @@
-import math
-import queue
 import tempfile
-import time
 import unittest
-from threading import Event
-
-from tqdm import tqdm
 
 import localizer
 from localizer import interface
@@ -40,37 +34,6 @@ class TestWifi(unittest.TestCase):
                 self.assertEqual(interface.get_interface_mode(iface), mode,
                                  msg="Failed to enable {} mode on iface {}".format(mode, iface))
 
-    def test_3_channel_hop(self):
-        _flag = Event()
-        _response_queue = queue.Queue()
-        _thread = interface.ChannelThread(_flag,
-                                          localizer.meta.iface,
-                                          localizer.meta.duration,
-                                          localizer.meta.hop_int,
-                                          _response_queue)
-        _thread.start()
-        _flag.set()
-
-        _original_channel = interface.get_channel(localizer.meta.iface)
-        _channel_changed = False
-        # Check channel changes at least once during duration:
-
-        # Display timer
-        with tqdm(range(localizer.meta.duration)) as pbar:
-            for sec in pbar:
-                _current_channel = interface.get_channel(localizer.meta.iface)
-                if _current_channel != _original_channel and not _channel_changed:
-                    _channel_changed = True
-                pbar.set_description("Current channel:{:>3}".format(_current_channel))
-                time.sleep(1)
-
-        self.assertTrue(_channel_changed)
-
-        _start, _end = _response_queue.get()
-        self.assertEquals(math.floor(_end - _start - localizer.meta.duration), 0, "Thread took too long (> 1s difference)")
-
-        _thread.join()
-
 
 # Script can be run standalone to test the antenna
 if __name__ == "__main__":
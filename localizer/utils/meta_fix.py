@@ -1,60 +1,50 @@
 import argparse
-import csv
 import os
 from multiprocessing import Pool
 
 from tqdm import tqdm
 
-from ..capture import meta_csv_fieldnames
+from ..meta import CaptureMeta
 from ..process import _check_capture_dir, _get_capture_meta
 
 
 def fix_meta(file):
 
     # Open meta information
-    with open(file, 'rt') as meta_csv:
-        _meta_reader = csv.DictReader(meta_csv, dialect='unix')
-        meta = next(_meta_reader)
+    meta = CaptureMeta.read(file)
+    _columns = CaptureMeta.columns(file)
 
     _change_flag = False
     # Check for presence of duration and hop_int values
-    if meta_csv_fieldnames[4] not in meta or arguments.force:
-        meta[meta_csv_fieldnames[4]] = arguments.duration
+    if 'duration' not in _columns or arguments.force:
+        meta.duration = float(arguments.duration)
         _change_flag = True
-    if meta_csv_fieldnames[5] not in meta or arguments.force:
-        meta[meta_csv_fieldnames[5]] = arguments.hop
+    if 'hop_int' not in _columns or arguments.force:
+        meta.hop_int = arguments.hop
         _change_flag = True
-    if meta_csv_fieldnames[1] not in meta or arguments.force:
+    if 'pass' not in _columns or arguments.force:
         # Get the pass number from the path if possible
         _head = os.path.split(file)[0]
         if _head:
             try:
                 _pass = int(os.path.split(_head)[1])
-                meta[meta_csv_fieldnames[1]] = _pass
+                meta.pass_num = _pass
                 _change_flag = True
             except (ValueError, TypeError):
                 pass
 
     # Fix paths
-    _path = os.path.split(meta[meta_csv_fieldnames[16]])
-    if _path[0]:
-        meta[meta_csv_fieldnames[16]] = _path[1]
-        _change_flag = True
-    _path = os.path.split(meta[meta_csv_fieldnames[17]])
-    if _path[0]:
-        meta[meta_csv_fieldnames[17]] = _path[1]
-        _change_flag = True
-    _path = os.path.split(meta[meta_csv_fieldnames[18]])
-    if _path[0]:
-        meta[meta_csv_fieldnames[18]] = _path[1]
-        _change_flag = True
+    for field in ('pcap', 'nmea', 'coords'):
+        if getattr(meta, field) is None:
+            continue
+        _path = os.path.split(getattr(meta, field))
+        if _path[0]:
+            setattr(meta, field, _path[1])
+            _change_flag = True
 
     # Write changes to file
     if not arguments.dry and _change_flag:
-        with open(file, 'w', newline='') as test_csv:
-            _test_csv_writer = csv.DictWriter(test_csv, dialect="unix", fieldnames=meta_csv_fieldnames)
-            _test_csv_writer.writeheader()
-            _test_csv_writer.writerow(meta)
+        meta.write(file)
 
     return _change_flag
 
@@ -1,11 +1,10 @@
 import argparse
-import csv
 import os
 from multiprocessing import Pool
 
 from tqdm import tqdm
 
-from localizer.meta import meta_csv_fieldnames
+from localizer.meta import CaptureMeta
 from localizer.process import _check_capture_dir, _get_capture_meta
 
 
@@ -15,14 +14,13 @@ def fix_meta(file):
     """
 
     # Open meta information
-    with open(file, 'rt') as meta_csv:
-        _meta_reader = csv.DictReader(meta_csv, dialect='unix')
-        meta = next(_meta_reader)
+    meta = CaptureMeta.read(file)
+    _columns = CaptureMeta.columns(file)
 
     _change_flag = False
     # Check for presence of 'focused'
-    if meta_csv_fieldnames[19] not in meta or arguments.force:
-        _path = meta[meta_csv_fieldnames[2]]
+    if 'focused' not in _columns or arguments.force:
+        _path = meta.path
         _path_split = os.path.split(_path)
         # Check whether path is 3 layers
         if os.path.split(_path_split[0])[0]:
@@ -35,18 +33,15 @@ def fix_meta(file):
                 raise ValueError("Bad ssid format")
             _ssid_chunks = [_ssid[i:i+2] for i in  range(0, len(_ssid), 2)]
             _ssid_reconstituted = ':'.join(_ssid_chunks)
-            meta[meta_csv_fieldnames[19]] = _ssid_reconstituted
+            meta.focused = _ssid_reconstituted
             _change_flag = True
         else:
-            meta[meta_csv_fieldnames[19]] = None
+            meta.focused = None
             _change_flag = True
 
     # Write changes to file
     if not arguments.dry and _change_flag:
-        with open(file, 'w', newline='') as test_csv:
-            _test_csv_writer = csv.DictWriter(test_csv, dialect="unix", fieldnames=meta_csv_fieldnames)
-            _test_csv_writer.writeheader()
-            _test_csv_writer.writerow(meta)
+        meta.write(file)
 
     return _change_flag
 
@@ -1,5 +1,4 @@
 import argparse
-import csv
 import os
 import time
 from concurrent import futures
@@ -7,7 +6,7 @@ from concurrent import futures
 from tqdm import tqdm
 
 from localizer import load_macs
-from localizer.meta import meta_csv_fieldnames, capture_suffixes
+from localizer.meta import CaptureMeta, capture_suffixes
 from localizer.process import _check_capture_dir, _get_capture_meta, process_capture
 
 
@@ -17,24 +16,23 @@ def fix_meta(path, file, macs=None):
     """
 
     # Open meta information
-    with open(os.path.join(path, file), 'rt') as meta_csv:
-        _meta_reader = csv.DictReader(meta_csv, dialect='unix')
-        meta = next(_meta_reader)
+    meta = CaptureMeta.read(os.path.join(path, file))
+    _columns = CaptureMeta.columns(os.path.join(path, file))
 
     _change_flag = False
     _write_flag = False
     _guess = None
 
     # Check guess column
-    if meta_csv_fieldnames[20] not in meta or arguments.force:
-        _path = meta[meta_csv_fieldnames[2]]
+    if 'guess' not in _columns or arguments.force:
+        _path = meta.path
         _path_split = os.path.split(_path)
 
         # Check whether path is 2 layers (ie, we are looking at a 'parent' capture (not focused)
         if not os.path.split(_path_split[0])[0]:
 
             # Generate guesses
-            _, _, _, _guess = process_capture(os.path.join(path, file), False, True, True, macs)
+            _, _, _, _guess = process_capture(meta, path, False, True, True, macs)
             _change_flag = True
 
     # Write changes to file
@@ -47,13 +45,10 @@ def fix_meta(path, file, macs=None):
             _guess.to_csv(_output, sep=',')
 
             # Add column to meta
-            meta[meta_csv_fieldnames[20]] = _output_csv_guess
+            meta.guess = _output_csv_guess
             _write_flag = True
 
-            with open(os.path.join(path, file), 'w', newline='') as test_csv:
-                _test_csv_writer = csv.DictWriter(test_csv, dialect="unix", fieldnames=meta_csv_fieldnames)
-                _test_csv_writer.writeheader()
-                _test_csv_writer.writerow(meta)
+            meta.write(os.path.join(path, file))
 
 
 
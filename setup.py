@@ -22,6 +22,7 @@ setup(
         'gpsd-py3',
         'tqdm',
         'pandas',
+        'pyarrow',
         'scipy',
         'numexpr',
         'bottleneck',